@@ -0,0 +1,141 @@
+"""
+Inventory ingestion memory benchmark for the EchoVerse Music Catalog
+
+Compares the original pandas load (read_csv, fillna, to_dict('records'))
+with the streaming csv reader that now feeds build_catalog_tracks. Each
+run happens in a fresh interpreter so peak RSS covers imports and parsing
+for that path alone. A second, traced run reports the Python heap during
+the load (imports excluded): its peak, what is still held afterwards (the
+track records both paths produce), and the difference, which is the
+memory the ingestion itself needs.
+
+Usage (from EchoVerse_Music_Catalog/):
+    python benchmarks/ingest_benchmark.py --rows 100000
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# resource is Unix-only; on Windows peak RSS comes from psutil when installed
+try:
+    import resource
+except ImportError:
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_CSV = os.path.join(ROOT, "music_catalog", "music_catalog__20250916_152433.csv")
+METHODS = ["pandas", "streaming"]
+
+def pandas_records(csv_path):
+    """The read_catalog_records implementation before streaming ingestion"""
+    import pandas as pd
+    df = pd.read_csv(csv_path, quoting=1)
+    df = df.fillna('')
+    return df.to_dict('records')
+
+def synthetic_inventory(path, rows):
+    """Grow the sample inventory to the requested row count with distinct files"""
+    with open(SAMPLE_CSV, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        base_rows = list(reader)
+
+    name_column = header.index('file_name')
+    path_column = header.index('full_path')
+    hash_column = header.index('file_hash')
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for i in range(rows):
+            row = list(base_rows[i % len(base_rows)])
+            stem, extension = os.path.splitext(row[name_column])
+            row[name_column] = f"{stem} {i}{extension}"
+            row[path_column] = f"{os.path.splitext(row[path_column])[0]} {i}{extension}"
+            row[hash_column] = hashlib.sha256(str(i).encode()).hexdigest()
+            writer.writerow(row)
+
+def measure(method, csv_path, traced):
+    """Load the inventory one way and return timings, memory and track count"""
+    sys.path.insert(0, ROOT)
+    import main
+    if method == "pandas":
+        import pandas  # noqa: F401  (main.py imported it at module level)
+    if traced:
+        tracemalloc.start()
+    start = time.perf_counter()
+
+    records = pandas_records(csv_path) if method == "pandas" else main.read_catalog_records(csv_path)
+    tracks, _, _, _ = main.build_catalog_tracks(records)
+    del records
+
+    result = {"seconds": time.perf_counter() - start, "tracks": len(tracks)}
+    if traced:
+        retained, peak = tracemalloc.get_traced_memory()
+        result["peak_heap_mb"] = peak / (1024 * 1024)
+        result["retained_heap_mb"] = retained / (1024 * 1024)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if it cannot be read"""
+    if resource is not None:
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        # peak_wset is the Windows peak working set; elsewhere fall back to current RSS
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    return None
+
+def run_worker(method, csv_path, traced):
+    """Run measure() in a fresh interpreter; the loader's prints are discarded"""
+    command = [sys.executable, os.path.abspath(__file__), "--worker", method, "--csv", csv_path]
+    if traced:
+        command.append("--traced")
+    output = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def run(rows):
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "music_catalog__benchmark.csv")
+        synthetic_inventory(csv_path, rows)
+        size_mb = os.path.getsize(csv_path) / (1024 * 1024)
+
+        print(f"\nRows: {rows}  CSV: {size_mb:.1f} MB\n")
+        print(f"{'method':<12}{'tracks':>8}{'seconds':>10}{'peak RSS MB':>14}"
+              f"{'heap peak MB':>15}{'retained MB':>14}{'load overhead MB':>19}")
+        for method in METHODS:
+            untraced = run_worker(method, csv_path, traced=False)
+            traced = run_worker(method, csv_path, traced=True)
+            overhead = traced['peak_heap_mb'] - traced['retained_heap_mb']
+            rss = "n/a" if untraced['peak_rss_mb'] is None else f"{untraced['peak_rss_mb']:.1f}"
+            print(f"{method:<12}{untraced['tracks']:>8}{untraced['seconds']:>10.2f}"
+                  f"{rss:>14}{traced['peak_heap_mb']:>15.1f}"
+                  f"{traced['retained_heap_mb']:>14.1f}{overhead:>19.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark inventory ingestion memory")
+    parser.add_argument("--rows", type=int, default=100000, help="synthetic inventory size")
+    parser.add_argument("--worker", choices=METHODS, help=argparse.SUPPRESS)
+    parser.add_argument("--csv", help=argparse.SUPPRESS)
+    parser.add_argument("--traced", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = measure(args.worker, args.csv, args.traced)
+        print(json.dumps(result))
+    else:
+        run(args.rows)
@@ -0,0 +1,89 @@
+"""
+Search latency benchmark for the EchoVerse Music Catalog
+
+Compares the original per-request substring scan of /api/search with the
+inverted index (standard mode) and the trigram-filtered fuzzy mode.
+
+Usage (from EchoVerse_Music_Catalog/):
+    python benchmarks/search_benchmark.py --tracks 100000
+"""
+
+import argparse
+import heapq
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main  # noqa: E402
+
+QUERIES = [
+    ("synthetic souls", "standard"),
+    ("utah", "standard"),
+    ("oul", "standard"),
+    ("syntetic sols", "fuzzy"),
+    ("xnith", "fuzzy"),
+    ("vektro", "fuzzy"),
+    ("patriotik", "fuzzy"),
+]
+
+def substring_scan(tracks, q):
+    """The /api/search implementation before the search index"""
+    q_lower = q.lower()
+    return [
+        track for track in tracks
+        if (q_lower in track.get('album', '').lower() or
+            q_lower in track.get('artist', '').lower() or
+            q_lower in track.get('track', '').lower())
+    ]
+
+def synthetic_catalog(base_tracks, size):
+    """Grow the loaded catalog to the requested size with distinct titles"""
+    tracks = []
+    for i in range(size):
+        track = dict(base_tracks[i % len(base_tracks)])
+        track['track'] = f"{track.get('track', '')} take {i}"
+        tracks.append(track)
+    return tracks
+
+def time_ms(func, repeat):
+    """Average wall time of func() in milliseconds"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def indexed_search(index, q, mode, limit=100):
+    """Same ranking the endpoint performs, without the HTTP layer"""
+    if mode == "fuzzy":
+        ranks = main.fuzzy_search_index_query(index, q)
+        return heapq.nsmallest(limit, ranks, key=lambda position: (ranks[position], position))
+    ranks = main.search_index_query(index, q)
+    return heapq.nsmallest(limit, ranks, key=lambda position: (-ranks[position], position))
+
+def run(size, repeat):
+    main.load_music_catalog()
+    tracks = synthetic_catalog(main.catalog_data, size)
+
+    start = time.perf_counter()
+    index = main.build_search_index(tracks, main.load_song_metadata())
+    build_ms = (time.perf_counter() - start) * 1000
+
+    print(f"\nTracks: {len(tracks)}  vocabulary: {len(index['vocab'])}  index build: {build_ms:.0f} ms\n")
+    print(f"{'query':<18}{'mode':<10}{'scan ms':>10}{'scan hits':>11}{'index ms':>11}{'index hits':>12}")
+    for q, mode in QUERIES:
+        scan_ms = time_ms(lambda: substring_scan(tracks, q), max(1, repeat // 10))
+        scan_hits = len(substring_scan(tracks, q))
+        index_ms = time_ms(lambda: indexed_search(index, q, mode), repeat)
+        if mode == "fuzzy":
+            index_hits = len(main.fuzzy_search_index_query(index, q))
+        else:
+            index_hits = len(main.search_index_query(index, q))
+        print(f"{q:<18}{mode:<10}{scan_ms:>10.2f}{scan_hits:>11}{index_ms:>11.3f}{index_hits:>12}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark catalog search")
+    parser.add_argument("--tracks", type=int, default=100000, help="synthetic catalog size")
+    parser.add_argument("--repeat", type=int, default=50, help="iterations per indexed query")
+    args = parser.parse_args()
+    run(args.tracks, args.repeat)
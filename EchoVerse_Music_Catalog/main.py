@@ -3,13 +3,14 @@ EchoVerse Music Catalog System
 Professional music catalog for AeroVista Studios with work order management
 """
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Query
+from fastapi import Path as PathParam
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
-import pandas as pd
 import json
+import math
 import os
 import re
 from pathlib import Path
@@ -17,14 +18,68 @@ from typing import List, Dict, Any, Optional
 import uvicorn
 from datetime import datetime
 import hashlib
+import secrets
+import asyncio
+import pickle
+import bisect
+import heapq
+import base64
+import gzip
+import struct
+import shutil
+import subprocess
+import threading
+import time
+import wave
+import argparse
+import csv
+import getpass
+import mimetypes
+import platform
+import socket
+from collections import OrderedDict, Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import numpy as np
 from contextlib import asynccontextmanager
+from email.utils import formatdate
+import anyio
+
+# Brotli is optional; responses fall back to gzip without it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Pillow is optional; without it size= requests get the original image
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# Mutagen is optional; the scanner falls back to ffprobe (or WAV headers) for tags
+try:
+    import mutagen
+except ImportError:
+    mutagen = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Load catalog data on startup"""
+    """Load catalog data on startup and watch for newer inventories"""
+    load_song_metadata_store()
     load_music_catalog()
+    load_image_index_from_disk()
+    load_media_cache_index()
+    load_work_orders()
+    load_play_events()
+    watchers = [
+        asyncio.create_task(watch_catalog_csv()),
+        asyncio.create_task(watch_image_index()),
+        asyncio.create_task(flush_play_events_periodically())
+    ]
     yield
-    # Cleanup code here if needed
+    for watcher in watchers:
+        watcher.cancel()
+    await flush_play_events()
 
 app = FastAPI(
     title="EchoVerse Music Catalog",
@@ -185,6 +240,70 @@ templates = Jinja2Templates(directory="templates")
 catalog_data = []
 albums_data = {}
 
+# ID lookup indexes, rebuilt with every catalog swap
+tracks_by_id = {}
+albums_by_id = {}
+artists_by_id = {}
+tracks_by_hash = {}  # inventory file_hash -> canonical track
+MAX_BATCH_TRACK_IDS = 500
+
+# Inventory rows collapsed into a track with the same content: file_hash -> copies
+catalog_duplicates = {}
+
+# Validated file location per track ID for /api/stream, rebuilt with every
+# catalog swap and whenever the allowed directories change
+stream_table = {}
+stream_paths = {}  # local file -> track ID, for path-based /api/audio requests
+
+# Full-text search index over catalog_data, rebuilt with every catalog swap
+search_index = {"postings": {}, "vocab": [], "trigrams": {}, "fuzzy_grams": {}, "hash_positions": {}}
+
+# Ratings, tags, notes and play counts keyed by inventory file_hash, in
+# revision order; see the song metadata store section
+SONG_METADATA_FILE = os.path.join(os.path.dirname(__file__), "song_metadata.json")
+SONG_METADATA_LOG_FILE = os.path.join(os.path.dirname(__file__), "song_metadata.jsonl")
+song_metadata = OrderedDict()
+
+# Catalog-wide counts, computed once per catalog swap
+catalog_totals = {"total_albums": 0, "total_tracks": 0, "total_size_bytes": 0, "duplicate_files": 0}
+CATALOG_PAGE_DEFAULT_LIMIT = 100
+CATALOG_PAGE_MAX_LIMIT = 1000
+
+# Inventory locations searched for the most recent catalog CSV
+CATALOG_CSV_PATHS = [
+    "M:/Albums/",
+    "D:/Clients/AeroVista/Projects/EchoVerse_Music/Albums/",
+    "music_catalog/",
+    "\\\\envy2-0\\EchoVerse_Music\\Albums\\",  # Network share path
+    "//envy2-0/EchoVerse_Music/Albums/"       # Alternative network path format
+]
+CATALOG_WATCH_INTERVAL_SECONDS = 30
+
+# Inventory fields a track record is built from; a row only counts as
+# changed on reload if one of these differs
+TRACK_SOURCE_FIELDS = [
+    'file_name', 'full_path', 'mime_type', 'file_hash', 'size_bytes', 'artist', 'album',
+    'title', 'track_number', 'year', 'genre', 'length_seconds', 'bitrate', 'sample_rate',
+    'tailscale_echoverse_url', 'api_audio_pathparam'
+]
+# Inventory columns read at load time; the rest of the CSV is never kept
+CATALOG_RECORD_FIELDS = set(TRACK_SOURCE_FIELDS) | {'is_duplicate', 'duplicate_of'}
+CATALOG_NUMERIC_FIELDS = {
+    'size_bytes': int,
+    'track_number': float,
+    'year': float,
+    'length_seconds': float,
+    'bitrate': float,
+    'sample_rate': float
+}
+
+# Loaded inventory file, per-row fingerprints for diffing reloads, and a
+# counter bumped every time a new catalog is swapped in
+catalog_source = {"path": None, "mtime": 0}
+catalog_row_fingerprints = {}
+catalog_generation = 0
+catalog_reload_lock = asyncio.Lock()
+
 def generate_unique_id(base_type, identifier, parent_id=None):
     """
     Generate unique IDs for tracing relationships:
@@ -206,9 +325,17 @@ def generate_unique_id(base_type, identifier, parent_id=None):
         # For top-level items (artists), create a hash from the name
         return f"{base_type}_{identifier_hash}"
 
+def content_track_id(file_hash):
+    """Track ID derived from the audio content, so it survives renames and re-inventories"""
+    return f"track_{file_hash[:16]}"
+
+def is_missing_value(value):
+    """True for an empty inventory cell that came through as None or NaN"""
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
 def format_duration(seconds):
     """Convert seconds to MM:SS format"""
-    if not seconds or pd.isna(seconds):
+    if not seconds or is_missing_value(seconds):
         return "0:00"
     try:
         seconds = int(float(seconds))
@@ -218,208 +345,631 @@ def format_duration(seconds):
     except (ValueError, TypeError):
         return "0:00"
 
-def load_music_catalog():
-    """Load and parse the music catalog CSV"""
-    global catalog_data, albums_data
-    
+# Cover art index: each album directory is listed once and the result is kept
+# on disk keyed by directory + mtime, so restarts only stat the album folders
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache")
+COVER_ART_INDEX_FILE = os.path.join(CACHE_DIR, "cover_art_index.json")
+COVER_ART_INDEX_VERSION = 1
+COVER_ART_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
+COVER_ART_BASE_NAMES = [
+    'cover', 'album', 'front', 'folder', 'artwork', 'albumart',
+    'art', 'albumcover', 'cd', 'booklet', 'sleeve', 'inlay'
+]
+COVER_ART_KEYWORDS = ['cover', 'art', 'front', 'album']
+
+def load_cover_art_index():
+    """Load the on-disk cover art index, or start an empty one"""
+    index = {"version": COVER_ART_INDEX_VERSION, "directories": {}, "dirty": False}
     try:
-        # Try multiple possible CSV locations
-        csv_paths = [
-            "M:/Albums/",
-            "D:/Clients/AeroVista/Projects/EchoVerse_Music/Albums/",
-            "music_catalog/",
-            "\\\\envy2-0\\EchoVerse_Music\\Albums\\",  # Network share path
-            "//envy2-0/EchoVerse_Music/Albums/"       # Alternative network path format
+        if os.path.exists(COVER_ART_INDEX_FILE):
+            with open(COVER_ART_INDEX_FILE, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            if stored.get("version") == COVER_ART_INDEX_VERSION:
+                index["directories"] = stored.get("directories", {})
+    except Exception as e:
+        print(f"Error loading cover art index, rebuilding: {e}")
+    return index
+
+def save_cover_art_index(index):
+    """Write the cover art index back to disk if any directory was re-listed"""
+    if not index.get("dirty"):
+        return
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = COVER_ART_INDEX_FILE + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": COVER_ART_INDEX_VERSION, "directories": index["directories"]}, f)
+        os.replace(tmp_path, COVER_ART_INDEX_FILE)
+        index["dirty"] = False
+    except Exception as e:
+        print(f"Error saving cover art index: {e}")
+
+def list_album_images(album_path, index):
+    """
+    Return the image file names in an album directory.
+
+    The directory is only listed when its mtime differs from the cached entry;
+    returns None if the directory cannot be reached.
+    """
+    try:
+        mtime = os.path.getmtime(album_path)
+    except OSError:
+        return None
+
+    entry = index["directories"].get(album_path)
+    if entry and entry.get("mtime") == mtime:
+        return entry["images"]
+
+    try:
+        images = [
+            file for file in os.listdir(album_path)
+            if any(file.lower().endswith(ext) for ext in COVER_ART_EXTENSIONS)
         ]
-        
+    except Exception as e:
+        print(f"Error listing directory {album_path}: {e}")
+        return None
+
+    index["directories"][album_path] = {"mtime": mtime, "images": images}
+    index["dirty"] = True
+    return images
+
+def find_cover_in_listing(images, album_name):
+    """Pick the best cover art file name from a directory listing"""
+    by_lower_name = {}
+    for file in images:
+        by_lower_name.setdefault(file.lower(), file)
+
+    # Common cover art filenames (case insensitive), then the album name itself
+    base_names = COVER_ART_BASE_NAMES + [album_name.lower().replace(' ', '')]
+    candidates = [f"{base}{ext}" for base in base_names for ext in COVER_ART_EXTENSIONS]
+
+    # Add numbered variants
+    for i in range(1, 4):
+        for ext in COVER_ART_EXTENSIONS:
+            candidates.append(f"cover{i}{ext}")
+            candidates.append(f"{i}{ext}")
+
+    for candidate in candidates:
+        if candidate in by_lower_name:
+            return by_lower_name[candidate]
+
+    # Then files with "cover" or "art" in the name, then any image file
+    for file in images:
+        if any(term in file.lower() for term in COVER_ART_KEYWORDS):
+            return file
+    return images[0] if images else ''
+
+def resolve_album_cover(album_path, album_name, index, resolved):
+    """Resolve the cover art for an album directory, once per directory per load"""
+    key = (album_path, album_name)
+    if key in resolved:
+        return resolved[key]
+
+    cover_file = ''
+    images = list_album_images(album_path, index)
+    if images:
+        cover_name = find_cover_in_listing(images, album_name)
+        if cover_name:
+            cover_file = os.path.join(album_path, cover_name)
+            print(f"Found cover art for {album_name}: {cover_file}")
+    if not cover_file:
+        print(f"No cover art found for {album_name} in {album_path}")
+
+    resolved[key] = cover_file
+    return cover_file
+
+def find_latest_catalog_csv():
+    """Find the most recent inventory CSV across the configured locations"""
+    latest_csv = None
+    latest_time = 0
+
+    for base_path in CATALOG_CSV_PATHS:
+        if os.path.exists(base_path):
+            # Look for any CSV file starting with _inventory_ or music_catalog_
+            try:
+                for file in os.listdir(base_path):
+                    if (file.startswith('_inventory_') or file.startswith('music_catalog_') or file.startswith('music_catalog__')) and file.endswith('.csv'):
+                        csv_path = os.path.join(base_path, file)
+                        # Get file modification time to find the most recent
+                        try:
+                            file_time = os.path.getmtime(csv_path)
+                        except Exception:
+                            # Fallback to use creation time if mtime fails
+                            file_time = os.path.getctime(csv_path)
+                        if file_time > latest_time:
+                            latest_time = file_time
+                            latest_csv = csv_path
+            except Exception as e:
+                print(f"Error reading from {base_path}: {e}")
+                continue
+
+    return latest_csv, latest_time
+
+def parse_catalog_number(value, convert):
+    """Numeric inventory cell as int/float; blanks become '' and text stays text"""
+    if not value:
+        return ''
+    try:
+        return convert(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+def read_catalog_records(csv_path, debug=False):
+    """
+    Stream the audio rows of an inventory CSV as dicts, one at a time
+
+    Only the columns track records are built from are kept, other mime types
+    are skipped before a dict is made, and numeric columns get the types
+    pandas used to infer (blank cells are '').
+    """
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        # A column listed twice (api_audio_pathparam in older inventories)
+        # is read from its first occurrence, as pandas did
+        positions = {}
+        for position, name in enumerate(header):
+            if name in CATALOG_RECORD_FIELDS:
+                positions.setdefault(name, position)
+        columns = [(position, name) for name, position in positions.items()]
+        mime_position = header.index('mime_type') if 'mime_type' in header else None
+        if debug:
+            print(f"=== CSV DEBUG: Column names ===")
+            print(f"Columns: {header}")
+            print(f"=== CSV DEBUG: First 3 records ===")
+
+        emitted = 0
+        for row in reader:
+            if mime_position is not None and not (len(row) > mime_position and row[mime_position].startswith('audio/')):
+                continue
+            record = {}
+            for position, name in columns:
+                value = row[position] if position < len(row) else ''
+                convert = CATALOG_NUMERIC_FIELDS.get(name)
+                record[name] = parse_catalog_number(value, convert) if convert else value
+
+            if debug and emitted < 3:
+                print(f"Record {emitted+1}:")
+                print(f"  tailscale_echoverse_url: '{record.get('tailscale_echoverse_url', 'MISSING')}'")
+                print(f"  api_audio_pathparam: '{record.get('api_audio_pathparam', 'MISSING')}'")
+                print(f"  full_path: '{record.get('full_path', 'MISSING')}'")
+                if emitted == 0:  # Show first record's raw data
+                    print(f"  Raw record keys: {list(record.keys())}")
+                if emitted == 2:
+                    print("=== END CSV DEBUG ===")
+            emitted += 1
+            yield record
+
+def catalog_row_key(file_hash, full_path):
+    """Key used to match inventory rows across reloads (content hash, then path)"""
+    return f"{file_hash}|{full_path}"
+
+def catalog_row_fingerprint(record):
+    """Fingerprint of the inventory fields a track record is built from"""
+    values = '\x1f'.join(str(record.get(field, '')) for field in TRACK_SOURCE_FIELDS)
+    return hashlib.md5(values.encode('utf-8')).hexdigest()
+
+def build_track_record(record, cover_art_index, resolved_covers):
+    """Map one inventory CSV row to a catalog track record"""
+    # Better title fallback - use filename if title is missing
+    track_title = record.get('title', '')
+    if not track_title or track_title == 'nan' or track_title.strip() == '':
+        # Extract title from filename (remove extension and track number)
+        filename = record.get('file_name', '')
+        if filename:
+            # Remove file extension
+            filename = os.path.splitext(filename)[0]
+            # Remove track number prefix if present (e.g., "01 - " or "01.")
+            filename = re.sub(r'^\d+[\s\-\.]+', '', filename)
+            track_title = filename if filename else 'Unknown Track'
+        else:
+            track_title = 'Unknown Track'
+
+    # Better album art detection
+    cover_file = ''
+    if record.get('album'):
+        # First check if this record itself is an image file
+        file_path = record.get('full_path', '')
+        if file_path and any(file_path.lower().endswith(ext) for ext in COVER_ART_EXTENSIONS):
+            # This record is an image file
+            cover_file = file_path
+            print(f"Found image file in CSV: {file_path}")
+        else:
+            # Resolve once per album directory from the cover-art index
+            album_path = os.path.dirname(record.get('full_path', ''))
+            if album_path:
+                cover_file = resolve_album_cover(album_path, record.get('album', ''), cover_art_index, resolved_covers)
+
+    # Generate unique IDs for hierarchical tracing
+    artist_name = record.get('artist', 'AeroVista')
+    album_name = record.get('album', 'Unknown Album')
+
+    # Generate IDs in hierarchical order: artist -> album -> track. Tracks
+    # are identified by content when the inventory hashed the file
+    artist_id = generate_unique_id('artist', artist_name)
+    album_id = generate_unique_id('album', album_name, artist_id)
+    file_hash = str(record.get('file_hash', '') or '')
+    track_id = content_track_id(file_hash) if file_hash else generate_unique_id('track', track_title, album_id)
+
+    # Get tailscale URL from CSV if available
+    tailscale_url = record.get('tailscale_echoverse_url', '')
+    if not tailscale_url:
+        # Try to generate one from the file path
+        tailscale_url = convert_to_tailscale_url(record.get('full_path', ''))
+
+    return {
+        'id': track_id,  # Unique track ID
+        'album_id': album_id,  # Album ID for grouping
+        'artist_id': artist_id,  # Artist ID for grouping
+        'album': album_name,
+        'artist': artist_name,
+        'track': track_title,
+        'duration': format_duration(record.get('length_seconds', 0)),
+        'file_size': record.get('size_bytes', 0),
+        'file_path': record.get('full_path', ''),
+        'cover_file': cover_file,
+        'lyrics_file': '',  # Will need to be added later
+        'track_number': record.get('track_number', ''),
+        'year': record.get('year', ''),
+        'genre': record.get('genre', ''),
+        'bitrate': record.get('bitrate', ''),
+        'sample_rate': record.get('sample_rate', ''),
+        'filename': record.get('file_name', ''),
+        'file_hash': record.get('file_hash', ''),
+        'tailscale_echoverse_url': tailscale_url,
+        'api_audio_pathparam': record.get('api_audio_pathparam', '')
+    }
+
+def is_duplicate_row(record):
+    """The inventory's is_duplicate flag (TRUE/FALSE in any case, or a bool)"""
+    return str(record.get('is_duplicate', '')).strip().lower() in ('true', '1', 'yes')
+
+def duplicate_copy(record):
+    """Summary of an inventory row collapsed into another track with the same content"""
+    return {
+        'file_path': record.get('full_path', ''),
+        'filename': record.get('file_name', ''),
+        'album': record.get('album', ''),
+        'artist': record.get('artist', ''),
+        'file_size': record.get('size_bytes', 0),
+        'duplicate_of': record.get('duplicate_of', '')
+    }
+
+def build_catalog_tracks(records, previous=None):
+    """
+    Build track records from inventory rows.
+
+    Rows sharing a file_hash are one track: the row the inventory did not
+    flag as a duplicate (else the first) becomes the track and the others
+    are listed as its copies.
+
+    previous maps row keys to (fingerprint, track) from the loaded catalog;
+    rows whose fingerprint is unchanged reuse the existing track record, so
+    only added and changed rows go through cover art resolution again.
+
+    Returns (tracks, fingerprints, stats, duplicates) where duplicates maps
+    file_hash -> copies.
+    """
+    previous = previous or {}
+    tracks = []
+    fingerprints = {}
+    duplicates = {}
+    stats = {"added": 0, "changed": 0, "unchanged": 0, "removed": 0, "duplicates": 0}
+    cover_art_index = load_cover_art_index()
+    resolved_covers = {}  # (album_path, album_name) -> cover file, for this load only
+
+    # Rows sharing a file_hash: file_hash -> (track position, row flagged as
+    # duplicate, row key, stats bucket, copy summary if flagged)
+    canonical = {}
+
+    for record in records:
+        # Only include audio files
+        if not str(record.get('mime_type', '')).startswith('audio/'):
+            continue
+
+        file_hash = record.get('file_hash', '')
+        flagged = is_duplicate_row(record)
+        current = canonical.get(file_hash) if file_hash else None
+        if current and (not current[1] or flagged):
+            duplicates.setdefault(file_hash, []).append(duplicate_copy(record))
+            stats["duplicates"] += 1
+            continue
+
+        key = catalog_row_key(file_hash, record.get('full_path', ''))
+        fingerprint = catalog_row_fingerprint(record)
+        existing = previous.get(key)
+        if existing and existing[0] == fingerprint:
+            track = existing[1]
+            bucket = "unchanged"
+        else:
+            track = build_track_record(record, cover_art_index, resolved_covers)
+            bucket = "changed" if existing else "added"
+        stats[bucket] += 1
+
+        if current:
+            # The row kept so far was flagged as a duplicate and this one is not
+            position, _, replaced_key, replaced_bucket, replaced_copy = current
+            tracks[position] = track
+            del fingerprints[replaced_key]
+            stats[replaced_bucket] -= 1
+            duplicates.setdefault(file_hash, []).append(replaced_copy)
+            stats["duplicates"] += 1
+        else:
+            position = len(tracks)
+            tracks.append(track)
+        fingerprints[key] = fingerprint
+        if file_hash:
+            canonical[file_hash] = (position, flagged, key, bucket, duplicate_copy(record) if flagged else None)
+
+    stats["removed"] = len(set(previous) - set(fingerprints))
+    save_cover_art_index(cover_art_index)
+    return tracks, fingerprints, stats, duplicates
+
+def build_catalog_state(tracks, source=None, fingerprints=None, duplicates=None, metadata=None):
+    """Build everything derived from a track list, ready to be swapped in"""
+    return index_catalog_state({
+        "tracks": tracks,
+        "albums": group_by_album(tracks),
+        "source": source or {"path": None, "mtime": 0},
+        "fingerprints": fingerprints or {},
+        "duplicates": duplicates or {}
+    }, metadata)
+
+def index_catalog_state(state, metadata=None):
+    """
+    Add the ID lookup indexes to a catalog state.
+
+    The first track or album seen for an ID wins, matching what the old
+    linear scans returned when IDs collide. Tags and notes are indexed from
+    metadata, or the live song metadata store when it is not given.
+    """
+    tracks_by_id = {}
+    tracks_by_hash = {}
+    for track in state["tracks"]:
+        if track.get('id'):
+            tracks_by_id.setdefault(track['id'], track)
+        if track.get('file_hash'):
+            tracks_by_hash.setdefault(track['file_hash'], track)
+
+    # Albums are grouped by name, but each track carries an album ID derived
+    # from its own artist, so every album ID seen on a track maps to its group
+    albums_by_id = {}
+    artists_by_id = {}
+    for album in state["albums"].values():
+        if album.get('id'):
+            albums_by_id.setdefault(album['id'], album)
+
+        for track in album.get('tracks', []):
+            if track.get('album_id'):
+                albums_by_id.setdefault(track['album_id'], album)
+
+            artist_id = track.get('artist_id')
+            if artist_id:
+                artist = artists_by_id.setdefault(artist_id, {
+                    'id': artist_id,
+                    'artist': track.get('artist', 'AeroVista'),
+                    'album_ids': [],
+                    'track_count': 0
+                })
+                if album.get('id') not in artist['album_ids']:
+                    artist['album_ids'].append(album.get('id'))
+                artist['track_count'] += 1
+
+    state["tracks_by_id"] = tracks_by_id
+    state["tracks_by_hash"] = tracks_by_hash
+    state.setdefault("duplicates", {})
+    state["albums_by_id"] = albums_by_id
+    state["artists_by_id"] = artists_by_id
+    state["search_index"] = build_search_index(state["tracks"], song_metadata if metadata is None else metadata)
+    state["stream_table"] = build_stream_table(tracks_by_id)
+    state["stream_paths"] = build_stream_paths(state["stream_table"])
+    state["totals"] = {
+        "total_albums": len(state["albums"]),
+        "total_tracks": len(state["tracks"]),
+        "total_size_bytes": sum(album.get('total_size', 0) for album in state["albums"].values()),
+        "duplicate_files": sum(len(copies) for copies in state["duplicates"].values())
+    }
+    return state
+
+def apply_catalog_state(state):
+    """
+    Swap a fully built catalog into live traffic.
+
+    Must run on the event loop thread: every global is rebound in one step
+    with no await in between, so requests see either the old or the new
+    catalog, never a mix.
+    """
+    global catalog_data, albums_data, catalog_source, catalog_row_fingerprints, catalog_generation
+    global tracks_by_id, albums_by_id, artists_by_id, search_index, catalog_totals
+    global stream_table, stream_paths, tracks_by_hash, catalog_duplicates
+
+    (catalog_data, albums_data, catalog_source, catalog_row_fingerprints,
+     tracks_by_id, albums_by_id, artists_by_id, search_index, catalog_totals,
+     stream_table, stream_paths, tracks_by_hash, catalog_duplicates) = (
+        state["tracks"], state["albums"], state["source"], state["fingerprints"],
+        state["tracks_by_id"], state["albums_by_id"], state["artists_by_id"],
+        state["search_index"], state["totals"], state["stream_table"], state["stream_paths"],
+        state["tracks_by_hash"], state["duplicates"]
+    )
+    catalog_generation += 1
+    clear_resolved_path_cache()
+
+# Catalog snapshot: the fully built catalog is pickled next to the cover art
+# index and reused on the next start while the source CSV is unchanged.
+# Bump the version whenever the track record or state layout changes.
+CATALOG_SNAPSHOT_FILE = os.path.join(CACHE_DIR, "catalog_snapshot.pkl")
+CATALOG_SNAPSHOT_VERSION = 3
+CATALOG_SNAPSHOT_KEYS = ["tracks", "albums", "source", "fingerprints", "duplicates"]
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file, read in large chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def catalog_source_signature(csv_path, mtime):
+    """Identify an inventory CSV by path, size and mtime"""
+    return {"path": csv_path, "mtime": mtime, "size": os.path.getsize(csv_path)}
+
+def save_catalog_snapshot(state):
+    """Write the catalog state to disk for the next cold start"""
+    try:
+        source = state["source"]
+        if not source.get("path"):
+            return
+        if not source.get("sha256"):
+            source["sha256"] = file_sha256(source["path"])
+
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        snapshot = {"version": CATALOG_SNAPSHOT_VERSION}
+        snapshot.update({key: state[key] for key in CATALOG_SNAPSHOT_KEYS})
+        tmp_path = CATALOG_SNAPSHOT_FILE + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, CATALOG_SNAPSHOT_FILE)
+        print(f"Saved catalog snapshot for {source['path']}")
+    except Exception as e:
+        print(f"Error saving catalog snapshot: {e}")
+
+def load_catalog_snapshot(signature):
+    """
+    Return the snapshotted catalog state if it was built from the same CSV.
+
+    Matching size and mtime is trusted as-is; if only the mtime moved, the
+    content hash decides, so a touched but unchanged inventory still hits.
+    """
+    try:
+        if not os.path.exists(CATALOG_SNAPSHOT_FILE):
+            return None
+        with open(CATALOG_SNAPSHOT_FILE, 'rb') as f:
+            snapshot = pickle.load(f)
+        if snapshot.get("version") != CATALOG_SNAPSHOT_VERSION:
+            print("Catalog snapshot version changed, rebuilding")
+            return None
+
+        source = snapshot["source"]
+        if source.get("path") != signature["path"] or source.get("size") != signature["size"]:
+            return None
+        if source.get("mtime") != signature["mtime"]:
+            if source.get("sha256") != file_sha256(signature["path"]):
+                return None
+            source["mtime"] = signature["mtime"]
+
+        return index_catalog_state({key: snapshot[key] for key in CATALOG_SNAPSHOT_KEYS})
+    except Exception as e:
+        print(f"Error loading catalog snapshot, rebuilding: {e}")
+        return None
+
+def load_music_catalog():
+    """Load and parse the music catalog CSV, or its snapshot if unchanged"""
+    try:
         csv_loaded = False
-        latest_csv = None
-        latest_time = 0
-        
-        for base_path in csv_paths:
-            if os.path.exists(base_path):
-                # Look for any CSV file starting with _inventory_ or music_catalog_
-                try:
-                    for file in os.listdir(base_path):
-                        if (file.startswith('_inventory_') or file.startswith('music_catalog_') or file.startswith('music_catalog__')) and file.endswith('.csv'):
-                            csv_path = os.path.join(base_path, file)
-                            # Get file modification time to find the most recent
-                            try:
-                                file_time = os.path.getmtime(csv_path)
-                            except Exception:
-                                # Fallback to use creation time if mtime fails
-                                file_time = os.path.getctime(csv_path)
-                            if file_time > latest_time:
-                                latest_time = file_time
-                                latest_csv = csv_path
-                except Exception as e:
-                    print(f"Error reading from {base_path}: {e}")
-                    continue
-        
+        latest_csv, latest_time = find_latest_catalog_csv()
+
         # Load the most recent inventory file found
         if latest_csv:
             try:
-                df = pd.read_csv(latest_csv, quoting=1)  # QUOTE_ALL to handle spaces in URLs
-                
-                # Clean NaN values that cause JSON serialization errors
-                df = df.fillna('')  # Replace NaN with empty string
-                
-                # Convert to records and map to expected format
-                catalog_data = []
-                print(f"=== CSV DEBUG: Column names ===")
-                print(f"Columns: {list(df.columns)}")
-                print(f"=== CSV DEBUG: First 3 records ===")
-                for i, record in enumerate(df.to_dict('records')[:3]):
-                    print(f"Record {i+1}:")
-                    print(f"  tailscale_echoverse_url: '{record.get('tailscale_echoverse_url', 'MISSING')}'")
-                    print(f"  api_audio_pathparam: '{record.get('api_audio_pathparam', 'MISSING')}'")
-                    print(f"  full_path: '{record.get('full_path', 'MISSING')}'")
-                    if i == 0:  # Show first record's raw data
-                        print(f"  Raw record keys: {list(record.keys())}")
-                print("=== END CSV DEBUG ===")
-                
-                for record in df.to_dict('records'):
-                    # Only include audio files
-                    if record.get('mime_type', '').startswith('audio/'):
-                        # Better title fallback - use filename if title is missing
-                        track_title = record.get('title', '')
-                        if not track_title or track_title == 'nan' or track_title.strip() == '':
-                            # Extract title from filename (remove extension and track number)
-                            filename = record.get('file_name', '')
-                            if filename:
-                                # Remove file extension
-                                filename = os.path.splitext(filename)[0]
-                                # Remove track number prefix if present (e.g., "01 - " or "01.")
-                                filename = re.sub(r'^\d+[\s\-\.]+', '', filename)
-                                track_title = filename if filename else 'Unknown Track'
-                            else:
-                                track_title = 'Unknown Track'
-                        
-                        # Better album art detection
-                        cover_file = ''
-                        if record.get('album'):
-                            # First check if this record itself is an image file
-                            file_path = record.get('full_path', '')
-                            if file_path and any(file_path.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']):
-                                # This record is an image file
-                                cover_file = file_path
-                                print(f"Found image file in CSV: {file_path}")
-                            else:
-                                # Look for common cover art filenames
-                                album_path = os.path.dirname(record.get('full_path', ''))
-                                if album_path:
-                                    # Common cover art filenames (case insensitive)
-                                    base_names = [
-                                        'cover', 'album', 'front', 'folder', 'artwork', 'albumart', 
-                                        'art', 'albumcover', 'cd', 'booklet', 'sleeve', 'inlay',
-                                        record.get('album', '').lower().replace(' ', '')  # Album name as filename
-                                    ]
-                                    
-                                    extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
-                                    
-                                    # Generate all possible combinations
-                                    cover_candidates = []
-                                    for base in base_names:
-                                        for ext in extensions:
-                                            cover_candidates.append(os.path.join(album_path, f"{base}{ext}"))
-                                    
-                                    # Add numbered variants
-                                    for i in range(1, 4):
-                                        for ext in extensions:
-                                            cover_candidates.append(os.path.join(album_path, f"cover{i}{ext}"))
-                                            cover_candidates.append(os.path.join(album_path, f"{i}{ext}"))
-                                    
-                                    # Check all candidates
-                                    for cover in cover_candidates:
-                                        if os.path.exists(cover):
-                                            cover_file = cover
-                                            print(f"Found cover art for {record.get('album')}: {cover}")
-                                            break
-                                    
-                                    # If still no cover, look for any image file in the album directory
-                                    if not cover_file and os.path.exists(album_path):
-                                        try:
-                                            # First look for files with "cover" or "art" in the name
-                                            for file in os.listdir(album_path):
-                                                lower_file = file.lower()
-                                                if any(term in lower_file for term in ['cover', 'art', 'front', 'album']) and \
-                                                   any(lower_file.endswith(ext) for ext in extensions):
-                                                    cover_file = os.path.join(album_path, file)
-                                                    print(f"Found image file with cover keyword: {cover_file}")
-                                                    break
-                                            
-                                            # If still no cover, take any image file
-                                            if not cover_file:
-                                                for file in os.listdir(album_path):
-                                                    file_path = os.path.join(album_path, file)
-                                                    if any(file.lower().endswith(ext) for ext in extensions):
-                                                        cover_file = file_path
-                                                        print(f"Found image file in album directory: {cover_file}")
-                                                        break
-                                        except Exception as e:
-                                            print(f"Error listing directory {album_path}: {e}")
-                                    
-                                    if not cover_file:
-                                        print(f"No cover art found for {record.get('album')} in {album_path}")
-                        
-                        # Generate unique IDs for hierarchical tracing
-                        artist_name = record.get('artist', 'AeroVista')
-                        album_name = record.get('album', 'Unknown Album')
-                        
-                        # Generate IDs in hierarchical order: artist -> album -> track
-                        artist_id = generate_unique_id('artist', artist_name)
-                        album_id = generate_unique_id('album', album_name, artist_id)
-                        track_id = generate_unique_id('track', track_title, album_id)
-                        
-                        # Get tailscale URL from CSV if available
-                        tailscale_url = record.get('tailscale_echoverse_url', '')
-                        if not tailscale_url:
-                            # Try to generate one from the file path
-                            tailscale_url = convert_to_tailscale_url(record.get('full_path', ''))
-                        
-                        cleaned_record = {
-                            'id': track_id,  # Unique track ID
-                            'album_id': album_id,  # Album ID for grouping
-                            'artist_id': artist_id,  # Artist ID for grouping
-                            'album': album_name,
-                            'artist': artist_name,
-                            'track': track_title,
-                            'duration': format_duration(record.get('length_seconds', 0)),
-                            'file_size': record.get('size_bytes', 0),
-                            'file_path': record.get('full_path', ''),
-                            'cover_file': cover_file,
-                            'lyrics_file': '',  # Will need to be added later
-                            'track_number': record.get('track_number', ''),
-                            'year': record.get('year', ''),
-                            'genre': record.get('genre', ''),
-                            'bitrate': record.get('bitrate', ''),
-                            'sample_rate': record.get('sample_rate', ''),
-                            'filename': record.get('file_name', ''),
-                            'tailscale_echoverse_url': tailscale_url,
-                            'api_audio_pathparam': record.get('api_audio_pathparam', '')
-                        }
-                        catalog_data.append(cleaned_record)
-                
+                signature = catalog_source_signature(latest_csv, latest_time)
+                state = load_catalog_snapshot(signature)
+                if state:
+                    print(f"Loaded catalog snapshot for: {latest_csv}")
+                else:
+                    records = read_catalog_records(latest_csv, debug=True)
+                    tracks, fingerprints, stats, duplicates = build_catalog_tracks(records)
+                    state = build_catalog_state(tracks, signature, fingerprints, duplicates)
+                    print(f"Collapsed {stats['duplicates']} duplicate files")
+                    save_catalog_snapshot(state)
+                    print(f"Loaded catalog from: {latest_csv}")
                 csv_loaded = True
-                print(f"Loaded catalog from: {latest_csv}")
-                print(f"Total audio tracks: {len(catalog_data)}")
-                
+                print(f"Total audio tracks: {len(state['tracks'])}")
+
             except Exception as e:
                 print(f"Error loading catalog from {latest_csv}: {e}")
                 csv_loaded = False
-        
+
         if not csv_loaded:
             # Create sample data for development
-            catalog_data = create_sample_catalog()
+            state = build_catalog_state(create_sample_catalog())
             print("Using sample catalog data")
-        
-        # Group by album for better organization
-        albums_data = group_by_album(catalog_data)
-        
+
+        apply_catalog_state(state)
+
     except Exception as e:
         print(f"Error loading catalog: {e}")
-        catalog_data = create_sample_catalog()
-        albums_data = group_by_album(catalog_data)
+        apply_catalog_state(build_catalog_state(create_sample_catalog()))
+
+def prepare_catalog_reload(force=False, metadata=None):
+    """
+    Build a catalog state from the newest inventory CSV, diffed against the
+    loaded catalog. Runs off the event loop; returns None if nothing changed.
+    force re-reads the current CSV and rebuilds every row from scratch.
+    metadata is the copy of the song metadata store to index tags and notes from.
+    """
+    latest_csv, latest_time = find_latest_catalog_csv()
+    if not latest_csv:
+        return None
+    if not force and latest_csv == catalog_source.get("path") and latest_time == catalog_source.get("mtime"):
+        return None
+
+    # Pair the loaded tracks with the fingerprints of the rows they came from
+    previous = {}
+    fingerprints = {} if force else catalog_row_fingerprints
+    for track in catalog_data:
+        key = catalog_row_key(track.get('file_hash', ''), track.get('file_path', ''))
+        if key in fingerprints:
+            previous[key] = (fingerprints[key], track)
+
+    records = read_catalog_records(latest_csv)
+    tracks, new_fingerprints, stats, duplicates = build_catalog_tracks(records, previous)
+    print(f"Reloaded catalog from: {latest_csv} "
+          f"({stats['added']} added, {stats['changed']} changed, "
+          f"{stats['removed']} removed, {stats['unchanged']} unchanged, "
+          f"{stats['duplicates']} duplicates)")
+
+    state = build_catalog_state(
+        tracks, catalog_source_signature(latest_csv, latest_time), new_fingerprints, duplicates, metadata
+    )
+    save_catalog_snapshot(state)
+    state["stats"] = stats
+    return state
+
+async def reload_music_catalog(force=False):
+    """Rebuild the catalog in a worker thread, then swap it in on the event loop"""
+    async with catalog_reload_lock:
+        loop = asyncio.get_running_loop()
+        # The new search index is built from a copy of the song metadata;
+        # writes that land while it builds are applied to it before the swap
+        metadata, revision = dict(song_metadata), song_metadata_revision
+        state = await loop.run_in_executor(None, prepare_catalog_reload, force, metadata)
+        if state:
+            reindex_song_metadata_since(state["search_index"], metadata, revision)
+            apply_catalog_state(state)
+            # Album directories may have changed; rescan them in the background
+            spawn_background_task(refresh_image_index())
+        return state
+
+background_tasks = set()
+
+def spawn_background_task(coro):
+    """Run a coroutine in the background, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def watch_catalog_csv():
+    """Background watcher: poll the inventory locations and apply newer CSVs"""
+    while True:
+        await asyncio.sleep(CATALOG_WATCH_INTERVAL_SECONDS)
+        try:
+            await reload_music_catalog()
+        except Exception as e:
+            print(f"Error reloading catalog: {e}")
 
 def create_sample_catalog():
     """Create sample catalog data for development"""
@@ -498,7 +1048,7 @@ def group_by_album(data):
         
         # Safely handle file size
         file_size = track.get('file_size', 0)
-        if pd.isna(file_size) or file_size == 'nan':
+        if is_missing_value(file_size) or file_size == 'nan':
             file_size = 0
         try:
             file_size = float(file_size) if file_size else 0
@@ -508,7 +1058,7 @@ def group_by_album(data):
         
         # Parse duration safely
         duration = track.get('duration', '0:00')
-        if pd.isna(duration) or duration == 'nan':
+        if is_missing_value(duration) or duration == 'nan':
             duration = '0:00'
         try:
             if isinstance(duration, str) and ':' in str(duration):
@@ -524,6 +1074,300 @@ def group_by_album(data):
     
     return albums
 
+# Search index: token -> {track position: field weight}, plus a sorted
+# vocabulary for prefix matches and a trigram map for matches inside words
+SEARCH_TOKEN_PATTERN = re.compile(r"\w+")
+SEARCH_FIELD_WEIGHTS = {
+    'track': 4.0,
+    'artist': 3.0,
+    'album': 3.0,
+    'genre': 2.0,
+    'tags': 2.0,
+    'filename': 1.0,
+    'notes': 1.0
+}
+SEARCH_EXACT_FACTOR = 1.0
+SEARCH_PREFIX_FACTOR = 0.6
+SEARCH_INFIX_FACTOR = 0.3
+SEARCH_MAX_EXPANSIONS = 64  # vocabulary tokens considered per prefix/infix query token
+SEARCH_DEFAULT_LIMIT = 100
+SEARCH_MAX_LIMIT = 1000
+
+def tokenize_text(text):
+    """Lower-case word tokens of a field value"""
+    if not text:
+        return []
+    return SEARCH_TOKEN_PATTERN.findall(str(text).lower())
+
+def text_trigrams(token):
+    """Character trigrams of a token"""
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+def fuzzy_trigrams(token):
+    """Trigrams of a token padded at both ends, so short words still get grams"""
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def fuzzy_max_distance(token):
+    """Edit distance allowed for a query token: 1 for short words, 2 otherwise"""
+    return 1 if len(token) <= 4 else 2
+
+def bounded_edit_distance(a, b, max_distance):
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent swaps),
+    giving up as soon as it must exceed max_distance.
+    Returns max_distance + 1 when the bound is exceeded.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+def fuzzy_expand_query_token(index, query_token):
+    """
+    Vocabulary tokens within edit distance of a query token.
+
+    Only tokens sharing enough padded trigrams with the query can be within
+    the allowed distance, so the edit distance is computed for those alone.
+    Returns {token: distance}.
+    """
+    max_distance = fuzzy_max_distance(query_token)
+    query_grams = fuzzy_trigrams(query_token)
+    # Each edit destroys at most 3 trigrams
+    min_shared = max(1, len(query_grams) - 3 * max_distance)
+
+    shared = {}
+    for gram in query_grams:
+        for token in index["fuzzy_grams"].get(gram, ()):
+            shared[token] = shared.get(token, 0) + 1
+
+    matches = {}
+    for token, count in shared.items():
+        if count < min_shared:
+            continue
+        distance = bounded_edit_distance(query_token, token, max_distance)
+        if distance <= max_distance:
+            matches[token] = distance
+    return matches
+
+def fuzzy_search_index_query(index, query):
+    """
+    Typo-tolerant ranking of track positions for a query.
+
+    Every query token must match some word within its edit distance.
+    Returns {position: (total distance, -total field weight)}, so sorting
+    the values ranks closest matches first, then stronger fields.
+    """
+    query_tokens = list(dict.fromkeys(tokenize_text(query)))
+    if not query_tokens:
+        return {}
+
+    per_token_matches = []
+    for query_token in query_tokens:
+        token_matches = {}
+        for token, distance in fuzzy_expand_query_token(index, query_token).items():
+            for position, weight in index["postings"][token].items():
+                best = token_matches.get(position)
+                if best is None or (distance, -weight) < best:
+                    token_matches[position] = (distance, -weight)
+        if not token_matches:
+            return {}
+        per_token_matches.append(token_matches)
+
+    per_token_matches.sort(key=len)
+    results = dict(per_token_matches[0])
+    for token_matches in per_token_matches[1:]:
+        results = {
+            position: (rank[0] + token_matches[position][0], rank[1] + token_matches[position][1])
+            for position, rank in results.items()
+            if position in token_matches
+        }
+        if not results:
+            break
+    return results
+
+def load_song_metadata():
+    """
+    Load songs keyed by inventory file_hash, ordered by revision
+
+    Replays song_metadata.jsonl (a later line for a hash replaces the
+    earlier one); before the first write, falls back to the songs in
+    song_metadata.json.
+    """
+    songs = OrderedDict()
+    try:
+        if os.path.exists(SONG_METADATA_LOG_FILE):
+            with open(SONG_METADATA_LOG_FILE, 'r', encoding='utf-8') as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-append
+                        print(f"Skipping unreadable song metadata log line {line_number}")
+                        continue
+                    if record.get('unique_id'):
+                        songs.pop(record['unique_id'], None)
+                        songs[record['unique_id']] = record
+        elif os.path.exists(SONG_METADATA_FILE):
+            with open(SONG_METADATA_FILE, 'r', encoding='utf-8') as f:
+                for revision, (file_hash, record) in enumerate(json.load(f).get('songs', {}).items(), 1):
+                    songs[file_hash] = dict(record, unique_id=file_hash, revision=revision)
+    except Exception as e:
+        print(f"Error loading song metadata: {e}")
+    return songs
+
+def build_search_index(tracks, song_metadata=None):
+    """Build the inverted index for /api/search"""
+    song_metadata = song_metadata or {}
+    postings = {}
+    hash_positions = {}
+
+    for position, track in enumerate(tracks):
+        if track.get('file_hash'):
+            hash_positions.setdefault(track['file_hash'], []).append(position)
+        metadata = song_metadata.get(track.get('file_hash', ''), {})
+        fields = {
+            'track': track.get('track', ''),
+            'artist': track.get('artist', ''),
+            'album': track.get('album', ''),
+            'genre': track.get('genre', ''),
+            'filename': os.path.splitext(str(track.get('filename', '')))[0],
+            'tags': ' '.join(metadata.get('tags', [])),
+            'notes': metadata.get('notes', '')
+        }
+        for field, value in fields.items():
+            weight = SEARCH_FIELD_WEIGHTS[field]
+            for token in set(tokenize_text(value)):
+                docs = postings.setdefault(token, {})
+                docs[position] = docs.get(position, 0) + weight
+
+    trigrams = {}
+    fuzzy_grams = {}
+    for token in postings:
+        for trigram in text_trigrams(token):
+            trigrams.setdefault(trigram, set()).add(token)
+        for gram in fuzzy_trigrams(token):
+            fuzzy_grams.setdefault(gram, []).append(token)
+
+    return {
+        "postings": postings,
+        "vocab": sorted(postings),
+        "trigrams": trigrams,
+        "fuzzy_grams": fuzzy_grams,
+        "hash_positions": hash_positions
+    }
+
+def update_search_index_metadata(index, file_hash, old_metadata, new_metadata):
+    """Re-index the tags and notes of every track with this file_hash in place"""
+    postings = index["postings"]
+    for field in ('tags', 'notes'):
+        old_value, new_value = old_metadata.get(field), new_metadata.get(field)
+        if old_value == new_value:
+            continue
+        if field == 'tags':
+            old_value, new_value = ' '.join(old_value or []), ' '.join(new_value or [])
+        weight = SEARCH_FIELD_WEIGHTS[field]
+        old_tokens, new_tokens = set(tokenize_text(old_value)), set(tokenize_text(new_value))
+
+        for position in index["hash_positions"].get(file_hash, ()):
+            for token in old_tokens - new_tokens:
+                docs = postings.get(token, {})
+                remaining = docs.get(position, 0) - weight
+                if remaining > 1e-9:
+                    docs[position] = remaining
+                else:
+                    docs.pop(position, None)
+            for token in new_tokens - old_tokens:
+                if token not in postings:
+                    postings[token] = {}
+                    bisect.insort(index["vocab"], token)
+                    for trigram in text_trigrams(token):
+                        index["trigrams"].setdefault(trigram, set()).add(token)
+                    for gram in fuzzy_trigrams(token):
+                        index["fuzzy_grams"].setdefault(gram, []).append(token)
+                docs = postings[token]
+                docs[position] = docs.get(position, 0) + weight
+
+def expand_query_token(index, query_token):
+    """Vocabulary tokens matching a query token, with their match factor"""
+    postings = index["postings"]
+    matches = {}
+    if query_token in postings:
+        matches[query_token] = SEARCH_EXACT_FACTOR
+
+    # Prefix matches from the sorted vocabulary
+    vocab = index["vocab"]
+    start = bisect.bisect_left(vocab, query_token)
+    for token in vocab[start:start + SEARCH_MAX_EXPANSIONS + 1]:
+        if not token.startswith(query_token):
+            break
+        matches.setdefault(token, SEARCH_PREFIX_FACTOR)
+
+    # Matches inside a word: tokens sharing every trigram, then verified
+    if len(query_token) >= 3:
+        candidate_sets = [index["trigrams"].get(t, set()) for t in text_trigrams(query_token)]
+        candidates = set.intersection(*sorted(candidate_sets, key=len)) if all(candidate_sets) else set()
+        expansions = 0
+        for token in candidates:
+            if token not in matches and query_token in token:
+                matches[token] = SEARCH_INFIX_FACTOR
+                expansions += 1
+                if expansions >= SEARCH_MAX_EXPANSIONS:
+                    break
+    return matches
+
+def search_index_query(index, query):
+    """
+    Rank track positions for a query.
+
+    Every query token must match (exactly, as a prefix, or inside a word);
+    a track scores the best field weight x match factor per query token.
+    Returns {position: score}.
+    """
+    query_tokens = list(dict.fromkeys(tokenize_text(query)))
+    if not query_tokens:
+        return {}
+
+    per_token_scores = []
+    for query_token in query_tokens:
+        token_scores = {}
+        for token, factor in expand_query_token(index, query_token).items():
+            for position, weight in index["postings"][token].items():
+                score = weight * factor
+                if score > token_scores.get(position, 0):
+                    token_scores[position] = score
+        if not token_scores:
+            return {}
+        per_token_scores.append(token_scores)
+
+    # Intersect starting from the most selective token
+    per_token_scores.sort(key=len)
+    results = dict(per_token_scores[0])
+    for token_scores in per_token_scores[1:]:
+        results = {
+            position: score + token_scores[position]
+            for position, score in results.items()
+            if position in token_scores
+        }
+        if not results:
+            break
+    return results
+
 @app.get("/gallery")
 async def gallery_page(request: Request):
     """Album Art Gallery page"""
@@ -539,126 +1383,1136 @@ async def root(request: Request):
     """Main dashboard"""
     return templates.TemplateResponse("dashboard.html", {
         "request": request,
-        "total_albums": len(albums_data),
-        "total_tracks": len(catalog_data),
-        "total_size_gb": sum(track.get('file_size', 0) for track in catalog_data) / (1024**3)
+        "total_albums": catalog_totals["total_albums"],
+        "total_tracks": catalog_totals["total_tracks"],
+        "total_size_gb": catalog_totals["total_size_bytes"] / (1024**3)
     })
 
-@app.get("/api/catalog")
-async def get_catalog():
-    """Get full catalog data"""
-    # Debug: Check first few albums for cover art
-    print("=== CATALOG DEBUG ===")
-    for i, (album_name, album_data) in enumerate(list(albums_data.items())[:3]):
-        print(f"Album {i+1}: {album_name}")
-        print(f"  Cover: {album_data.get('cover', 'NO COVER')}")
-        print(f"  Tracks: {len(album_data.get('tracks', []))}")
-    print("===================")
-    
-    return {
-        "albums": albums_data,
-        "tracks": catalog_data,
-        "stats": {
-            "total_albums": len(albums_data),
-            "total_tracks": len(catalog_data),
-            "total_size_bytes": sum(track.get('file_size', 0) for track in catalog_data)
-        }
+# Serialized response cache for catalog-derived endpoints: each payload is
+# serialized and compressed once per generation and served with a strong
+# ETag, so unchanged data costs clients a 304 instead of a re-download.
+# Each encoding is a different byte sequence, so each gets its own ETag
+RESPONSE_CACHE_MAX_ENTRIES = 256
+RESPONSE_CACHE_MIN_COMPRESS_BYTES = 1024
+RESPONSE_ENCODING_ETAG_SUFFIXES = {"identity": "", "gzip": "-gz", "br": "-br"}
+response_cache = OrderedDict()  # cache key -> serialized entry
+response_cache_locks = {}
+
+def build_response_cache_entry(generation, payload):
+    """Serialize a payload once and precompress it"""
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str).encode('utf-8')
+    generation_tag = '.'.join(map(str, generation)) if isinstance(generation, tuple) else str(generation)
+    entry = {
+        "generation": generation,
+        "etag": f'"g{generation_tag}-{hashlib.md5(body).hexdigest()}"',
+        "identity": body,
+        "gzip": None,
+        "br": None
     }
+    if len(body) >= RESPONSE_CACHE_MIN_COMPRESS_BYTES:
+        entry["gzip"] = gzip.compress(body, compresslevel=6)
+        if brotli is not None:
+            entry["br"] = brotli.compress(body, quality=5)
+    return entry
 
-@app.get("/api/albums")
-async def get_albums():
-    """Get albums list"""
-    return list(albums_data.values())
+def encoded_etag(etag, encoding):
+    """The ETag of one encoding of a cached body"""
+    return f'{etag[:-1]}{RESPONSE_ENCODING_ETAG_SUFFIXES[encoding]}"'
 
-@app.get("/api/albums/{album_name}")
-async def get_album(album_name: str):
-    """Get specific album details"""
-    if album_name not in albums_data:
-        raise HTTPException(status_code=404, detail="Album not found")
-    return albums_data[album_name]
+def etag_matches(if_none_match, etag):
+    """If-None-Match comparison (weak, as RFC 9110 requires for this header)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
 
-@app.get("/api/search")
-async def search_catalog(q: str = ""):
-    """Search catalog by album, artist, track, or lyrics"""
-    if not q:
-        return catalog_data
-    
-    q_lower = q.lower()
-    results = []
-    
-    for track in catalog_data:
-        # Search in various fields
-        if (q_lower in track.get('album', '').lower() or
-            q_lower in track.get('artist', '').lower() or
-            q_lower in track.get('track', '').lower()):
-            results.append(track)
-    
-    return results
+def preferred_encoding(accept_encoding, entry):
+    """Pick br, then gzip, if the client accepts it and a precompressed body exists"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        pieces = part.strip().split(';')
+        name = pieces[0].strip().lower()
+        quality = 1.0
+        for param in pieces[1:]:
+            if param.strip().startswith('q='):
+                try:
+                    quality = float(param.strip()[2:])
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name] = quality
+    for encoding in ('br', 'gzip'):
+        if entry[encoding] is not None and accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return 'identity'
 
-@app.post("/api/work-orders")
-async def create_work_order(work_order: Dict[str, Any]):
-    """Create a new work order"""
-    try:
-        # Add timestamp and ID
-        work_order['id'] = f"wo_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        work_order['created_at'] = datetime.now().isoformat()
-        
-        # Save to work orders file
-        work_orders_file = "work_orders.json"
-        existing_orders = []
-        
-        if os.path.exists(work_orders_file):
-            with open(work_orders_file, 'r') as f:
-                existing_orders = json.load(f)
-        
-        existing_orders.append(work_order)
-        
-        with open(work_orders_file, 'w') as f:
-            json.dump(existing_orders, f, indent=2)
-        
-        return {"success": True, "work_order": work_order}
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error creating work order: {str(e)}")
+async def cached_json_response(request, cache_key, generation, build):
+    """
+    Serve build()'s JSON payload from the response cache.
 
-@app.get("/api/work-orders")
-async def get_work_orders():
-    """Get all work orders"""
+    The payload is rebuilt (in a worker thread) only when the generation
+    changes. If-None-Match requests naming any encoding of the current
+    body get a 304.
+    """
+    entry = response_cache.get(cache_key)
+    if not entry or entry["generation"] != generation:
+        lock = response_cache_locks.setdefault(cache_key, asyncio.Lock())
+        async with lock:
+            entry = response_cache.get(cache_key)
+            if not entry or entry["generation"] != generation:
+                loop = asyncio.get_running_loop()
+                entry = await loop.run_in_executor(
+                    None, lambda: build_response_cache_entry(generation, build())
+                )
+                response_cache[cache_key] = entry
+                while len(response_cache) > RESPONSE_CACHE_MAX_ENTRIES:
+                    evicted_key, _ = response_cache.popitem(last=False)
+                    response_cache_locks.pop(evicted_key, None)
+    response_cache.move_to_end(cache_key)
+
+    encoding = preferred_encoding(request.headers.get('accept-encoding'), entry)
+    headers = {
+        "ETag": encoded_etag(entry["etag"], encoding),
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "no-cache"  # always revalidate; unchanged data costs a 304
+    }
+    if_none_match = request.headers.get('if-none-match')
+    if any(etag_matches(if_none_match, encoded_etag(entry["etag"], name))
+           for name in RESPONSE_ENCODING_ETAG_SUFFIXES if entry[name] is not None):
+        return Response(status_code=304, headers=headers)
+
+    if encoding != 'identity':
+        headers["Content-Encoding"] = encoding
+    return Response(content=entry[encoding], media_type="application/json", headers=headers)
+
+def encode_catalog_cursor(generation, offset):
+    """Opaque page cursor, only valid for the catalog generation it came from"""
+    raw = json.dumps({"g": generation, "o": offset}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_catalog_cursor(cursor):
+    """Return (generation, offset) from a page cursor"""
     try:
-        work_orders_file = "work_orders.json"
-        if os.path.exists(work_orders_file):
-            with open(work_orders_file, 'r') as f:
-                return json.load(f)
-        return []
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return int(data["g"]), max(0, int(data["o"]))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def project_fields(item, fields):
+    """Keep only the requested fields of a track or album (always with its id)"""
+    if not fields:
+        return item
+    return {key: item[key] for key in ['id'] + fields if key in item}
+
+def summarize_album(album):
+    """Album with track IDs in place of embedded track objects"""
+    summary = {key: value for key, value in album.items() if key != 'tracks'}
+    summary['track_ids'] = [track.get('id', '') for track in album.get('tracks', [])]
+    summary['track_count'] = len(summary['track_ids'])
+    return summary
+
+@app.get("/api/catalog")
+async def get_catalog(
+    request: Request,
+    view: str = "full",
+    cursor: Optional[str] = None,
+    limit: int = CATALOG_PAGE_DEFAULT_LIMIT,
+    fields: str = "",
+    summary: bool = False
+):
+    """
+    Get catalog data
+
+    Parameters:
+    - view: "full" (every album and track in one response), "albums" or "tracks" (paged)
+    - cursor: next_cursor from the previous page (paged views)
+    - limit: items per page (paged views, max 1000)
+    - fields: comma-separated fields to return per item (paged views)
+    - summary: albums view only; return track_ids instead of embedded tracks
+    """
+    if view not in ("full", "albums", "tracks"):
+        raise HTTPException(status_code=400, detail="view must be 'full', 'albums' or 'tracks'")
+
+    # Read everything for this response from one catalog generation
+    generation, totals, albums, tracks = catalog_generation, catalog_totals, albums_data, catalog_data
+    cache_key = ("catalog", tuple(sorted(request.query_params.multi_items())))
+    if view == "full":
+        return await cached_json_response(request, cache_key, generation, lambda: {
+            "albums": albums,
+            "tracks": tracks,
+            "stats": totals
+        })
+
+    offset = 0
+    if cursor:
+        cursor_generation, offset = decode_catalog_cursor(cursor)
+        if cursor_generation != generation:
+            raise HTTPException(status_code=409, detail="Catalog was reloaded, restart from the first page")
+    limit = max(1, min(limit, CATALOG_PAGE_MAX_LIMIT))
+    requested_fields = [field.strip() for field in fields.split(',') if field.strip()]
+
+    def build_page():
+        items = list(albums.values()) if view == "albums" else tracks
+        page = items[offset:offset + limit]
+        if view == "albums" and summary:
+            page = [summarize_album(album) for album in page]
+        page = [project_fields(item, requested_fields) for item in page]
+
+        next_offset = offset + len(page)
+        return {
+            "view": view,
+            "items": page,
+            "next_cursor": encode_catalog_cursor(generation, next_offset) if next_offset < len(items) else None,
+            "generation": generation,
+            "stats": totals
+        }
+
+    return await cached_json_response(request, cache_key, generation, build_page)
+
+@app.post("/api/catalog/reload")
+async def reload_catalog(force: bool = False):
+    """Pick up a newer inventory CSV without restarting the server"""
+    try:
+        state = await reload_music_catalog(force=force)
+        return {
+            "reloaded": state is not None,
+            "source": catalog_source.get("path"),
+            "changes": state.get("stats") if state else None,
+            "total_tracks": len(catalog_data)
+        }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading work orders: {str(e)}")
+        print(f"Error reloading catalog: {e}")
+        raise HTTPException(status_code=500, detail=f"Error reloading catalog: {str(e)}")
 
-@app.get("/api/export-work-order/{work_order_id}")
-async def export_work_order(work_order_id: str):
-    """Export work order as JSON file"""
+@app.get("/api/albums")
+async def get_albums(request: Request):
+    """Get albums list"""
+    albums = albums_data
+    return await cached_json_response(request, "albums", catalog_generation, lambda: list(albums.values()))
+
+@app.get("/api/albums/{album_name}")
+async def get_album(album_name: str):
+    """Get specific album details"""
+    if album_name not in albums_data:
+        raise HTTPException(status_code=404, detail="Album not found")
+    return albums_data[album_name]
+
+@app.get("/api/search")
+async def search_catalog(q: str = "", limit: int = SEARCH_DEFAULT_LIMIT, offset: int = 0, mode: str = "standard"):
+    """
+    Search catalog by title, album, artist, genre, filename, tags and notes
+
+    Parameters:
+    - mode: "standard" (word, prefix and in-word matches) or "fuzzy" (typo tolerant)
+    """
+    if mode not in ("standard", "fuzzy"):
+        raise HTTPException(status_code=400, detail="mode must be 'standard' or 'fuzzy'")
+    limit = max(0, min(limit, SEARCH_MAX_LIMIT))
+    offset = max(0, offset)
+
+    # Read the catalog and its index together so a reload can't split them
+    tracks, index = catalog_data, search_index
+    if not q.strip():
+        return JSONResponse(
+            content=tracks[offset:offset + limit],
+            headers={"X-Total-Count": str(len(tracks))}
+        )
+
+    if mode == "fuzzy":
+        ranks = fuzzy_search_index_query(index, q)
+        ranked = heapq.nsmallest(offset + limit, ranks, key=lambda position: (ranks[position], position))
+    else:
+        ranks = search_index_query(index, q)
+        ranked = heapq.nsmallest(offset + limit, ranks, key=lambda position: (-ranks[position], position))
+    return JSONResponse(
+        content=[tracks[position] for position in ranked[offset:]],
+        headers={"X-Total-Count": str(len(ranks))}
+    )
+
+# Work order store: an append-only JSON Lines log replayed into an
+# in-memory index at startup. Each line is a complete work order; a later
+# line for the same ID replaces the earlier one. Appends are serialized by
+# a lock and fsynced, so concurrent requests cannot lose each other's writes.
+WORK_ORDERS_FILE = os.path.join(os.path.dirname(__file__), "work_orders.jsonl")
+WORK_ORDERS_LEGACY_FILE = os.path.join(os.path.dirname(__file__), "work_orders.json")
+WORK_ORDERS_MAX_LIMIT = 1000
+WORK_ORDER_STATUSES = ["pending", "in-progress", "completed", "cancelled"]
+WORK_ORDER_PRIORITIES = ["low", "medium", "high", "urgent"]
+WORK_ORDER_INDEXED_FIELDS = ("status", "priority", "type", "assignee")
+WORK_ORDER_UPDATE_FIELDS = {"status", "priority", "assignee", "add_tracks", "remove_tracks"}
+work_orders = {}  # work order ID -> work order, in creation order
+work_order_positions = {}  # work order ID -> creation sequence number
+work_order_indexes = {field: {} for field in WORK_ORDER_INDEXED_FIELDS}  # field -> value -> IDs
+work_order_track_index = {}  # track ID -> IDs of work orders containing it
+work_orders_lock = asyncio.Lock()
+
+def work_order_track_ids(work_order):
+    """IDs of the catalog tracks a work order contains"""
+    return {
+        track.get('id') for track in work_order.get('tracks') or []
+        if isinstance(track, dict) and track.get('id')
+    }
+
+def index_work_order(work_order, add=True):
+    """Add a work order to (or remove it from) the secondary indexes"""
+    work_order_id = work_order['id']
+    postings = [
+        work_order_indexes[field].setdefault(work_order[field], set())
+        for field in WORK_ORDER_INDEXED_FIELDS
+        if isinstance(work_order.get(field), str)
+    ]
+    postings.extend(work_order_track_index.setdefault(track_id, set()) for track_id in work_order_track_ids(work_order))
+    for ids in postings:
+        if add:
+            ids.add(work_order_id)
+        else:
+            ids.discard(work_order_id)
+
+def publish_work_order(work_order):
+    """Make a work order visible, replacing any earlier version of it"""
+    previous = work_orders.get(work_order['id'])
+    if previous is not None:
+        index_work_order(previous, add=False)
+    else:
+        work_order_positions[work_order['id']] = len(work_order_positions)
+    work_orders[work_order['id']] = work_order
+    index_work_order(work_order)
+
+def append_work_order_records(records):
+    """Append work orders to the log as one write and flush them to disk"""
+    lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+    with open(WORK_ORDERS_FILE, 'a', encoding='utf-8') as f:
+        f.write(lines)
+        f.flush()
+        os.fsync(f.fileno())
+
+def compact_work_orders_log():
+    """Rewrite the log with only the current version of each work order"""
+    temp_file = WORK_ORDERS_FILE + ".tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        for work_order in work_orders.values():
+            f.write(json.dumps(work_order, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, WORK_ORDERS_FILE)
+
+def load_work_orders():
+    """Replay the work order log, importing the old work_orders.json on first run"""
+    work_orders.clear()
+    work_order_positions.clear()
+    work_order_track_index.clear()
+    for index in work_order_indexes.values():
+        index.clear()
+    try:
+        if not os.path.exists(WORK_ORDERS_FILE) and os.path.exists(WORK_ORDERS_LEGACY_FILE):
+            with open(WORK_ORDERS_LEGACY_FILE, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+            append_work_order_records(legacy)
+            print(f"Imported {len(legacy)} work orders from {WORK_ORDERS_LEGACY_FILE}")
+
+        if os.path.exists(WORK_ORDERS_FILE):
+            line_count = 0
+            with open(WORK_ORDERS_FILE, 'r', encoding='utf-8') as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    line_count += 1
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-append
+                        print(f"Skipping unreadable work order log line {line_number}")
+                        continue
+                    if record.get('id'):
+                        publish_work_order(record)
+            # Every update appends a full copy, so drop superseded versions
+            # once they outnumber the live work orders
+            if line_count > 2 * len(work_orders) + 64:
+                compact_work_orders_log()
+                print(f"Compacted work order log from {line_count} to {len(work_orders)} lines")
+        print(f"Loaded {len(work_orders)} work orders")
+    except Exception as e:
+        print(f"Error loading work orders: {e}")
+
+def new_work_order_id():
+    """Timestamped work order ID with a random suffix, unique within the store"""
+    while True:
+        work_order_id = f"wo_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(3)}"
+        if work_order_id not in work_orders:
+            return work_order_id
+
+async def save_work_orders(records):
+    """Durably append work orders, then publish them; callers hold work_orders_lock"""
+    await asyncio.get_running_loop().run_in_executor(None, append_work_order_records, records)
+    for record in records:
+        publish_work_order(record)
+
+def validate_work_order_choice(field, value, choices):
+    """Reject status/priority values the workflow does not know"""
+    if value not in choices:
+        raise HTTPException(status_code=400, detail=f"Invalid {field} '{value}'. Choose from: {', '.join(choices)}")
+
+def work_order_track_entry(track):
+    """Work order track entry for a catalog track ID or a {id, ...} object"""
+    track_id = track.get('id') if isinstance(track, dict) else track
+    if not isinstance(track_id, str) or not track_id:
+        raise HTTPException(status_code=400, detail="Tracks need a string 'id'")
+    catalog_track = tracks_by_id.get(track_id)
+    if catalog_track is None:
+        # Objects outside the catalog are kept as sent, like on create
+        if isinstance(track, dict):
+            return track
+        raise HTTPException(status_code=400, detail=f"Unknown track ID: {track_id}")
+    return {
+        'id': track_id,
+        'track': catalog_track.get('track', ''),
+        'album': catalog_track.get('album', ''),
+        'artist': catalog_track.get('artist', ''),
+    }
+
+def updated_work_order(work_order, update):
+    """Copy of a work order with a PATCH/bulk update applied"""
+    unknown = set(update) - WORK_ORDER_UPDATE_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot update: {', '.join(sorted(unknown))}")
+
+    work_order = dict(work_order)
+    if 'status' in update:
+        validate_work_order_choice('status', update['status'], WORK_ORDER_STATUSES)
+        work_order['status'] = update['status']
+    if 'priority' in update:
+        validate_work_order_choice('priority', update['priority'], WORK_ORDER_PRIORITIES)
+        work_order['priority'] = update['priority']
+    if 'assignee' in update:
+        if update['assignee']:
+            work_order['assignee'] = str(update['assignee'])
+        else:
+            work_order.pop('assignee', None)
+
+    if 'add_tracks' in update or 'remove_tracks' in update:
+        removed = {
+            track.get('id') if isinstance(track, dict) else track
+            for track in update.get('remove_tracks') or []
+        }
+        tracks = [
+            track for track in work_order.get('tracks') or []
+            if not (isinstance(track, dict) and track.get('id') in removed)
+        ]
+        present = work_order_track_ids({'tracks': tracks})
+        for track in update.get('add_tracks') or []:
+            entry = work_order_track_entry(track)
+            if entry['id'] not in present:
+                tracks.append(entry)
+                present.add(entry['id'])
+        work_order['tracks'] = tracks
+
+    work_order['updated_at'] = datetime.now().isoformat()
+    return work_order
+
+@app.post("/api/work-orders")
+async def create_work_order(work_order: Dict[str, Any]):
+    """Create a new work order"""
     try:
-        work_orders_file = "work_orders.json"
-        if not os.path.exists(work_orders_file):
-            raise HTTPException(status_code=404, detail="No work orders found")
+        work_order.setdefault('status', 'pending')
+        validate_work_order_choice('status', work_order['status'], WORK_ORDER_STATUSES)
+        if 'priority' in work_order:
+            validate_work_order_choice('priority', work_order['priority'], WORK_ORDER_PRIORITIES)
         
-        with open(work_orders_file, 'r') as f:
-            work_orders = json.load(f)
+        async with work_orders_lock:
+            # Add timestamp and ID
+            work_order['id'] = new_work_order_id()
+            work_order['created_at'] = datetime.now().isoformat()
+            await save_work_orders([work_order])
         
-        work_order = next((wo for wo in work_orders if wo.get('id') == work_order_id), None)
-        if not work_order:
-            raise HTTPException(status_code=404, detail="Work order not found")
+        return {"success": True, "work_order": work_order}
         
-        # Create export filename
-        export_filename = f"work_order_{work_order_id}.json"
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating work order: {str(e)}")
+
+@app.post("/api/work-orders/bulk")
+async def bulk_update_work_orders(body: Dict[str, Any]):
+    """
+    Apply one update to several work orders
+
+    Body: {"ids": [...], "update": {...}} with the same update fields as
+    PATCH. Either every listed work order is updated or none is.
+    """
+    try:
+        ids = body.get('ids')
+        update = body.get('update')
+        if not isinstance(ids, list) or not ids or not isinstance(update, dict):
+            raise HTTPException(status_code=400, detail="Body must contain a non-empty 'ids' list and an 'update' object")
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > WORK_ORDERS_MAX_LIMIT:
+            raise HTTPException(status_code=400, detail=f"At most {WORK_ORDERS_MAX_LIMIT} work orders per request")
+
+        async with work_orders_lock:
+            missing = [work_order_id for work_order_id in ids if work_order_id not in work_orders]
+            if missing:
+                raise HTTPException(status_code=404, detail=f"Work orders not found: {', '.join(map(str, missing))}")
+            updated = [updated_work_order(work_orders[work_order_id], update) for work_order_id in ids]
+            await save_work_orders(updated)
+
+        return {"success": True, "updated": len(updated), "work_orders": updated}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating work orders: {str(e)}")
+
+@app.patch("/api/work-orders/{work_order_id}")
+async def update_work_order(work_order_id: str, update: Dict[str, Any]):
+    """
+    Update a work order's status, priority, assignee or tracks
+
+    add_tracks takes catalog track IDs (or objects with an id) and
+    remove_tracks takes track IDs; an empty assignee unassigns.
+    """
+    try:
+        async with work_orders_lock:
+            work_order = work_orders.get(work_order_id)
+            if work_order is None:
+                raise HTTPException(status_code=404, detail="Work order not found")
+            work_order = updated_work_order(work_order, update)
+            await save_work_orders([work_order])
+
+        return {"success": True, "work_order": work_order}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating work order: {str(e)}")
+
+@app.get("/api/work-orders")
+async def get_work_orders(
+    offset: int = 0,
+    limit: Optional[int] = None,
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    type: Optional[str] = None,
+    assignee: Optional[str] = None,
+    track_id: Optional[str] = None
+):
+    """
+    Get work orders, oldest first
+
+    Optional status, priority, type, assignee and track_id filters are
+    answered from the secondary indexes; offset/limit page through the
+    matches. X-Total-Count carries the number of matches.
+    """
+    try:
+        filters = {'status': status, 'priority': priority, 'type': type, 'assignee': assignee}
+        postings = [
+            work_order_indexes[field].get(value, set())
+            for field, value in filters.items() if value
+        ]
+        if track_id:
+            postings.append(work_order_track_index.get(track_id, set()))
+
+        if postings:
+            postings.sort(key=len)
+            ids = postings[0].intersection(*postings[1:])
+            matches = [work_orders[work_order_id] for work_order_id in sorted(ids, key=work_order_positions.get)]
+        else:
+            matches = list(work_orders.values())
         
-        # Return JSON response for download
+        offset = max(0, offset)
+        limit = len(matches) if limit is None else max(0, min(limit, WORK_ORDERS_MAX_LIMIT))
         return JSONResponse(
-            content=work_order,
-            headers={"Content-Disposition": f"attachment; filename={export_filename}"}
+            content=matches[offset:offset + limit],
+            headers={"X-Total-Count": str(len(matches))}
         )
-        
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error exporting work order: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error reading work orders: {str(e)}")
+
+@app.get("/api/export-work-order/{work_order_id}")
+async def export_work_order(work_order_id: str):
+    """Export work order as JSON file"""
+    work_order = work_orders.get(work_order_id)
+    if not work_order:
+        raise HTTPException(status_code=404, detail="Work order not found")
+    
+    # Create export filename
+    export_filename = f"work_order_{work_order_id}.json"
+    
+    # Return JSON response for download
+    return JSONResponse(
+        content=work_order,
+        headers={"Content-Disposition": f"attachment; filename={export_filename}"}
+    )
+
+# Song metadata store: the same append-only log pattern as work orders.
+# Every write bumps a store-wide revision stamped on the changed songs, so
+# clients sync with ?since=<last revision seen>, and the aggregates below
+# are adjusted per write instead of being recomputed on read.
+SONG_METADATA_MAX_BATCH = 500
+SONG_METADATA_MAX_LIMIT = 5000
+SONG_METADATA_TEXT_FIELDS = ("notes", "title", "artist", "album", "file_name", "last_played")
+SONG_METADATA_UPDATE_FIELDS = set(SONG_METADATA_TEXT_FIELDS) | {
+    "rating", "tags", "favorite", "play_count", "play_count_increment", "custom_fields"
+}
+song_metadata_revision = 0
+song_metadata_stats = {
+    "tag_counts": {},
+    "favorites": set(),
+    "play_ranking": [],  # sorted (-play_count, file_hash) for songs played at least once
+    "total_play_count": 0,
+    "rating_sum": 0,
+    "rated_count": 0,
+    "last_activity": None
+}
+song_metadata_lock = asyncio.Lock()
+
+def account_song_metadata(record, sign):
+    """Add (sign=1) or remove (sign=-1) one song's share of the aggregates"""
+    stats = song_metadata_stats
+    file_hash = record['unique_id']
+    for tag in set(record.get('tags') or []):
+        count = stats["tag_counts"].get(tag, 0) + sign
+        if count > 0:
+            stats["tag_counts"][tag] = count
+        else:
+            stats["tag_counts"].pop(tag, None)
+
+    if record.get('favorite'):
+        if sign > 0:
+            stats["favorites"].add(file_hash)
+        else:
+            stats["favorites"].discard(file_hash)
+
+    play_count = record.get('play_count') or 0
+    if play_count > 0:
+        key = (-play_count, file_hash)
+        if sign > 0:
+            bisect.insort(stats["play_ranking"], key)
+        else:
+            position = bisect.bisect_left(stats["play_ranking"], key)
+            if position < len(stats["play_ranking"]) and stats["play_ranking"][position] == key:
+                del stats["play_ranking"][position]
+    stats["total_play_count"] += sign * play_count
+
+    if record.get('rating'):
+        stats["rating_sum"] += sign * record['rating']
+        stats["rated_count"] += sign
+
+    if sign > 0:
+        for activity in (record.get('modified_date'), record.get('last_played')):
+            if activity and (stats["last_activity"] is None or activity > stats["last_activity"]):
+                stats["last_activity"] = activity
+
+def publish_song_metadata(record):
+    """Make a song's metadata visible, updating aggregates and the search index"""
+    global song_metadata_revision
+    file_hash = record['unique_id']
+    previous = song_metadata.pop(file_hash, None)
+    if previous is not None:
+        account_song_metadata(previous, -1)
+    song_metadata[file_hash] = record
+    account_song_metadata(record, 1)
+    song_metadata_revision = max(song_metadata_revision, record.get('revision', 0))
+    update_search_index_metadata(search_index, file_hash, previous or {}, record)
+
+def reindex_song_metadata_since(index, indexed_metadata, revision):
+    """Apply song metadata written after revision to an index built from indexed_metadata"""
+    for record in reversed(song_metadata.values()):
+        if record.get('revision', 0) <= revision:
+            break
+        file_hash = record['unique_id']
+        update_search_index_metadata(index, file_hash, indexed_metadata.get(file_hash) or {}, record)
+
+def append_song_metadata_records(records):
+    """Append song metadata to the log as one write and flush it to disk"""
+    lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+    with open(SONG_METADATA_LOG_FILE, 'a', encoding='utf-8') as f:
+        f.write(lines)
+        f.flush()
+        os.fsync(f.fileno())
+
+def load_song_metadata_store():
+    """Load the song metadata store, importing song_metadata.json on first run"""
+    global song_metadata_revision
+    song_metadata.clear()
+    song_metadata_revision = 0
+    song_metadata_stats.update(
+        tag_counts={}, favorites=set(), play_ranking=[],
+        total_play_count=0, rating_sum=0, rated_count=0, last_activity=None
+    )
+    try:
+        importing = not os.path.exists(SONG_METADATA_LOG_FILE)
+        songs = load_song_metadata()
+        if importing and songs:
+            append_song_metadata_records(list(songs.values()))
+            print(f"Imported {len(songs)} songs from {SONG_METADATA_FILE}")
+        for record in songs.values():
+            publish_song_metadata(record)
+        print(f"Loaded metadata for {len(song_metadata)} songs (revision {song_metadata_revision})")
+    except Exception as e:
+        print(f"Error loading song metadata store: {e}")
+
+def new_song_metadata(file_hash):
+    """Empty metadata for a catalog track, in the shape metadata_manager.js uses"""
+    track = tracks_by_hash.get(file_hash, {})
+    now = datetime.now().isoformat()
+    return {
+        'unique_id': file_hash,
+        'file_name': track.get('filename', ''),
+        'title': track.get('track', ''),
+        'artist': track.get('artist', ''),
+        'album': track.get('album', ''),
+        'rating': 0,
+        'notes': '',
+        'tags': [],
+        'play_count': 0,
+        'last_played': None,
+        'favorite': False,
+        'created_date': now,
+        'modified_date': now,
+        'custom_fields': {}
+    }
+
+def updated_song_metadata(record, update):
+    """Copy of a song's metadata with a partial update applied"""
+    unknown = set(update) - SONG_METADATA_UPDATE_FIELDS - {'file_hash'}
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot update: {', '.join(sorted(unknown))}")
+
+    record = dict(record)
+    for field in SONG_METADATA_TEXT_FIELDS:
+        if field in update:
+            value = update[field]
+            if value is not None and not isinstance(value, str):
+                raise HTTPException(status_code=400, detail=f"{field} must be a string")
+            if value is None and field != 'last_played':
+                value = ''
+            record[field] = value
+    if 'rating' in update:
+        rating = update['rating']
+        if isinstance(rating, bool) or not isinstance(rating, int) or not 0 <= rating <= 5:
+            raise HTTPException(status_code=400, detail="rating must be an integer from 0 to 5")
+        record['rating'] = rating
+    if 'tags' in update:
+        tags = update['tags']
+        if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+            raise HTTPException(status_code=400, detail="tags must be a list of strings")
+        record['tags'] = list(dict.fromkeys(tag.strip() for tag in tags if tag.strip()))
+    if 'favorite' in update:
+        if not isinstance(update['favorite'], bool):
+            raise HTTPException(status_code=400, detail="favorite must be true or false")
+        record['favorite'] = update['favorite']
+    for field in ('play_count', 'play_count_increment'):
+        value = update.get(field)
+        if field in update and (isinstance(value, bool) or not isinstance(value, int) or value < 0):
+            raise HTTPException(status_code=400, detail=f"{field} must be a non-negative integer")
+    if 'play_count' in update:
+        record['play_count'] = update['play_count']
+    if update.get('play_count_increment'):
+        # Increments from several devices add up instead of overwriting
+        record['play_count'] = (record.get('play_count') or 0) + update['play_count_increment']
+        if 'last_played' not in update:
+            record['last_played'] = datetime.now().isoformat()
+    if 'custom_fields' in update:
+        if not isinstance(update['custom_fields'], dict):
+            raise HTTPException(status_code=400, detail="custom_fields must be an object")
+        custom_fields = dict(record.get('custom_fields') or {})
+        for key, value in update['custom_fields'].items():
+            if value is None:
+                custom_fields.pop(key, None)
+            else:
+                custom_fields[key] = value
+        record['custom_fields'] = custom_fields
+
+    record['modified_date'] = datetime.now().isoformat()
+    return record
+
+async def save_song_metadata(updates):
+    """
+    Apply partial updates {file_hash: changes} as one durable append
+
+    Every file_hash must be a catalog track or already have metadata;
+    either all updates apply or none do.
+    """
+    global song_metadata_revision
+    async with song_metadata_lock:
+        missing = [
+            file_hash for file_hash in updates
+            if file_hash not in song_metadata and file_hash not in tracks_by_hash
+        ]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Unknown file_hash: {', '.join(map(str, missing[:20]))}")
+
+        records = []
+        for revision, (file_hash, update) in enumerate(updates.items(), song_metadata_revision + 1):
+            current = song_metadata.get(file_hash) or new_song_metadata(file_hash)
+            records.append(dict(updated_song_metadata(current, update), revision=revision))
+
+        await asyncio.get_running_loop().run_in_executor(None, append_song_metadata_records, records)
+        for record in records:
+            publish_song_metadata(record)
+        return records
+
+@app.get("/api/metadata")
+async def get_song_metadata(since: int = 0, limit: int = SONG_METADATA_MAX_LIMIT):
+    """
+    Song metadata changed after revision `since`, oldest change first
+
+    Clients store the returned revision and pass it as `since` next time;
+    has_more means another page is waiting.
+    """
+    limit = max(1, min(limit, SONG_METADATA_MAX_LIMIT))
+    changed = []
+    for record in reversed(song_metadata.values()):
+        if record.get('revision', 0) <= since:
+            break
+        changed.append(record)
+    changed.reverse()
+    page = changed[:limit]
+    return {
+        "revision": page[-1]['revision'] if len(changed) > limit else song_metadata_revision,
+        "has_more": len(changed) > limit,
+        "songs": page
+    }
+
+@app.get("/api/metadata/stats")
+async def get_song_metadata_stats(limit: int = 10):
+    """Library statistics, most played songs, favorites and tag counts"""
+    stats = song_metadata_stats
+    limit = max(0, min(limit, SONG_METADATA_MAX_LIMIT))
+    most_played = [song_metadata[file_hash] for _, file_hash in stats["play_ranking"][:limit]]
+    return {
+        "revision": song_metadata_revision,
+        "total_songs": len(song_metadata),
+        "total_play_count": stats["total_play_count"],
+        "average_rating": round(stats["rating_sum"] / stats["rated_count"], 2) if stats["rated_count"] else 0,
+        "most_played": most_played[0]['unique_id'] if most_played else None,
+        "favorite_count": len(stats["favorites"]),
+        "total_tags": len(stats["tag_counts"]),
+        "last_activity": stats["last_activity"],
+        "most_played_songs": [
+            {"file_hash": song['unique_id'], "title": song.get('title', ''),
+             "artist": song.get('artist', ''), "play_count": song.get('play_count', 0)}
+            for song in most_played
+        ],
+        "favorites": sorted(stats["favorites"]),
+        "tag_counts": dict(sorted(stats["tag_counts"].items(), key=lambda item: (-item[1], item[0])))
+    }
+
+@app.post("/api/metadata/batch")
+async def update_song_metadata_batch(body: Dict[str, Any]):
+    """
+    Apply partial updates to several songs at once
+
+    Body: {"updates": [{"file_hash": ..., "rating": 5, "play_count_increment": 1, ...}]}.
+    Updates for the same file_hash are merged in order.
+    """
+    try:
+        updates = body.get('updates')
+        if not isinstance(updates, list) or not updates:
+            raise HTTPException(status_code=400, detail="Body must contain a non-empty 'updates' list")
+        if len(updates) > SONG_METADATA_MAX_BATCH:
+            raise HTTPException(status_code=400, detail=f"At most {SONG_METADATA_MAX_BATCH} updates per request")
+
+        merged = {}
+        for update in updates:
+            if not isinstance(update, dict) or not isinstance(update.get('file_hash'), str):
+                raise HTTPException(status_code=400, detail="Every update needs a file_hash")
+            changes = merged.setdefault(update['file_hash'], {})
+            previous_increment = changes.get('play_count_increment')
+            changes.update({field: value for field, value in update.items() if field != 'file_hash'})
+            if isinstance(previous_increment, int) and isinstance(update.get('play_count_increment'), int):
+                changes['play_count_increment'] = previous_increment + update['play_count_increment']
+
+        records = await save_song_metadata(merged)
+        return {"success": True, "revision": song_metadata_revision, "songs": records}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating song metadata: {str(e)}")
+
+@app.get("/api/metadata/{file_hash}")
+async def get_song_metadata_by_hash(file_hash: str):
+    """Metadata for one song"""
+    record = song_metadata.get(file_hash)
+    if record is None:
+        raise HTTPException(status_code=404, detail="No metadata for this file_hash")
+    return record
+
+@app.patch("/api/metadata/{file_hash}")
+async def update_song_metadata(file_hash: str, update: Dict[str, Any]):
+    """Apply a partial update to one song's metadata"""
+    try:
+        records = await save_song_metadata({file_hash: update})
+        return {"success": True, "revision": song_metadata_revision, "song": records[0]}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating song metadata: {str(e)}")
+
+# Play events: POST /api/plays counts events straight into rolling
+# counters and buffers them; the buffer is appended to play_events.jsonl
+# every few seconds and folded into the song metadata play counts. Plays
+# are bucketed by hour so the day/week windows drop old hours by
+# subtracting whole buckets instead of revisiting individual events.
+PLAY_EVENTS_FILE = os.path.join(os.path.dirname(__file__), "play_events.jsonl")
+PLAY_FLUSH_INTERVAL_SECONDS = 10
+PLAY_BUFFER_FLUSH_SIZE = 5000  # flush early once this many events are waiting
+PLAY_MAX_BATCH = 1000
+PLAY_STATS_MAX_LIMIT = 100
+PLAY_WINDOWS = {"day": 24, "week": 24 * 7}  # rolling windows in hours; "all" never expires
+PLAY_COUNTER_KINDS = ("track", "album", "artist")
+play_buffer = []
+play_hour_buckets = {}  # hour -> {"plays": n, kind: Counter} for hours inside the longest window
+play_counters = {window: {kind: Counter() for kind in PLAY_COUNTER_KINDS} for window in ["all", *PLAY_WINDOWS]}
+play_totals = {window: 0 for window in play_counters}
+play_window_starts = {window: 0 for window in PLAY_WINDOWS}  # first hour inside each window
+play_flush_lock = asyncio.Lock()
+
+def expire_play_windows(now_hour):
+    """Slide the rolling windows forward, subtracting the hours that left them"""
+    for window, hours in PLAY_WINDOWS.items():
+        start = now_hour - hours + 1
+        if start <= play_window_starts[window]:
+            continue
+        for hour, bucket in play_hour_buckets.items():
+            if play_window_starts[window] <= hour < start:
+                play_totals[window] -= bucket["plays"]
+                for kind in PLAY_COUNTER_KINDS:
+                    counter = play_counters[window][kind]
+                    for key, count in bucket[kind].items():
+                        counter[key] -= count
+                        if counter[key] <= 0:
+                            del counter[key]
+        play_window_starts[window] = start
+
+    oldest = now_hour - max(PLAY_WINDOWS.values()) + 1
+    for hour in [hour for hour in play_hour_buckets if hour < oldest]:
+        del play_hour_buckets[hour]
+
+def count_play_event(event):
+    """Add one play to the all-time counters and every window it falls in"""
+    hour = int(event['played_at'] // 3600)
+    keys = {kind: event.get(f"{kind}_id") for kind in PLAY_COUNTER_KINDS}
+    windows = ["all"] + [window for window, start in play_window_starts.items() if hour >= start]
+    if len(windows) > 1:
+        bucket = play_hour_buckets.setdefault(hour, {"plays": 0, **{kind: Counter() for kind in PLAY_COUNTER_KINDS}})
+        bucket["plays"] += 1
+        for kind, key in keys.items():
+            if key:
+                bucket[kind][key] += 1
+    for window in windows:
+        play_totals[window] += 1
+        for kind, key in keys.items():
+            if key:
+                play_counters[window][kind][key] += 1
+
+def append_play_events(events):
+    """Append play events to the log as one write and flush them to disk"""
+    lines = "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events)
+    with open(PLAY_EVENTS_FILE, 'a', encoding='utf-8') as f:
+        f.write(lines)
+        f.flush()
+        os.fsync(f.fileno())
+
+def load_play_events():
+    """Rebuild the play counters from the event log"""
+    play_buffer.clear()
+    play_hour_buckets.clear()
+    for window in play_counters:
+        play_totals[window] = 0
+        for counter in play_counters[window].values():
+            counter.clear()
+    now_hour = int(time.time() // 3600)
+    for window, hours in PLAY_WINDOWS.items():
+        play_window_starts[window] = now_hour - hours + 1
+    try:
+        if os.path.exists(PLAY_EVENTS_FILE):
+            with open(PLAY_EVENTS_FILE, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                        # Events logged before content-based track IDs
+                        if event.get('file_hash'):
+                            event['track_id'] = content_track_id(event['file_hash'])
+                        count_play_event(event)
+                    except (json.JSONDecodeError, KeyError, TypeError, ValueError, OverflowError):
+                        continue
+        print(f"Loaded {play_totals['all']} play events")
+    except Exception as e:
+        print(f"Error loading play events: {e}")
+
+def play_event_time(value, now):
+    """Epoch seconds for an event's played_at (epoch number or ISO string), never in the future"""
+    if value is None:
+        return now
+    if isinstance(value, bool):
+        raise ValueError("played_at must be a timestamp")
+    if isinstance(value, (int, float)):
+        played_at = float(value)
+    else:
+        try:
+            played_at = datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+        except (OverflowError, OSError, ValueError):
+            raise ValueError(f"played_at {value!r} is not an ISO 8601 time")
+    if not math.isfinite(played_at) or played_at < 0:
+        raise ValueError("played_at must be a finite timestamp after 1970")
+    played_at = min(played_at, now)
+    play_event_isoformat(played_at)
+    return played_at
+
+def play_event_isoformat(played_at):
+    """Local ISO time for an event timestamp, as stored in song metadata last_played"""
+    try:
+        return datetime.fromtimestamp(played_at).isoformat()
+    except (OverflowError, OSError, ValueError):
+        raise ValueError(f"played_at {played_at!r} is not a representable time")
+
+def play_event_record(event, listener, now):
+    """Validated log record for one posted play event, or None for an unknown track"""
+    track_id = event.get('track_id')
+    track = tracks_by_id.get(track_id) if isinstance(track_id, str) else None
+    if track is None and isinstance(event.get('file_hash'), str):
+        track = tracks_by_hash.get(event['file_hash'])
+    if track is None:
+        return None
+
+    record = {
+        'track_id': track.get('id'),
+        'album_id': track.get('album_id'),
+        'artist_id': track.get('artist_id'),
+        'file_hash': track.get('file_hash'),
+        'played_at': play_event_time(event.get('played_at'), now),
+        'listener': str(event.get('listener') or listener)
+    }
+    duration = event.get('duration_played')
+    if isinstance(duration, (int, float)) and not isinstance(duration, bool) and duration >= 0:
+        record['duration_played'] = duration
+    return record
+
+async def flush_play_events():
+    """Append buffered plays to the log and fold them into song metadata play counts"""
+    async with play_flush_lock:
+        events = play_buffer[:]
+        if not events:
+            return
+
+        # Convert timestamps before anything is written so one bad event
+        # cannot cost the rest of the batch its metadata updates
+        updates = {}
+        for event in events:
+            file_hash = event.get('file_hash')
+            if not file_hash or (file_hash not in song_metadata and file_hash not in tracks_by_hash):
+                continue
+            try:
+                played = play_event_isoformat(event['played_at'])
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Skipping play count for {file_hash}: {e}")
+                continue
+            update = updates.setdefault(file_hash, {'play_count_increment': 0})
+            update['play_count_increment'] += 1
+            last_played = update.get('last_played') or (song_metadata.get(file_hash) or {}).get('last_played')
+            if not last_played or played > last_played:
+                update['last_played'] = played
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, append_play_events, events)
+        except Exception as e:
+            # Keep the events in the buffer for the next attempt
+            print(f"Error writing play events: {e}")
+            return
+        del play_buffer[:len(events)]
+
+        if updates:
+            try:
+                await save_song_metadata(updates)
+            except Exception as e:
+                print(f"Error updating play counts: {e}")
+
+async def flush_play_events_periodically():
+    """Background writer for the play event buffer"""
+    while True:
+        await asyncio.sleep(PLAY_FLUSH_INTERVAL_SECONDS)
+        try:
+            await flush_play_events()
+        except Exception as e:
+            print(f"Error flushing play events: {e}")
+
+@app.post("/api/plays")
+async def record_plays(request: Request, body: Dict[str, Any]):
+    """
+    Record a batch of play events
+
+    Body: {"events": [{"track_id": ..., "played_at": ..., "duration_played": ...}]}.
+    An event may name its track by file_hash instead; played_at is epoch
+    seconds or ISO 8601 and defaults to now. Events for unknown tracks are
+    skipped and counted as rejected.
+    """
+    events = body.get('events')
+    if not isinstance(events, list) or not events:
+        raise HTTPException(status_code=400, detail="Body must contain a non-empty 'events' list")
+    if len(events) > PLAY_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {PLAY_MAX_BATCH} events per request")
+
+    now = time.time()
+    listener = request.client.host if request.client else "unknown"
+    records = []
+    try:
+        for event in events:
+            if not isinstance(event, dict):
+                raise ValueError("events must be objects")
+            record = play_event_record(event, listener, now)
+            if record is not None:
+                records.append(record)
+    except (ValueError, TypeError, OverflowError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid play event: {str(e)}")
+
+    expire_play_windows(int(now // 3600))
+    for record in records:
+        count_play_event(record)
+    play_buffer.extend(records)
+    if len(play_buffer) >= PLAY_BUFFER_FLUSH_SIZE:
+        spawn_background_task(flush_play_events())
+
+    return {"accepted": len(records), "rejected": len(events) - len(records), "buffered": len(play_buffer)}
+
+@app.get("/api/plays/stats")
+async def get_play_stats(window: str = "week", limit: int = 10):
+    """
+    Most played tracks, albums and artists
+
+    Parameters:
+    - window: "day" or "week" (rolling) or "all"
+    - limit: entries per list (max 100)
+    """
+    if window not in play_counters:
+        raise HTTPException(status_code=400, detail=f"window must be one of: {', '.join(play_counters)}")
+    limit = max(0, min(limit, PLAY_STATS_MAX_LIMIT))
+    expire_play_windows(int(time.time() // 3600))
+
+    counters = play_counters[window]
+    lookups = {"track": tracks_by_id, "album": albums_by_id, "artist": artists_by_id}
+    name_fields = {"track": "track", "album": "album", "artist": "artist"}
+    result = {"window": window, "total_plays": play_totals[window], "buffered": len(play_buffer)}
+    for kind in PLAY_COUNTER_KINDS:
+        entries = []
+        for key, plays in heapq.nsmallest(limit, counters[kind].items(), key=lambda item: (-item[1], item[0])):
+            item = lookups[kind].get(key) or {}
+            entry = {"id": key, name_fields[kind]: item.get(name_fields[kind], ''), "plays": plays}
+            if kind != "artist":
+                entry["artist"] = item.get('artist', '')
+            entries.append(entry)
+        result[f"{kind}s"] = entries
+    return result
 
 @app.get("/health")
 async def health_check():
@@ -730,6 +2584,8 @@ async def update_tailscale_config(updated_config: dict):
             tailscale_config["local_paths"]["network_share"],
             tailscale_config["local_paths"]["network_share"].replace('\\', '/')
         ]
+        clear_resolved_path_cache()
+        spawn_background_task(rebuild_stream_table())
         
         return {"status": "success", "message": "Configuration updated successfully", "config": tailscale_config}
     except HTTPException as e:
@@ -761,8 +2617,21 @@ async def debug_catalog_sample():
     }
 
 @app.get("/api/album-art/{album_name:path}")
-async def get_album_art(album_name: str, use_tailscale: bool = None):
-    """Get album art for a specific album"""
+async def get_album_art(
+    album_name: str,
+    request: Request,
+    use_tailscale: bool = None,
+    size: Optional[int] = None,
+    format: Optional[str] = None,
+    v: Optional[str] = None
+):
+    """
+    Get album art for a specific album
+
+    size (128/256/512) returns a WebP or JPEG thumbnail instead of the
+    original file; format forces webp or jpeg, v (the cover's mtime) marks
+    a versioned URL.
+    """
     if album_name not in albums_data:
         raise HTTPException(status_code=404, detail="Album not found")
     
@@ -772,6 +2641,16 @@ async def get_album_art(album_name: str, use_tailscale: bool = None):
     if not cover_file:
         raise HTTPException(status_code=404, detail="Album art not found")
     
+    # Thumbnails are rendered here, so they skip the Tailscale redirect
+    if size:
+        local_cover, _ = resolve_media_path(cover_file, "image")
+        if local_cover:
+            thumbnail = await thumbnail_response(
+                request, cached_media_file(local_cover), size, format, is_current_version(v, local_cover)
+            )
+            if thumbnail:
+                return thumbnail
+    
     # Use global setting if not specified
     use_tailscale_for_request = USE_TAILSCALE if use_tailscale is None else use_tailscale
     
@@ -844,251 +2723,994 @@ async def get_album_art(album_name: str, use_tailscale: bool = None):
         print(f"Error serving album art {cover_file}: {e}")
         raise HTTPException(status_code=500, detail="Error serving album art")
 
-@app.get("/api/all-images")
-async def get_all_images():
-    """Get all image files from the catalog data"""
-    image_files = []
-    processed_paths = set()  # Track processed paths to avoid duplicates
-    image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.bmp', '.tiff', '.ico']
-    
-    # Look for all image files in the catalog data
-    for record in catalog_data:
-        file_path = record.get('full_path', '')
-        
-        # Skip if we've already processed this path
-        if file_path in processed_paths:
-            continue
-            
-        # Check if this is an image file
-        if file_path and any(file_path.lower().endswith(ext) for ext in image_extensions):
-            # This record is an image file
-            try:
-                # Try to get file info
-                file_size = record.get('size_bytes', 0)
-                if not file_size and os.path.exists(file_path):
-                    file_size = os.path.getsize(file_path)
-                
-                # Add to image files list
-                image_files.append({
-                    'file_path': file_path,
-                    'album': record.get('album', 'Unknown Album'),
-                    'artist': record.get('artist', 'Unknown Artist'),
-                    'file_size': file_size,
-                    'file_name': os.path.basename(file_path),
-                    'extension': os.path.splitext(file_path)[1].lower(),
-                    'parent_folder': record.get('parent_folder', os.path.basename(os.path.dirname(file_path)))
-                })
-                processed_paths.add(file_path)
-            except Exception as e:
-                print(f"Error processing image file {file_path}: {e}")
-    
-    # Also scan directories for image files that might not be in the catalog
+# Thumbnails: size= requests on /api/album-art and /api/image get a resized
+# WebP or JPEG instead of the original art. Thumbnails are rendered once in a
+# worker pool and stored content-addressed (source SHA-256, size, format) in
+# cache/thumbnails, so a cover shared by several paths is rendered once.
+THUMBNAIL_DIR = os.path.join(CACHE_DIR, "thumbnails")
+THUMBNAIL_SIZES = [128, 256, 512]
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg")
+}
+THUMBNAIL_SOURCE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff']
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_SOURCE_HASHES_MAX_ENTRIES = 4096
+thumbnail_executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="thumbnail")
+thumbnail_source_hashes = OrderedDict()  # (source, size, mtime_ns) -> SHA-256 of the source image, oldest first
+thumbnail_source_hashes_lock = threading.Lock()  # guards thumbnail_source_hashes across executor threads
+thumbnail_jobs = {}  # (source, size, format) -> in-flight render future
+
+def thumbnail_size(size):
+    """Snap a requested size up to the nearest supported thumbnail size"""
+    return next((s for s in THUMBNAIL_SIZES if s >= size), THUMBNAIL_SIZES[-1])
+
+def thumbnail_format(requested, accept):
+    """Requested thumbnail format, or WebP when the client accepts it"""
+    requested = (requested or '').lower().replace('jpg', 'jpeg')
+    if requested in THUMBNAIL_FORMATS:
+        return requested
+    return "webp" if 'image/webp' in (accept or '') else "jpeg"
+
+def render_thumbnail(source, target, size, image_format):
+    """Resize source to fit size x size and write it to target"""
+    with Image.open(source) as img:
+        img.draft('RGB', (size, size))  # JPEG: decode at reduced scale
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((size, size), Image.LANCZOS)
+        if image_format == "JPEG":
+            img = img.convert('RGB')
+        elif img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB')
+        partial = target + '.part'
+        img.save(partial, image_format, quality=THUMBNAIL_QUALITY)
+    os.replace(partial, target)
+
+def build_thumbnail(source, size, image_format):
+    """Return (thumbnail file, content address), rendering it if needed"""
+    stat = os.stat(source)
+    identity = (source, stat.st_size, stat.st_mtime_ns)
+    with thumbnail_source_hashes_lock:
+        digest = thumbnail_source_hashes.get(identity)
+    if not digest:
+        digest = file_sha256(source)
+        with thumbnail_source_hashes_lock:
+            thumbnail_source_hashes[identity] = digest
+            while len(thumbnail_source_hashes) > THUMBNAIL_SOURCE_HASHES_MAX_ENTRIES:
+                thumbnail_source_hashes.popitem(last=False)
+
+    address = f"{digest}-{size}.{image_format}"
+    target = os.path.join(THUMBNAIL_DIR, digest[:2], address)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        render_thumbnail(source, target, size, THUMBNAIL_FORMATS[image_format][0])
+    return target, address
+
+def is_current_version(version, path):
+    """Whether a v= token is the file's current mtime, as listed by /api/all-images"""
+    if not version:
+        return False
     try:
-        # First, let's scan album directories from albums_data
-        for album_name, album in albums_data.items():
-            # Get tracks to find album directories
-            for track in album.get('tracks', []):
-                file_path = track.get('file_path', '')
-                if file_path:
-                    album_dir = os.path.dirname(file_path)
-                    if os.path.exists(album_dir) and os.path.isdir(album_dir):
-                        for file in os.listdir(album_dir):
-                            if any(file.lower().endswith(ext) for ext in image_extensions):
-                                image_path = os.path.join(album_dir, file)
-                                # Skip if we've already processed this path
-                                if image_path in processed_paths:
-                                    continue
-                                try:
-                                    # Add to image files list
-                                    image_files.append({
-                                        'file_path': image_path,
-                                        'album': album_name,
-                                        'artist': album.get('artist', 'Unknown Artist'),
-                                        'file_size': os.path.getsize(image_path),
-                                        'file_name': file,
-                                        'extension': os.path.splitext(file)[1].lower(),
-                                        'parent_folder': os.path.basename(album_dir)
-                                    })
-                                    processed_paths.add(image_path)
-                                except Exception as e:
-                                    print(f"Error adding album directory image {image_path}: {e}")
-                    break  # We only need one track to find the album directory
-        
-        # Then scan all allowed directories recursively
-        for allowed_dir in ALLOWED_DIRS:
-            if allowed_dir and os.path.exists(allowed_dir) and os.path.isdir(allowed_dir):
-                print(f"Scanning directory for images: {allowed_dir}")
-                for root, dirs, files in os.walk(allowed_dir):
-                    for file in files:
-                        if any(file.lower().endswith(ext) for ext in image_extensions):
-                            file_path = os.path.join(root, file)
-                            # Skip if we've already processed this path
-                            if file_path in processed_paths:
-                                continue
-                            try:
-                                # Try to determine album from path
-                                parent_dir = os.path.basename(root)
-                                grandparent_dir = os.path.basename(os.path.dirname(root))
-                                album_name = parent_dir
-                                
-                                # If parent directory is "Albums", use grandparent
-                                if parent_dir.lower() == "albums" and grandparent_dir:
-                                    album_name = grandparent_dir
-                                
-                                # Add to image files list
-                                image_files.append({
-                                    'file_path': file_path,
-                                    'album': album_name,
-                                    'artist': 'Unknown Artist',
-                                    'file_size': os.path.getsize(file_path),
-                                    'file_name': file,
-                                    'extension': os.path.splitext(file)[1].lower(),
-                                    'parent_folder': parent_dir
-                                })
-                                processed_paths.add(file_path)
-                            except Exception as e:
-                                print(f"Error adding additional image file {file_path}: {e}")
+        return float(version) == os.stat(path).st_mtime
+    except (ValueError, OSError):
+        return False
+
+async def thumbnail_response(request, source, size, requested_format=None, versioned=False):
+    """
+    Serve a thumbnail of source, or None when one cannot be made.
+
+    Responses are immutable for a year when the URL is versioned by the
+    source's current mtime (v=), otherwise cached for a day and revalidated
+    by ETag.
+    """
+    if Image is None or os.path.splitext(source)[1].lower() not in THUMBNAIL_SOURCE_EXTENSIONS:
+        return None
+
+    size = thumbnail_size(size)
+    image_format = thumbnail_format(requested_format, request.headers.get('accept'))
+    key = (source, size, image_format)
+    job = thumbnail_jobs.get(key)
+    if not job:
+        job = asyncio.get_running_loop().run_in_executor(thumbnail_executor, build_thumbnail, source, size, image_format)
+        thumbnail_jobs[key] = job
+        job.add_done_callback(lambda _: thumbnail_jobs.pop(key, None))
+    try:
+        path, address = await asyncio.shield(job)
     except Exception as e:
-        print(f"Error scanning directories for images: {e}")
-    
-    print(f"Found {len(image_files)} image files in total from {len(processed_paths)} unique paths")
-    
-    return {
-        "total_images": len(image_files),
-        "images": image_files
+        print(f"Error creating thumbnail for {source}: {e}")
+        return None
+
+    headers = {
+        "ETag": f'"{address}"',
+        "Cache-Control": "public, max-age=31536000, immutable" if versioned else "public, max-age=86400",
+        "Access-Control-Allow-Origin": "*"
     }
+    if not requested_format:
+        headers["Vary"] = "Accept"
+    if etag_matches(request.headers.get('if-none-match'), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=THUMBNAIL_FORMATS[image_format][1], headers=headers)
 
-@app.get("/api/album-art-flipbook")
-async def get_album_art_flipbook():
-    """Get all available album art for flipbook browsing"""
-    album_arts = []
-    image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.bmp', '.tiff', '.ico']
-    processed_paths = set()  # Track processed paths to avoid duplicates
-    
-    # First pass: Get album art from albums_data
-    for album_name, album in albums_data.items():
-        # Get the primary cover art
-        cover_file = album.get('cover', '')
-        if cover_file and os.path.exists(cover_file) and cover_file not in processed_paths:
-            album_arts.append({
-                'album': album_name,
-                'artist': album.get('artist', 'AeroVista'),
-                'cover_path': cover_file,
-                'track_count': len(album.get('tracks', [])),
-                'total_duration': album.get('total_duration', 0),
-                'is_primary_cover': True
-            })
-            processed_paths.add(cover_file)
-        
-        # Get all tracks to find album directories and look for more images
+# Media index: directory listings of album folders and ALLOWED_DIRS, kept on
+# disk keyed by directory mtime, with size, mtime and pixel dimensions per
+# image. A background scanner re-lists only folders whose mtime changed;
+# /api/all-images and /api/album-art-flipbook are both served from it.
+IMAGE_INDEX_FILE = os.path.join(CACHE_DIR, "image_index.json")
+IMAGE_INDEX_VERSION = 2
+IMAGE_HEADER_BYTES = 64 * 1024
+IMAGE_INDEX_REFRESH_SECONDS = 300
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.bmp', '.tiff', '.ico']
+
+image_index_directories = {}  # directory -> {"mtime", "images": {name: {"size", "mtime", "width", "height"}}, "subdirs"}
+image_index_images = []
+image_index_generation = 0
+image_index_refresh_lock = asyncio.Lock()
+
+def load_image_index():
+    """Load the persisted directory listings"""
+    try:
+        if os.path.exists(IMAGE_INDEX_FILE):
+            with open(IMAGE_INDEX_FILE, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            if stored.get("version") == IMAGE_INDEX_VERSION:
+                return stored.get("directories", {})
+    except Exception as e:
+        print(f"Error loading image index, rebuilding: {e}")
+    return {}
+
+def save_image_index(directories):
+    """Persist the directory listings for the next start"""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = IMAGE_INDEX_FILE + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": IMAGE_INDEX_VERSION, "directories": directories}, f)
+        os.replace(tmp_path, IMAGE_INDEX_FILE)
+    except Exception as e:
+        print(f"Error saving image index: {e}")
+
+def read_image_dimensions(path):
+    """
+    Pixel (width, height) from an image file header, or (None, None).
+
+    Understands PNG, GIF, JPEG, WebP and BMP without decoding the image.
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(IMAGE_HEADER_BYTES)
+    except OSError:
+        return None, None
+
+    try:
+        if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+            return struct.unpack('>II', head[16:24])
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack('<HH', head[6:10])
+        if head[:2] == b'BM':
+            width, height = struct.unpack('<ii', head[18:26])
+            return width, abs(height)
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            chunk = head[12:16]
+            if chunk == b'VP8 ':
+                width, height = struct.unpack('<HH', head[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b'VP8L':
+                bits = struct.unpack('<I', head[21:25])[0]
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if chunk == b'VP8X':
+                width = int.from_bytes(head[24:27], 'little') + 1
+                height = int.from_bytes(head[27:30], 'little') + 1
+                return width, height
+        if head[:2] == b'\xff\xd8':
+            # Walk JPEG segments to the first start-of-frame marker
+            position = 2
+            while position + 9 < len(head):
+                if head[position] != 0xFF:
+                    position += 1
+                    continue
+                marker = head[position + 1]
+                if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+                    position += 1 if marker == 0xFF else 2
+                    continue
+                length = struct.unpack('>H', head[position + 2:position + 4])[0]
+                if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                    height, width = struct.unpack('>HH', head[position + 5:position + 9])
+                    return width, height
+                position += 2 + length
+    except struct.error:
+        pass
+    return None, None
+
+def album_image_directories(albums):
+    """Map each album's directory (from its first track with a path) to (album, artist)"""
+    album_dirs = {}
+    for album_name, album in albums.items():
         for track in album.get('tracks', []):
             file_path = track.get('file_path', '')
             if file_path:
-                album_dir = os.path.dirname(file_path)
-                if os.path.exists(album_dir) and os.path.isdir(album_dir):
-                    for file in os.listdir(album_dir):
-                        if any(file.lower().endswith(ext) for ext in image_extensions):
-                            image_path = os.path.join(album_dir, file)
-                            # Skip if we've already processed this path
-                            if image_path in processed_paths:
-                                continue
-                            try:
-                                # Add to album arts list
-                                album_arts.append({
-                                    'album': album_name,
-                                    'artist': album.get('artist', 'AeroVista'),
-                                    'cover_path': image_path,
-                                    'track_count': len(album.get('tracks', [])),
-                                    'total_duration': album.get('total_duration', 0),
-                                    'is_primary_cover': False
-                                })
-                                processed_paths.add(image_path)
-                            except Exception as e:
-                                print(f"Error adding album directory image to flipbook {image_path}: {e}")
+                album_dirs.setdefault(os.path.dirname(file_path), (album_name, album.get('artist', 'Unknown Artist')))
                 break  # We only need one track to find the album directory
-    
-    # Second pass: Look for any image files in the catalog data
-    for record in catalog_data:
-        file_path = record.get('full_path', '')
-        album_name = record.get('album', '')
-        
-        # Skip if we've already processed this path
-        if file_path in processed_paths:
-            continue
-            
-        # Check if this is an image file
-        if file_path and any(file_path.lower().endswith(ext) for ext in image_extensions):
-            # This record is an image file
-            print(f"Found additional image file for gallery: {file_path}")
-            
-            # Get album data or create placeholder
-            album_data = albums_data.get(album_name, {
-                'artist': record.get('artist', 'Unknown'),
-                'tracks': [],
-                'total_duration': 0
+    return album_dirs
+
+def scan_image_directory(path, previous, directories, recursive):
+    """
+    Record the image files (and subdirectories) of one directory.
+
+    Reuses the previous listing when the directory mtime is unchanged, so an
+    unchanged tree costs one stat per directory.
+    """
+    if path in directories:
+        return
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return
+
+    entry = previous.get(path)
+    if not entry or entry.get("mtime") != mtime:
+        images = {}
+        subdirs = []
+        try:
+            with os.scandir(path) as entries:
+                for item in entries:
+                    try:
+                        if item.is_dir():
+                            subdirs.append(item.name)
+                        elif any(item.name.lower().endswith(ext) for ext in IMAGE_EXTENSIONS):
+                            stat = item.stat()
+                            known = entry["images"].get(item.name) if entry else None
+                            if known and known["size"] == stat.st_size and known["mtime"] == stat.st_mtime:
+                                # Unchanged file: keep its dimensions without re-reading it
+                                images[item.name] = known
+                            else:
+                                width, height = read_image_dimensions(item.path)
+                                images[item.name] = {
+                                    "size": stat.st_size, "mtime": stat.st_mtime,
+                                    "width": width, "height": height
+                                }
+                    except OSError as e:
+                        print(f"Error reading {item.path}: {e}")
+        except OSError as e:
+            print(f"Error scanning directory for images {path}: {e}")
+            return
+        entry = {"mtime": mtime, "images": images, "subdirs": subdirs}
+    directories[path] = entry
+
+    if recursive:
+        for subdir in entry["subdirs"]:
+            scan_image_directory(os.path.join(path, subdir), previous, directories, True)
+
+def scan_image_index(previous, albums, roots):
+    """Scan album directories and allowed roots; returns the new listings"""
+    directories = {}
+    for album_dir in album_image_directories(albums):
+        scan_image_directory(album_dir, previous, directories, False)
+    for root in roots:
+        if root and os.path.isdir(root):
+            scan_image_directory(root, previous, directories, True)
+    return directories
+
+def flatten_image_index(directories, albums, roots):
+    """
+    Build the shared image list from directory listings without any I/O.
+
+    Album directories come first so their images carry the album and artist
+    (and whether they are the album's primary cover); everything else found
+    under the allowed roots is attributed to its folder.
+    """
+    image_files = []
+    processed_paths = set()  # Track processed paths to avoid duplicates
+    primary_covers = {album.get('cover') for album in albums.values() if album.get('cover')}
+
+    def add_directory(path, album_name, artist, is_album_image):
+        entry = directories.get(path)
+        if not entry:
+            return
+        parent_folder = os.path.basename(path)
+        for file, info in entry["images"].items():
+            image_path = os.path.join(path, file)
+            if image_path in processed_paths:
+                continue
+            image_files.append({
+                'file_path': image_path,
+                'album': album_name,
+                'artist': artist,
+                'file_size': info["size"],
+                'file_name': file,
+                'extension': os.path.splitext(file)[1].lower(),
+                'parent_folder': parent_folder,
+                'mtime': info["mtime"],
+                'width': info.get("width"),
+                'height': info.get("height"),
+                'is_album_image': is_album_image,
+                'is_primary_cover': is_album_image and image_path in primary_covers
             })
-            
+            processed_paths.add(image_path)
+
+    for album_dir, (album_name, artist) in album_image_directories(albums).items():
+        add_directory(album_dir, album_name, artist, True)
+
+    def add_tree(path):
+        entry = directories.get(path)
+        if not entry:
+            return
+        # Try to determine album from path; if the folder is "Albums", use its parent
+        parent_dir = os.path.basename(path)
+        grandparent_dir = os.path.basename(os.path.dirname(path))
+        album_name = grandparent_dir if parent_dir.lower() == "albums" and grandparent_dir else parent_dir
+        add_directory(path, album_name, 'Unknown Artist', False)
+        for subdir in entry["subdirs"]:
+            add_tree(os.path.join(path, subdir))
+
+    for root in roots:
+        add_tree(root)
+    return image_files
+
+def apply_image_index(directories, images):
+    """Swap in new image listings, bumping the generation only if the list changed"""
+    global image_index_directories, image_index_images, image_index_generation
+    changed = images != image_index_images
+    image_index_directories = directories
+    image_index_images = images
+    if changed:
+        image_index_generation += 1
+        print(f"Image index updated: {len(images)} images in {len(directories)} directories")
+
+def load_image_index_from_disk():
+    """Serve the persisted index immediately at startup, before the first scan"""
+    directories = load_image_index()
+    apply_image_index(directories, flatten_image_index(directories, albums_data, list(ALLOWED_DIRS)))
+
+async def refresh_image_index():
+    """Rescan changed directories in a worker thread and swap the result in"""
+    async with image_index_refresh_lock:
+        previous, albums, roots = image_index_directories, albums_data, list(ALLOWED_DIRS)
+
+        def scan():
+            directories = scan_image_index(previous, albums, roots)
+            images = flatten_image_index(directories, albums, roots)
+            if directories != previous:
+                save_image_index(directories)
+            return directories, images
+
+        loop = asyncio.get_running_loop()
+        directories, images = await loop.run_in_executor(None, scan)
+        apply_image_index(directories, images)
+
+async def watch_image_index():
+    """Background scanner: refresh the image index now and then periodically"""
+    while True:
+        try:
+            await refresh_image_index()
+        except Exception as e:
+            print(f"Error refreshing image index: {e}")
+        await asyncio.sleep(IMAGE_INDEX_REFRESH_SECONDS)
+
+@app.get("/api/all-images")
+async def get_all_images(
+    request: Request,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    album: Optional[str] = None,
+    extension: Optional[str] = None
+):
+    """
+    Get all image files from the image index
+
+    Parameters:
+    - offset / limit: page through the images (all by default)
+    - album: only images attributed to this album
+    - extension: only this file extension (e.g. ".png" or "png")
+    """
+    images = image_index_images
+    offset = max(0, offset)
+    if extension and not extension.startswith('.'):
+        extension = '.' + extension
+
+    def build():
+        matching = images
+        if album is not None:
+            matching = [image for image in matching if image['album'] == album]
+        if extension:
+            matching = [image for image in matching if image['extension'] == extension.lower()]
+        page = matching[offset:offset + limit] if limit is not None else matching[offset:]
+        return {
+            "total_images": len(matching),
+            "offset": offset,
+            "images": page
+        }
+
+    cache_key = ("all-images", tuple(sorted(request.query_params.multi_items())))
+    return await cached_json_response(request, cache_key, (catalog_generation, image_index_generation), build)
+
+@app.get("/api/album-art-flipbook")
+async def get_album_art_flipbook(request: Request):
+    """Get all available album art for flipbook browsing"""
+    images, albums = image_index_images, albums_data
+    return await cached_json_response(
+        request, "album-art-flipbook", (catalog_generation, image_index_generation),
+        lambda: build_album_art_flipbook(images, albums)
+    )
+
+def build_album_art_flipbook(images, albums):
+    """Album art for the flipbook, from the same media index as /api/all-images"""
+    # Group album-folder images by album, primary cover first
+    by_album = {}
+    for image in images:
+        if image['is_album_image']:
+            by_album.setdefault(image['album'], []).append(image)
+
+    album_arts = []
+    for album_name, album_images in by_album.items():
+        album = albums.get(album_name, {})
+        album_images.sort(key=lambda image: not image['is_primary_cover'])
+        for image in album_images:
             album_arts.append({
                 'album': album_name,
-                'artist': album_data.get('artist', record.get('artist', 'Unknown')),
-                'cover_path': file_path,
-                'track_count': len(album_data.get('tracks', [])),
-                'total_duration': album_data.get('total_duration', 0),
-                'is_primary_cover': False
+                'artist': album.get('artist', 'AeroVista'),
+                'cover_path': image['file_path'],
+                'track_count': len(album.get('tracks', [])),
+                'total_duration': album.get('total_duration', 0),
+                'is_primary_cover': image['is_primary_cover'],
+                'file_size': image['file_size'],
+                'mtime': image['mtime'],
+                'width': image['width'],
+                'height': image['height']
             })
-            processed_paths.add(file_path)
-    
-    print(f"Found {len(album_arts)} album arts for gallery from {len(processed_paths)} unique paths")
-    
+
     return {
-        "total_albums_with_art": len(set(art['album'] for art in album_arts)),
+        "total_albums_with_art": len(by_album),
         "total_images": len(album_arts),
         "album_arts": album_arts
     }
 
+# Byte-range file streaming for audio: a single Range (with If-Range) gets a
+# 206 with just the requested bytes, so seeks in large FLAC/WAV files do not
+# re-download the file. Network-share files are read in larger chunks to
+# cut SMB round trips.
+STREAM_CHUNK_SIZE = 256 * 1024
+STREAM_NETWORK_CHUNK_SIZE = 1024 * 1024
+stream_stats = {
+    "requests": 0,
+    "partial_responses": 0,
+    "zero_copy_responses": 0,
+    "bytes_served": 0,
+    "bytes_skipped": 0  # file bytes not sent thanks to range requests
+}
+
+def is_network_path(path):
+    """True for UNC/SMB paths and files under the configured network share"""
+    normalized = path.replace('\\', '/')
+    network_share = tailscale_config["local_paths"].get("network_share", "").replace('\\', '/')
+    return normalized.startswith('//') or bool(network_share and normalized.startswith(network_share))
+
+def parse_byte_range(range_header, size):
+    """
+    Parse a Range header into an inclusive (start, end) for a file of size bytes.
+
+    Returns None when the whole file should be served (no, malformed or
+    multi-range headers) and raises 416 when the range cannot be satisfied.
+    """
+    unit, _, spec = range_header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+
+    first, _, last = spec.strip().partition('-')
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if last and end < start:
+                return None
+        else:
+            suffix = int(last)
+            if suffix == 0:
+                start = size
+            else:
+                start = max(size - suffix, 0)
+            end = size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, min(end, size - 1)
+
+def if_range_matches(if_range, etag, last_modified):
+    """Whether a Range may be honored under the request's If-Range validator"""
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag  # weak validators never match
+    return if_range == last_modified
+
+class RangeFileResponse(Response):
+    """
+    Send bytes start..end of a file.
+
+    Uses the ASGI zero-copy send extension (the server calls os.sendfile)
+    when the server offers it, and chunked reads in a worker thread
+    otherwise. Bytes actually sent are added to stream_stats.
+    """
+
+    def __init__(self, path, start, end, size, status_code, media_type, headers):
+        super().__init__(status_code=status_code, media_type=media_type, headers=headers)
+        self.path = path
+        self.start = start
+        self.length = end - start + 1
+        self.size = size
+        self.chunk_size = STREAM_NETWORK_CHUNK_SIZE if is_network_path(path) else STREAM_CHUNK_SIZE
+        self.headers["content-length"] = str(self.length)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        sent = 0
+        zero_copy = "http.response.zerocopysend" in scope.get("extensions", {})
+        try:
+            f = await anyio.to_thread.run_sync(open, self.path, 'rb')
+            try:
+                if zero_copy and self.length:
+                    await send({
+                        "type": "http.response.zerocopysend",
+                        "file": f,
+                        "offset": self.start,
+                        "count": self.length,
+                        "more_body": False
+                    })
+                    sent = self.length
+                else:
+                    if hasattr(os, 'posix_fadvise'):
+                        # Let the kernel read ahead across the requested range
+                        os.posix_fadvise(f.fileno(), self.start, self.length, os.POSIX_FADV_SEQUENTIAL)
+                    f.seek(self.start)
+                    remaining = self.length
+                    while remaining > 0:
+                        chunk = await anyio.to_thread.run_sync(f.read, min(self.chunk_size, remaining))
+                        if not chunk:
+                            break
+                        remaining -= len(chunk)
+                        await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                        sent += len(chunk)
+                    if remaining > 0 or not self.length:
+                        await send({"type": "http.response.body", "body": b"", "more_body": False})
+            finally:
+                f.close()
+        finally:
+            stream_stats["requests"] += 1
+            stream_stats["bytes_served"] += sent
+            if self.status_code == 206:
+                stream_stats["partial_responses"] += 1
+                stream_stats["bytes_skipped"] += self.size - self.length
+            if zero_copy:
+                stream_stats["zero_copy_responses"] += 1
+            print(f"Served {sent} of {self.size} bytes ({self.status_code}) from {self.path}")
+
+def range_file_response(request, path, content_type, headers=None):
+    """Build a 200 or 206 response for path honoring Range and If-Range"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Audio file not found")
+
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+
+    start, end, status_code = 0, size - 1, 200
+    range_header = request.headers.get("range")
+    if range_header and if_range_matches(request.headers.get("if-range"), etag, last_modified):
+        byte_range = parse_byte_range(range_header, size)
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+
+    response_headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        **(headers or {})
+    }
+    if status_code == 206:
+        response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return RangeFileResponse(path, start, end, size, status_code, content_type, response_headers)
+
+@app.get("/api/stream-stats")
+async def get_stream_stats():
+    """Bytes served by the audio streaming endpoints since startup"""
+    return stream_stats
+
+# Optional read-through media cache: audio and images from the network share
+# are copied to local disk on first play and served from there afterwards.
+# Entries are keyed by the inventory file_hash (or path, size and mtime for
+# files the inventory has no hash for) and evicted least recently used first.
+MEDIA_CACHE_CONFIG_FILE = os.path.join(os.path.dirname(__file__), "config", "media_cache_config.json")
+
+def load_media_cache_config():
+    """Load media cache settings from config file"""
+    default_config = {
+        "enabled": False,
+        "directory": "",  # empty: cache/media next to the other caches
+        "max_size_mb": 10240,
+        "prefetch_tracks": 2,  # following album tracks copied in when a track plays
+        "network_only": True  # only cache files that live on the network share
+    }
+
+    try:
+        os.makedirs(os.path.dirname(MEDIA_CACHE_CONFIG_FILE), exist_ok=True)
+
+        if not os.path.exists(MEDIA_CACHE_CONFIG_FILE):
+            with open(MEDIA_CACHE_CONFIG_FILE, 'w') as f:
+                json.dump(default_config, f, indent=2)
+            return default_config
+
+        with open(MEDIA_CACHE_CONFIG_FILE, 'r') as f:
+            return {**default_config, **json.load(f)}
+    except Exception as e:
+        print(f"Error loading media cache config: {e}")
+        return default_config
+
+media_cache_config = load_media_cache_config()
+MEDIA_CACHE_DIR = media_cache_config["directory"] or os.path.join(CACHE_DIR, "media")
+MEDIA_CACHE_MAX_BYTES = int(media_cache_config["max_size_mb"]) * 1024 * 1024
+MEDIA_CACHE_CONCURRENT_FILLS = 2
+media_cache_entries = OrderedDict()  # cache key -> (cached file, size), least recently used first
+media_cache_fills = set()  # cache keys currently being copied in
+media_cache_fill_slots = asyncio.Semaphore(MEDIA_CACHE_CONCURRENT_FILLS)
+media_cache_stats = {"hits": 0, "misses": 0, "fills": 0, "evictions": 0, "bytes": 0}
+
+def load_media_cache_index():
+    """Rebuild the LRU order of the media cache from the files on disk"""
+    if not media_cache_config["enabled"] or not os.path.isdir(MEDIA_CACHE_DIR):
+        return
+
+    files = []
+    for root, _, names in os.walk(MEDIA_CACHE_DIR):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                if name.endswith('.part'):
+                    os.remove(path)  # interrupted copy
+                    continue
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_atime, os.path.splitext(name)[0], path, stat.st_size))
+
+    media_cache_entries.clear()
+    media_cache_stats["bytes"] = 0
+    for _, key, path, size in sorted(files):
+        media_cache_entries[key] = (path, size)
+        media_cache_stats["bytes"] += size
+    evict_media_cache()
+    print(f"Media cache: {len(media_cache_entries)} files, {media_cache_stats['bytes'] / (1024 * 1024):.0f} MB")
+
+def media_cache_key(path, file_hash=None):
+    """Cache key for a source file, or None when it should not be cached"""
+    if not media_cache_config["enabled"]:
+        return None
+    if media_cache_config["network_only"] and not is_network_path(path):
+        return None
+    if file_hash:
+        return file_hash
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return hashlib.md5(f"{path}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8')).hexdigest()
+
+def evict_media_cache():
+    """Drop least recently used files until the cache fits its size limit"""
+    while media_cache_entries and media_cache_stats["bytes"] > MEDIA_CACHE_MAX_BYTES:
+        _, (path, size) = media_cache_entries.popitem(last=False)
+        media_cache_stats["bytes"] -= size
+        media_cache_stats["evictions"] += 1
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Could not evict cached media {path}: {e}")
+
+def copy_into_media_cache(key, path):
+    """Copy a source file into the cache; returns (cached file, size), or None when it is too big to cache"""
+    if os.path.getsize(path) > MEDIA_CACHE_MAX_BYTES:
+        return None
+    target = os.path.join(MEDIA_CACHE_DIR, key[:2], key + os.path.splitext(path)[1].lower())
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    partial = target + '.part'
+    shutil.copy2(path, partial)  # keeps mtime, so ETags match the source file
+    os.replace(partial, target)
+    return target, os.path.getsize(target)
+
+async def fill_media_cache(key, path):
+    """Background copy of one file into the media cache"""
+    try:
+        async with media_cache_fill_slots:
+            copied = await asyncio.get_running_loop().run_in_executor(None, copy_into_media_cache, key, path)
+        if not copied:
+            return
+        cached, size = copied
+        media_cache_entries[key] = (cached, size)
+        media_cache_stats["bytes"] += size
+        media_cache_stats["fills"] += 1
+        evict_media_cache()
+    except OSError as e:
+        print(f"Error caching media file {path}: {e}")
+    finally:
+        media_cache_fills.discard(key)
+
+def schedule_media_cache_fill(key, path):
+    """Start copying a file into the cache unless it is cached or on its way"""
+    if key in media_cache_entries or key in media_cache_fills:
+        return
+    media_cache_fills.add(key)
+    spawn_background_task(fill_media_cache(key, path))
+
+def cached_media_file(path, file_hash=None):
+    """
+    The file to serve for a source file: its cached copy when there is one.
+
+    A miss serves the source and copies it into the cache in the background.
+    """
+    key = media_cache_key(path, file_hash)
+    if not key:
+        return path
+
+    entry = media_cache_entries.get(key)
+    if entry and os.path.exists(entry[0]):
+        media_cache_entries.move_to_end(key)
+        media_cache_stats["hits"] += 1
+        return entry[0]
+    if entry:
+        # Removed behind our back
+        del media_cache_entries[key]
+        media_cache_stats["bytes"] -= entry[1]
+
+    media_cache_stats["misses"] += 1
+    schedule_media_cache_fill(key, path)
+    return path
+
+def prefetch_album_tracks(track_id):
+    """Copy the tracks following track_id in its album into the media cache"""
+    count = media_cache_config["prefetch_tracks"]
+    track = tracks_by_id.get(track_id)
+    if not media_cache_config["enabled"] or count <= 0 or not track:
+        return
+
+    album = albums_by_id.get(track.get('album_id'))
+    album_tracks = album.get('tracks', []) if album else []
+    position = next((i for i, t in enumerate(album_tracks) if t is track), None)
+    if position is None:
+        return
+
+    for next_track in album_tracks[position + 1:position + 1 + count]:
+        entry = stream_table.get(next_track.get('id'))
+        if entry and entry["path"]:
+            key = media_cache_key(entry["path"], entry["file_hash"])
+            if key:
+                schedule_media_cache_fill(key, entry["path"])
+
+@app.get("/api/media-cache")
+async def get_media_cache_stats():
+    """Media cache settings and hit/miss counters"""
+    return {
+        "enabled": media_cache_config["enabled"],
+        "directory": MEDIA_CACHE_DIR,
+        "max_bytes": MEDIA_CACHE_MAX_BYTES,
+        "files": len(media_cache_entries),
+        "filling": len(media_cache_fills),
+        **media_cache_stats
+    }
+
+# Resolved media paths: requested /api/audio and /api/image paths are mapped
+# to the local file and content type once, so repeated plays and seeks skip
+# the path repair and the existence probes against every allowed directory.
+# Cleared whenever the catalog or the Tailscale config changes.
+RESOLVED_PATH_CACHE_MAX_ENTRIES = 4096
+RESOLVED_PATH_CACHE_TTL_SECONDS = 600
+resolved_path_cache = OrderedDict()  # (kind, requested path) -> (expires, file, content type)
+
+AUDIO_CONTENT_TYPES = {
+    '.wav': "audio/wav",
+    '.flac': "audio/flac",
+    '.ogg': "audio/ogg",
+    '.m4a': "audio/mp4"
+}
+IMAGE_CONTENT_TYPES = {
+    '.png': "image/png",
+    '.gif': "image/gif",
+    '.webp': "image/webp",
+    '.svg': "image/svg+xml",
+    '.ico': "image/x-icon"
+}
+MEDIA_KINDS = {
+    "audio": (AUDIO_CONTENT_TYPES, "audio/mpeg"),  # default for .mp3
+    "image": (IMAGE_CONTENT_TYPES, "image/jpeg")   # default for .jpg
+}
+
+def clear_resolved_path_cache():
+    """Forget every resolved media path"""
+    resolved_path_cache.clear()
+
+def repair_media_path(file_path):
+    """URL-decode a requested media path and repair known malformed network paths"""
+    import urllib.parse
+    decoded_path = urllib.parse.unquote(file_path)
+
+    # Handle malformed paths that are missing backslashes
+    if decoded_path.startswith('envy2-0EchoVerse_MusicAlbums'):
+        # Split at Albums and reconstruct properly
+        parts = decoded_path.split('Albums', 1)
+        if len(parts) == 2:
+            decoded_path = '\\\\envy2-0\\EchoVerse_Music\\Albums\\' + parts[1].replace(' ', '\\')
+            print(f"Fixed malformed path: {decoded_path}")
+
+    # Fix paths with missing backslashes
+    if decoded_path.startswith('\\envy2-0') and '\\Albums' not in decoded_path and 'Albums' in decoded_path:
+        # Reconstruct the path by adding backslashes at key points
+        parts = decoded_path.split('Albums')
+        if len(parts) == 2:
+            decoded_path = parts[0].replace('\\envy2-0', '\\\\envy2-0\\') + 'Albums\\' + parts[1].replace(' ', '\\')
+            print(f"Fixed path with missing backslashes: {decoded_path}")
+
+    return decoded_path
+
+def locate_media_file(decoded_path, exists=os.path.exists):
+    """Find a requested file directly or inside the allowed directories"""
+    # First try the direct path
+    if exists(decoded_path):
+        return decoded_path
+
+    # A path inside an allowed directory that does not exist is simply missing
+    if any(decoded_path.startswith(allowed_dir) for allowed_dir in ALLOWED_DIRS):
+        return None
+
+    path_parts = decoded_path.replace('\\', '/').split('/')
+    candidates = [os.path.basename(decoded_path)]
+    if len(path_parts) >= 2:
+        # Also try the last two parts of the path
+        candidates.append(os.path.join(path_parts[-2], path_parts[-1]))
+
+    for candidate in candidates:
+        for allowed_dir in ALLOWED_DIRS:
+            if allowed_dir.endswith('/') or allowed_dir.endswith('\\'):
+                test_path = os.path.join(allowed_dir, candidate)
+            else:
+                test_path = os.path.join(allowed_dir + '\\', candidate)
+
+            if exists(test_path):
+                print(f"Found file in allowed directory: {test_path}")
+                return test_path
+    return None
+
+def resolve_media_path(file_path, kind):
+    """
+    Resolve a requested media path to (local file, content type).
+
+    Returns (None, None) when the file cannot be found. Successful lookups
+    are cached for RESOLVED_PATH_CACHE_TTL_SECONDS.
+    """
+    key = (kind, file_path)
+    cached = resolved_path_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        resolved_path_cache.move_to_end(key)
+        return cached[1], cached[2]
+
+    file_to_stream = locate_media_file(repair_media_path(file_path))
+    if not file_to_stream:
+        resolved_path_cache.pop(key, None)
+        return None, None
+
+    content_types, default_type = MEDIA_KINDS[kind]
+    content_type = content_types.get(os.path.splitext(file_to_stream)[1].lower(), default_type)
+
+    resolved_path_cache[key] = (time.monotonic() + RESOLVED_PATH_CACHE_TTL_SECONDS, file_to_stream, content_type)
+    resolved_path_cache.move_to_end(key)
+    while len(resolved_path_cache) > RESOLVED_PATH_CACHE_MAX_ENTRIES:
+        resolved_path_cache.popitem(last=False)
+    return file_to_stream, content_type
+
+def directory_listing_exists():
+    """
+    An os.path.exists replacement that lists each directory once.
+
+    Validating a whole catalog this way costs one listing per album folder
+    instead of several stats per track, which matters on network shares.
+    """
+    listings = {}
+
+    def exists(path):
+        directory, name = os.path.split(path)
+        if directory not in listings:
+            try:
+                listings[directory] = set(os.listdir(directory or '.'))
+            except OSError:
+                listings[directory] = set()
+        return name in listings[directory]
+
+    return exists
+
+def build_stream_table(tracks_by_id):
+    """
+    Map track IDs to their validated local file, content type and Tailscale URL.
+
+    path is None when the file is not reachable from this machine; the
+    Tailscale URL is still available for redirects.
+    """
+    exists = directory_listing_exists()
+    content_types, default_type = MEDIA_KINDS["audio"]
+    table = {}
+    for track_id, track in tracks_by_id.items():
+        file_path = track.get('file_path', '')
+        if not file_path:
+            continue
+        local_path = locate_media_file(file_path, exists)
+        table[track_id] = {
+            "path": local_path,
+            "content_type": content_types.get(os.path.splitext(file_path)[1].lower(), default_type),
+            "tailscale_url": track.get('tailscale_echoverse_url', ''),
+            "file_hash": track.get('file_hash', '')
+        }
+    located = sum(1 for entry in table.values() if entry["path"])
+    print(f"Stream table: {located} of {len(table)} tracks available locally")
+    return table
+
+def build_stream_paths(table):
+    """Reverse map of the stream table: local file -> track ID"""
+    paths = {}
+    for track_id, entry in table.items():
+        if entry["path"]:
+            paths.setdefault(entry["path"], track_id)
+    return paths
+
+async def rebuild_stream_table():
+    """Revalidate track files after the allowed directories change"""
+    global stream_table, stream_paths
+    generation = catalog_generation
+    table = await asyncio.get_running_loop().run_in_executor(None, build_stream_table, tracks_by_id)
+    # A catalog swap during the rebuild already brought its own table
+    if generation == catalog_generation:
+        stream_table, stream_paths = table, build_stream_paths(table)
+
 @app.get("/api/image/{file_path:path}")
-async def stream_image(file_path: str, use_tailscale: bool = None):
+async def stream_image(
+    file_path: str,
+    request: Request,
+    use_tailscale: bool = None,
+    size: Optional[int] = None,
+    format: Optional[str] = None,
+    v: Optional[str] = None
+):
     """
     Stream image files using the same logic as audio files
     
     Parameters:
     - file_path: Path to the image file
     - use_tailscale: Override global Tailscale setting (optional)
+    - size: Return a 128/256/512 thumbnail instead of the original (optional)
+    - format: Thumbnail format, webp or jpeg (optional, negotiated by default)
+    - v: The image's mtime from /api/all-images; while it matches, the thumbnail is cached as immutable (optional)
     """
     try:
         # Use global setting if not specified
         use_tailscale_for_request = USE_TAILSCALE if use_tailscale is None else use_tailscale
         
-        # Decode the file path - handle all URL encoding
-        import urllib.parse
-        decoded_path = urllib.parse.unquote(file_path)
-        print(f"Original image path: {file_path}")
-        print(f"Decoded image path: {decoded_path}")
-        
-        # Handle malformed paths that are missing backslashes
-        if decoded_path.startswith('envy2-0EchoVerse_MusicAlbums'):
-            # This is a malformed path missing backslashes
-            # Split at Albums and reconstruct properly
-            parts = decoded_path.split('Albums', 1)
-            if len(parts) == 2:
-                # Reconstruct with proper backslashes
-                fixed_path = '\\\\envy2-0\\EchoVerse_Music\\Albums\\' + parts[1].replace(' ', '\\')
-                print(f"Fixed malformed image path: {fixed_path}")
-                decoded_path = fixed_path
-        
-        # Fix paths with missing backslashes
-        if decoded_path.startswith('\\envy2-0') and '\\Albums' not in decoded_path and 'Albums' in decoded_path:
-            # This is likely a path with missing backslashes
-            # Try to reconstruct the path by adding backslashes at key points
-            parts = decoded_path.split('Albums')
-            if len(parts) == 2:
-                fixed_path = parts[0].replace('\\envy2-0', '\\\\envy2-0\\') + 'Albums\\' + parts[1].replace(' ', '\\')
-                print(f"Fixed image path with missing backslashes: {fixed_path}")
-                decoded_path = fixed_path
+        # Thumbnails are rendered here, so they skip the Tailscale redirect
+        if size:
+            file_to_stream, _ = resolve_media_path(file_path, "image")
+            if file_to_stream:
+                thumbnail = await thumbnail_response(
+                    request, cached_media_file(file_to_stream), size, format, is_current_version(v, file_to_stream)
+                )
+                if thumbnail:
+                    return thumbnail
         
         # If using Tailscale, redirect to the Tailscale URL
         if use_tailscale_for_request:
-            # Use our path converter to get the Tailscale URL
+            decoded_path = repair_media_path(file_path)
             tailscale_url = convert_to_tailscale_url(decoded_path)
             
             # If we got a valid Tailscale URL, redirect to it
@@ -1098,76 +3720,15 @@ async def stream_image(file_path: str, use_tailscale: bool = None):
             else:
                 print(f"Could not convert to Tailscale URL for image, falling back to direct streaming: {decoded_path}")
         
-        # Try to find the file using a more flexible approach
-        file_to_stream = None
-        
-        # First try the direct path
-        if os.path.exists(decoded_path):
-            file_to_stream = decoded_path
-        else:
-            # Check if the path is within allowed directories
-            is_allowed = any(decoded_path.startswith(allowed_dir) for allowed_dir in ALLOWED_DIRS)
-            
-            if not is_allowed:
-                # Try to find the file in allowed directories
-                file_name = os.path.basename(decoded_path)
-                for allowed_dir in ALLOWED_DIRS:
-                    if allowed_dir.endswith('/') or allowed_dir.endswith('\\'):
-                        test_path = os.path.join(allowed_dir, file_name)
-                    else:
-                        test_path = os.path.join(allowed_dir + '\\', file_name)
-                    
-                    if os.path.exists(test_path):
-                        print(f"Found image in allowed directory: {test_path}")
-                        file_to_stream = test_path
-                        break
-                
-                if not file_to_stream:
-                    # Try to find the file by searching for the last part of the path
-                    path_parts = decoded_path.replace('\\', '/').split('/')
-                    if len(path_parts) >= 2:
-                        # Try the last two parts of the path
-                        search_path = os.path.join(path_parts[-2], path_parts[-1])
-                        for allowed_dir in ALLOWED_DIRS:
-                            if allowed_dir.endswith('/') or allowed_dir.endswith('\\'):
-                                test_path = os.path.join(allowed_dir, search_path)
-                            else:
-                                test_path = os.path.join(allowed_dir + '\\', search_path)
-                            
-                            if os.path.exists(test_path):
-                                print(f"Found image using path parts: {test_path}")
-                                file_to_stream = test_path
-                                break
-            else:
-                # Path is allowed, but file might not exist
-                if not os.path.exists(decoded_path):
-                    print(f"Image file not found: {decoded_path}")
-                    raise HTTPException(status_code=404, detail="Image file not found")
-                file_to_stream = decoded_path
-        
+        file_to_stream, content_type = resolve_media_path(file_path, "image")
         if not file_to_stream:
-            print(f"Could not find image file: {decoded_path}")
+            print(f"Could not find image file: {file_path}")
             print(f"Allowed directories: {ALLOWED_DIRS}")
             raise HTTPException(status_code=404, detail="Image file not found")
         
-        # Determine content type based on file extension
-        content_type = "image/jpeg"  # default for .jpg
-        if file_to_stream.lower().endswith('.png'):
-            content_type = "image/png"
-        elif file_to_stream.lower().endswith('.gif'):
-            content_type = "image/gif"
-        elif file_to_stream.lower().endswith('.webp'):
-            content_type = "image/webp"
-        elif file_to_stream.lower().endswith('.svg'):
-            content_type = "image/svg+xml"
-        elif file_to_stream.lower().endswith('.ico'):
-            content_type = "image/x-icon"
-        
-        print(f"Streaming image file via direct path: {file_to_stream}")
-        
         # Return the image file with proper headers
         return FileResponse(
-            file_to_stream, 
+            cached_media_file(file_to_stream), 
             media_type=content_type,
             headers={
                 "Cache-Control": "public, max-age=3600",
@@ -1175,6 +3736,8 @@ async def stream_image(file_path: str, use_tailscale: bool = None):
             }
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error streaming image file {file_path}: {e}")
         raise HTTPException(status_code=500, detail="Error streaming image file")
@@ -1182,69 +3745,781 @@ async def stream_image(file_path: str, use_tailscale: bool = None):
 @app.get("/api/track/{track_id}")
 async def get_track_by_id(track_id: str):
     """Get track details by unique ID"""
-    for track in catalog_data:
-        if track.get('id') == track_id:
-            return {
-                "track": track,
-                "relationships": {
-                    "album_id": track.get('album_id'),
-                    "artist_id": track.get('artist_id'),
-                    "trace_path": f"track_{track_id} -> album_{track.get('album_id')} -> artist_{track.get('artist_id')}"
-                }
-            }
-    raise HTTPException(status_code=404, detail="Track not found")
+    track = tracks_by_id.get(track_id)
+    if not track:
+        raise HTTPException(status_code=404, detail="Track not found")
+    return {
+        "track": track,
+        "relationships": {
+            "album_id": track.get('album_id'),
+            "artist_id": track.get('artist_id'),
+            "trace_path": f"track_{track_id} -> album_{track.get('album_id')} -> artist_{track.get('artist_id')}"
+        }
+    }
+
+@app.get("/api/tracks")
+async def get_tracks_by_ids(ids: str = ""):
+    """Get many tracks in one round trip (comma-separated track IDs)"""
+    requested = [track_id.strip() for track_id in ids.split(',') if track_id.strip()]
+    if len(requested) > MAX_BATCH_TRACK_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_TRACK_IDS} track IDs per request")
+
+    tracks = []
+    missing = []
+    for track_id in requested:
+        track = tracks_by_id.get(track_id)
+        if track:
+            tracks.append(track)
+        else:
+            missing.append(track_id)
+    return {"tracks": tracks, "missing": missing}
+
+@app.get("/api/duplicates")
+async def get_duplicates(offset: int = 0, limit: int = CATALOG_PAGE_DEFAULT_LIMIT):
+    """
+    Audio files the inventory found more than once, grouped by content
+
+    Each group names the catalog track that represents the content and the
+    other copies collapsed into it, most wasted space first.
+    """
+    limit = max(1, min(limit, CATALOG_PAGE_MAX_LIMIT))
+    offset = max(0, offset)
+    duplicates, by_hash = catalog_duplicates, tracks_by_hash
+
+    def wasted_bytes(copies):
+        return sum(float(copy.get('file_size') or 0) for copy in copies)
+
+    groups = sorted(duplicates.items(), key=lambda item: (-wasted_bytes(item[1]), item[0]))
+    page = []
+    for file_hash, copies in groups[offset:offset + limit]:
+        track = by_hash.get(file_hash, {})
+        page.append({
+            "file_hash": file_hash,
+            "track": {field: track.get(field, '') for field in ('id', 'track', 'album', 'artist', 'file_path')},
+            "copies": copies,
+            "wasted_bytes": wasted_bytes(copies)
+        })
+    return JSONResponse(
+        content=page,
+        headers={
+            "X-Total-Count": str(len(groups)),
+            "X-Duplicate-Files": str(sum(len(copies) for copies in duplicates.values()))
+        }
+    )
 
 @app.get("/api/album/{album_id}")
 async def get_album_by_id(album_id: str):
     """Get album details by unique ID"""
-    for album_name, album_data in albums_data.items():
-        if album_data.get('id') == album_id:
-            return album_data
-    raise HTTPException(status_code=404, detail="Album not found")
+    album = albums_by_id.get(album_id)
+    if not album:
+        raise HTTPException(status_code=404, detail="Album not found")
+    return album
+
+@app.get("/api/artist/{artist_id}")
+async def get_artist_by_id(artist_id: str):
+    """Get artist details and album summaries by unique ID"""
+    artist = artists_by_id.get(artist_id)
+    if not artist:
+        raise HTTPException(status_code=404, detail="Artist not found")
+
+    albums = []
+    for album_id in artist['album_ids']:
+        album = albums_by_id.get(album_id)
+        if album:
+            albums.append({
+                'id': album.get('id'),
+                'album': album.get('album'),
+                'cover': album.get('cover', ''),
+                'track_count': len(album.get('tracks', [])),
+                'total_duration': album.get('total_duration', 0),
+                'total_size': album.get('total_size', 0)
+            })
+    return {
+        "artist": {
+            "id": artist['id'],
+            "name": artist['artist'],
+            "album_count": len(albums),
+            "track_count": artist['track_count']
+        },
+        "albums": albums
+    }
+
+# Waveforms: peak arrays and integrated loudness per track, computed by the
+# `python main.py waveforms` batch job in a process pool and stored next to
+# the catalog snapshot, keyed by file_hash so they survive catalog reloads.
+# Decoding uses ffmpeg when it is installed; without it only WAV files work.
+WAVEFORM_FILE = os.path.join(CACHE_DIR, "waveforms.pkl")
+WAVEFORM_VERSION = 2
+WAVEFORM_POINTS = 1000  # peaks per track, quantized to 0-255
+WAVEFORM_SAMPLE_RATE = 24000
+WAVEFORM_SAVE_EVERY = 50
+WAVEFORM_STORE_CHECK_SECONDS = 30  # how often requests look for a rewritten store
+LOUDNESS_BLOCK_SECONDS = 0.4
+LOUDNESS_HOP_SECONDS = 0.1
+LOUDNESS_BATCH_BLOCKS = 256
+FFMPEG_BINARY = shutil.which("ffmpeg")
+
+waveform_store = {}  # file_hash -> {"peaks", "duration", "loudness_lufs", "peak_dbfs"}
+waveform_store_mtime = None
+waveform_store_checked = None  # time.monotonic() of the last look at the store file
+
+def split_piped_wav(data):
+    """Channel count and PCM payload of a WAV written to a pipe (its size fields are unset)"""
+    position = 12
+    channels = None
+    while position + 8 <= len(data):
+        chunk_id = data[position:position + 4]
+        size = struct.unpack('<I', data[position + 4:position + 8])[0]
+        if chunk_id == b'fmt ':
+            channels = struct.unpack('<H', data[position + 10:position + 12])[0]
+        elif chunk_id == b'data' and channels:
+            payload = data[position + 8:]
+            return channels, payload[:len(payload) - len(payload) % (2 * channels)]
+        position += 8 + size + size % 2
+    raise ValueError("ffmpeg produced no WAV audio")
+
+def decode_audio_samples(path):
+    """
+    Decode a file to an int16 array of shape (frames, channels) and its sample rate
+
+    Mono stays mono so loudness measures it as one channel; sources with
+    more than two channels are downmixed to stereo.
+    """
+    if FFMPEG_BINARY:
+        result = subprocess.run(
+            [FFMPEG_BINARY, "-v", "error", "-i", path, "-vn", "-af", "aformat=channel_layouts=mono|stereo",
+             "-acodec", "pcm_s16le", "-ar", str(WAVEFORM_SAMPLE_RATE), "-bitexact", "-map_metadata", "-1",
+             "-f", "wav", "-"],
+            capture_output=True, check=True
+        )
+        channels, pcm = split_piped_wav(result.stdout)
+        return np.frombuffer(pcm, dtype=np.int16).reshape(-1, channels), WAVEFORM_SAMPLE_RATE
+
+    with wave.open(path, 'rb') as w:
+        if w.getsampwidth() != 2:
+            raise ValueError("only 16-bit PCM WAV can be decoded without ffmpeg")
+        frames = w.readframes(w.getnframes())
+        return np.frombuffer(frames, dtype=np.int16).reshape(-1, w.getnchannels()), w.getframerate()
+
+def biquad_power_response(b, a, freqs, sample_rate):
+    """|H(f)|^2 of a biquad at the given frequencies"""
+    z = np.exp(-1j * 2 * np.pi * freqs / sample_rate)
+    h = (b[0] + b[1] * z + b[2] * z ** 2) / (a[0] + a[1] * z + a[2] * z ** 2)
+    return np.abs(h) ** 2
+
+def k_weighting_power(freqs, sample_rate):
+    """ITU-R BS.1770 K-weighting (high shelf, then high pass) as a power response at any rate"""
+    # High shelf: +4 dB above ~1.7 kHz
+    gain_db, q, fc = 3.999843853973347, 0.7071752369554196, 1681.974450955533
+    k = np.tan(np.pi * fc / sample_rate)
+    vh = 10 ** (gain_db / 20)
+    vb = vh ** 0.4996667741545416
+    norm = 1 + k / q + k * k
+    shelf_b = [(vh + vb * k / q + k * k) / norm, 2 * (k * k - vh) / norm, (vh - vb * k / q + k * k) / norm]
+    shelf_a = [1.0, 2 * (k * k - 1) / norm, (1 - k / q + k * k) / norm]
+
+    # High pass at ~38 Hz
+    q, fc = 0.5003270373238773, 38.13547087602444
+    k = np.tan(np.pi * fc / sample_rate)
+    norm = 1 + k / q + k * k
+    pass_b = [1.0, -2.0, 1.0]
+    pass_a = [1.0, 2 * (k * k - 1) / norm, (1 - k / q + k * k) / norm]
+
+    return (biquad_power_response(shelf_b, shelf_a, freqs, sample_rate) *
+            biquad_power_response(pass_b, pass_a, freqs, sample_rate))
+
+def integrated_loudness(samples, sample_rate):
+    """
+    Gated integrated loudness in LUFS (ITU-R BS.1770), or None for silence.
+
+    The K-weighted energy of each 400 ms block is taken from its spectrum
+    (Parseval), which avoids running the IIR filters sample by sample.
+    """
+    block = int(LOUDNESS_BLOCK_SECONDS * sample_rate)
+    hop = int(LOUDNESS_HOP_SECONDS * sample_rate)
+    if len(samples) < block:
+        return None
+
+    weights = k_weighting_power(np.fft.rfftfreq(block, 1 / sample_rate), sample_rate)
+    weights[1:-1 if block % 2 == 0 else None] *= 2  # one-sided spectrum
+    windows = np.lib.stride_tricks.sliding_window_view(samples, block, axis=0)[::hop]  # (blocks, channels, block)
+
+    energies = []
+    for start in range(0, len(windows), LOUDNESS_BATCH_BLOCKS):
+        spectrum = np.fft.rfft(windows[start:start + LOUDNESS_BATCH_BLOCKS].astype(np.float32) / 32768.0, axis=-1)
+        power = (np.abs(spectrum) ** 2 * weights).sum(axis=-1) / block ** 2  # mean square per channel
+        energies.append(power.sum(axis=-1))  # channel weights are 1.0 for L/R
+    energies = np.concatenate(energies)
+
+    # Absolute gate at -70 LUFS, then relative gate 10 LU below that mean
+    gated = energies[-0.691 + 10 * np.log10(np.maximum(energies, 1e-20)) > -70]
+    if not len(gated):
+        return None
+    relative_gate = -0.691 + 10 * np.log10(gated.mean()) - 10
+    gated = gated[-0.691 + 10 * np.log10(gated) > relative_gate]
+    return round(float(-0.691 + 10 * np.log10(gated.mean())), 2)
+
+def analyze_waveform(path):
+    """Peaks, duration and loudness for one audio file (runs in a worker process)"""
+    samples, sample_rate = decode_audio_samples(path)
+
+    amplitude = np.abs(samples.astype(np.int32)).max(axis=1) if len(samples) else np.zeros(1, dtype=np.int32)
+    buckets = np.array_split(amplitude, min(WAVEFORM_POINTS, len(amplitude)))
+    peaks = np.array([bucket.max() for bucket in buckets], dtype=np.float32) / 32768.0
+    peak = float(amplitude.max()) / 32768.0
+
+    return {
+        "peaks": np.round(np.clip(peaks, 0, 1) * 255).astype(np.uint8).tobytes(),
+        "duration": round(len(samples) / sample_rate, 3),
+        "loudness_lufs": integrated_loudness(samples, sample_rate),
+        "peak_dbfs": round(20 * np.log10(peak), 2) if peak > 0 else None
+    }
+
+def load_waveform_store():
+    """Load the stored waveforms, or an empty store"""
+    try:
+        if os.path.exists(WAVEFORM_FILE):
+            with open(WAVEFORM_FILE, 'rb') as f:
+                stored = pickle.load(f)
+            if stored.get("version") == WAVEFORM_VERSION and stored.get("points") == WAVEFORM_POINTS:
+                return stored["tracks"]
+    except Exception as e:
+        print(f"Error loading waveforms: {e}")
+    return {}
+
+def save_waveform_store(tracks):
+    """Write the waveform store atomically"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = WAVEFORM_FILE + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump({"version": WAVEFORM_VERSION, "points": WAVEFORM_POINTS, "tracks": tracks}, f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, WAVEFORM_FILE)
+
+def generate_waveforms(workers=None, force=False):
+    """Batch job: analyze every locally reachable track missing from the store"""
+    load_music_catalog()
+    tracks = {} if force else load_waveform_store()
+
+    pending = {}
+    for entry in stream_table.values():
+        if entry["path"] and entry["file_hash"] and entry["file_hash"] not in tracks:
+            pending.setdefault(entry["file_hash"], entry["path"])
+    print(f"Waveforms: {len(tracks)} stored, {len(pending)} to analyze"
+          f"{'' if FFMPEG_BINARY else ' (ffmpeg not found, WAV only)'}")
+
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(analyze_waveform, path): file_hash for file_hash, path in pending.items()}
+        for future in as_completed(futures):
+            file_hash = futures[future]
+            try:
+                tracks[file_hash] = future.result()
+            except Exception as e:
+                print(f"Could not analyze {pending[file_hash]}: {e}")
+            done += 1
+            if done % WAVEFORM_SAVE_EVERY == 0:
+                save_waveform_store(tracks)
+                print(f"Waveforms: {done}/{len(pending)}")
+
+    save_waveform_store(tracks)
+    print(f"Waveforms: {len(tracks)} stored in {WAVEFORM_FILE}")
+
+def reload_waveform_store(mtime):
+    """(store, mtime) when the store file is no longer the one from mtime, else None"""
+    try:
+        current = os.path.getmtime(WAVEFORM_FILE)
+    except OSError:
+        return None
+    if current == mtime:
+        return None
+    return load_waveform_store(), current
+
+async def current_waveform_store():
+    """
+    The waveform store, reloaded when the batch job has rewritten it.
+
+    The file is checked at most once every WAVEFORM_STORE_CHECK_SECONDS, and the
+    stat and unpickling run in a worker thread.
+    """
+    global waveform_store, waveform_store_mtime, waveform_store_checked
+    now = time.monotonic()
+    if waveform_store_checked is not None and now - waveform_store_checked < WAVEFORM_STORE_CHECK_SECONDS:
+        return waveform_store
+    waveform_store_checked = now
+    reloaded = await anyio.to_thread.run_sync(reload_waveform_store, waveform_store_mtime)
+    if reloaded:
+        waveform_store, waveform_store_mtime = reloaded
+    return waveform_store
+
+@app.get("/api/waveform/{track_id}")
+async def get_waveform(track_id: str, request: Request):
+    """Precomputed peaks and loudness for a track"""
+    track = tracks_by_id.get(track_id)
+    if not track:
+        raise HTTPException(status_code=404, detail="Track not found")
+
+    file_hash = track.get('file_hash', '')
+    waveform = (await current_waveform_store()).get(file_hash) if file_hash else None
+    if not waveform:
+        raise HTTPException(status_code=404, detail="Waveform not generated for this track")
+
+    headers = {
+        "ETag": f'"{file_hash}-{WAVEFORM_VERSION}-{WAVEFORM_POINTS}"',
+        "Cache-Control": "public, max-age=86400"
+    }
+    if etag_matches(request.headers.get('if-none-match'), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    return JSONResponse(content={
+        "track_id": track_id,
+        "file_hash": file_hash,
+        "duration": waveform["duration"],
+        "loudness_lufs": waveform["loudness_lufs"],
+        "peak_dbfs": waveform["peak_dbfs"],
+        "peaks": list(waveform["peaks"])
+    }, headers=headers)
+
+# Transcoding: quality= on the audio endpoints serves a lower-bitrate
+# rendition instead of the FLAC/WAV master. Renditions are produced by a
+# bounded pool of ffmpeg subprocesses and cached by file_hash + profile.
+# While a rendition is still being written, requests stream the growing
+# file, so playback starts right away and all listeners share one ffmpeg.
+TRANSCODE_DIR = os.path.join(CACHE_DIR, "renditions")
+TRANSCODE_PROFILES = {
+    "opus96": {"args": ["-c:a", "libopus", "-b:a", "96k"], "format": "ogg", "ext": ".opus", "content_type": "audio/ogg"},
+    # Fixed rate and layout so album tracks can be joined into one HLS stream
+    "aac160": {"args": ["-c:a", "aac", "-b:a", "160k", "-ar", "44100", "-ac", "2"], "format": "adts", "ext": ".aac", "content_type": "audio/aac"}
+}
+TRANSCODE_WORKERS = 2
+TRANSCODE_CHUNK_SIZE = 64 * 1024
+TRANSCODE_POLL_SECONDS = 0.1
+transcode_jobs = {}  # rendition file -> {"written", "done", "error", "finished"} while ffmpeg runs
+transcode_slots = asyncio.Semaphore(TRANSCODE_WORKERS)
+
+def transcode_profile(quality):
+    """The profile for a quality= value, None for the original file"""
+    if not quality or quality == "original":
+        return None
+    if quality not in TRANSCODE_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown quality '{quality}'; use original, {', '.join(TRANSCODE_PROFILES)}"
+        )
+    return TRANSCODE_PROFILES[quality]
+
+def rendition_path(path, file_hash, quality):
+    """
+    Cache location of a rendition, keyed by file_hash (or path, size and mtime) and profile.
+
+    path is the source file, never its media cache copy, so the key does
+    not change once the source has been cached.
+    """
+    key = file_hash
+    if not key:
+        stat = os.stat(path)
+        key = hashlib.md5(f"{path}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8')).hexdigest()
+    return os.path.join(TRANSCODE_DIR, key[:2], f"{key}-{quality}{TRANSCODE_PROFILES[quality]['ext']}")
+
+async def run_transcode(source, target, profile, job):
+    """Transcode source into target.part with ffmpeg, then move it into place"""
+    partial = target + '.part'
+    try:
+        async with transcode_slots:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            process = await asyncio.create_subprocess_exec(
+                FFMPEG_BINARY, "-v", "error", "-i", source, "-vn", *profile["args"], "-f", profile["format"], "pipe:1",
+                stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+            with open(partial, 'wb') as out:
+                while True:
+                    chunk = await process.stdout.read(TRANSCODE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    out.flush()
+                    job["written"] += len(chunk)
+            stderr = await process.stderr.read()
+            await process.wait()
+
+        if process.returncode != 0:
+            raise RuntimeError(stderr.decode('utf-8', errors='replace').strip() or f"ffmpeg exited with {process.returncode}")
+        for attempt in range(10):
+            try:
+                os.replace(partial, target)
+                break
+            except PermissionError:
+                # Windows: a listener has the file open for a moment
+                await asyncio.sleep(0.05)
+        else:
+            os.replace(partial, target)
+        print(f"Transcoded {source} -> {target}")
+    except Exception as e:
+        job["error"] = str(e)
+        print(f"Error transcoding {source}: {e}")
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+    finally:
+        job["done"] = True
+        job["finished"].set()
+        transcode_jobs.pop(target, None)
+
+def read_rendition_chunk(target, offset, size):
+    """Read from a rendition that may be moved from .part to its final name at any time"""
+    for path in (target + '.part', target):
+        try:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                return f.read(size)
+        except FileNotFoundError:
+            continue
+    return b''
+
+async def stream_rendition(target, job):
+    """Yield a rendition as ffmpeg writes it, until the transcode finishes"""
+    offset = 0
+    while not job["error"]:
+        done = job["done"]
+        if offset < job["written"]:
+            chunk = await anyio.to_thread.run_sync(read_rendition_chunk, target, offset, TRANSCODE_CHUNK_SIZE)
+            if chunk:
+                offset += len(chunk)
+                yield chunk
+                continue
+        if done:
+            break
+        await asyncio.sleep(TRANSCODE_POLL_SECONDS)
+
+def start_transcode(path, file_hash, target, profile):
+    """The running transcode job for target, starting one (from the cached copy when there is one) if needed"""
+    job = transcode_jobs.get(target)
+    if not job:
+        job = {"written": 0, "done": False, "error": None, "finished": asyncio.Event()}
+        transcode_jobs[target] = job
+        spawn_background_task(run_transcode(cached_media_file(path, file_hash), target, profile, job))
+    return job
+
+async def ensure_rendition(path, file_hash, quality):
+    """Path of a finished rendition, transcoding it first if needed"""
+    target = rendition_path(path, file_hash, quality)
+    if os.path.exists(target):
+        return target
+    if not FFMPEG_BINARY:
+        raise HTTPException(status_code=503, detail="Transcoding needs ffmpeg on the server")
+    job = start_transcode(path, file_hash, target, TRANSCODE_PROFILES[quality])
+    await job["finished"].wait()
+    if job["error"]:
+        raise HTTPException(status_code=500, detail=f"Error transcoding track: {job['error']}")
+    return target
+
+def transcoded_response(request, path, file_hash, quality):
+    """Serve a cached rendition with Range support, or stream it while it is produced"""
+    profile = TRANSCODE_PROFILES[quality]
+    target = rendition_path(path, file_hash, quality)
+    headers = {"Access-Control-Allow-Origin": "*"}  # Allow cross-origin for Tailscale access
+
+    if os.path.exists(target):
+        return range_file_response(request, target, profile["content_type"], {**headers, "Cache-Control": "public, max-age=3600"})
+    if not FFMPEG_BINARY:
+        raise HTTPException(status_code=503, detail="Transcoding needs ffmpeg on the server")
+
+    job = start_transcode(path, file_hash, target, profile)
+    return StreamingResponse(stream_rendition(target, job), media_type=profile["content_type"],
+                             headers={**headers, "Cache-Control": "no-cache"})
+
+# HLS: track and album playlists over the cached AAC renditions. Segments
+# are cut lazily at ADTS frame boundaries (packed audio with an ID3
+# timestamp, no re-encode) and kept in a bounded in-memory cache. Album
+# playlists run the tracks on one continuous timeline, dropping each later
+# track's encoder priming frame, so they play back gaplessly.
+HLS_SEGMENT_SECONDS = 6
+HLS_DEFAULT_QUALITY = "aac160"
+HLS_SEGMENT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+HLS_FRAME_INDEX_MAX_ENTRIES = 64
+ADTS_SAMPLE_RATES = [96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350]
+AAC_FRAME_SAMPLES = 1024
+hls_segment_cache = OrderedDict()  # (rendition, index, base, trim) -> segment bytes
+hls_segment_cache_bytes = 0
+hls_frame_indexes = OrderedDict()  # rendition -> (sample rate, frame offsets)
+
+def index_adts_frames(path):
+    """Sample rate and byte offsets of every ADTS frame (plus the end offset)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    offsets = []
+    sample_rate = None
+    position = 0
+    while position + 7 <= len(data):
+        header = data[position:position + 7]
+        if header[0] != 0xFF or (header[1] & 0xF0) != 0xF0:
+            raise ValueError(f"lost ADTS sync at byte {position}")
+        if sample_rate is None:
+            sample_rate = ADTS_SAMPLE_RATES[(header[2] >> 2) & 0x0F]
+        frame_length = ((header[3] & 0x03) << 11) | (header[4] << 3) | (header[5] >> 5)
+        if frame_length < 7:
+            raise ValueError(f"bad ADTS frame length at byte {position}")
+        offsets.append(position)
+        position += frame_length
+    offsets.append(min(position, len(data)))
+    return sample_rate, offsets
+
+async def rendition_frames(rendition):
+    """Cached ADTS frame index of a rendition"""
+    index = hls_frame_indexes.get(rendition)
+    if not index:
+        index = await anyio.to_thread.run_sync(index_adts_frames, rendition)
+        hls_frame_indexes[rendition] = index
+        while len(hls_frame_indexes) > HLS_FRAME_INDEX_MAX_ENTRIES:
+            hls_frame_indexes.popitem(last=False)
+    hls_frame_indexes.move_to_end(rendition)
+    return index
+
+def hls_frames_per_segment(sample_rate):
+    return max(1, round(HLS_SEGMENT_SECONDS * sample_rate / AAC_FRAME_SAMPLES))
+
+def id3_syncsafe(n):
+    return bytes([(n >> 21) & 0x7F, (n >> 14) & 0x7F, (n >> 7) & 0x7F, n & 0x7F])
+
+def hls_timestamp_tag(pts):
+    """ID3 tag carrying the 90 kHz start timestamp HLS requires on packed audio segments"""
+    payload = b"com.apple.streaming.transportStreamTimestamp\x00" + struct.pack('>Q', pts % (1 << 33))
+    frame = b"PRIV" + id3_syncsafe(len(payload)) + b"\x00\x00" + payload
+    return b"ID3\x04\x00\x00" + id3_syncsafe(len(frame)) + frame
+
+def read_hls_segment(rendition, sample_rate, offsets, index, base, trim):
+    """Bytes of one segment: timestamp tag plus its run of ADTS frames"""
+    per_segment = hls_frames_per_segment(sample_rate)
+    first = trim + index * per_segment
+    last = min(first + per_segment, len(offsets) - 1)
+    with open(rendition, 'rb') as f:
+        f.seek(offsets[first])
+        frames = f.read(offsets[last] - offsets[first])
+    pts = (base + index * per_segment) * AAC_FRAME_SAMPLES * 90000 // sample_rate
+    return hls_timestamp_tag(pts) + frames
+
+async def hls_segment(rendition, index, base, trim):
+    """A segment from the segment cache, cutting it on a miss"""
+    global hls_segment_cache_bytes
+    key = (rendition, index, base, trim)
+    segment = hls_segment_cache.get(key)
+    if segment is None:
+        sample_rate, offsets = await rendition_frames(rendition)
+        if trim + index * hls_frames_per_segment(sample_rate) >= len(offsets) - 1:
+            raise HTTPException(status_code=404, detail="Segment not found")
+        segment = await anyio.to_thread.run_sync(read_hls_segment, rendition, sample_rate, offsets, index, base, trim)
+        hls_segment_cache[key] = segment
+        hls_segment_cache_bytes += len(segment)
+        while hls_segment_cache_bytes > HLS_SEGMENT_CACHE_MAX_BYTES and len(hls_segment_cache) > 1:
+            _, evicted = hls_segment_cache.popitem(last=False)
+            hls_segment_cache_bytes -= len(evicted)
+    hls_segment_cache.move_to_end(key)
+    return segment
+
+def hls_quality(quality):
+    """Validate quality= for HLS, which needs an ADTS AAC rendition"""
+    quality = quality or HLS_DEFAULT_QUALITY
+    profile = transcode_profile(quality)
+    if not profile or profile["format"] != "adts":
+        aac = [name for name, p in TRANSCODE_PROFILES.items() if p["format"] == "adts"]
+        raise HTTPException(status_code=400, detail=f"HLS needs an AAC quality: {', '.join(aac)}")
+    return quality
+
+def hls_track_source(track_id):
+    """(source file, file_hash) for a track, or 404"""
+    entry = stream_table.get(track_id)
+    if not entry or not entry["path"]:
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    return entry["path"], entry["file_hash"]
+
+def build_hls_playlist(parts, quality, complete):
+    """
+    Media playlist for (track ID, sample rate, frame count, base frame, trim) parts.
+
+    Incomplete playlists are EVENT playlists without an end tag; clients
+    reload them while later album tracks are still being transcoded.
+    """
+    lines = []
+    longest = 0
+    for track_id, sample_rate, frame_count, base, trim in parts:
+        per_segment = hls_frames_per_segment(sample_rate)
+        usable = frame_count - trim
+        for index in range((usable + per_segment - 1) // per_segment):
+            frames = min(per_segment, usable - index * per_segment)
+            duration = frames * AAC_FRAME_SAMPLES / sample_rate
+            longest = max(longest, duration)
+            lines.append(f"#EXTINF:{duration:.5f},")
+            lines.append(f"/api/hls/segment/{track_id}/{quality}/{index}.aac?base={base}&trim={trim}")
+
+    header = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{max(1, round(longest))}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        f"#EXT-X-PLAYLIST-TYPE:{'VOD' if complete else 'EVENT'}"
+    ]
+    footer = ["#EXT-X-ENDLIST"] if complete else []
+    return "\n".join(header + lines + footer) + "\n"
+
+def hls_playlist_response(playlist, complete):
+    return Response(
+        content=playlist,
+        media_type="application/vnd.apple.mpegurl",
+        headers={
+            "Cache-Control": "public, max-age=3600" if complete else "no-cache",
+            "Access-Control-Allow-Origin": "*"
+        }
+    )
+
+@app.get("/api/hls/track/{track_id}.m3u8")
+async def get_track_hls_playlist(track_id: str, quality: Optional[str] = None):
+    """HLS playlist for one track, transcoding its rendition first if needed"""
+    quality = hls_quality(quality)
+    source, file_hash = hls_track_source(track_id)
+    rendition = await ensure_rendition(source, file_hash, quality)
+    sample_rate, offsets = await rendition_frames(rendition)
+    playlist = build_hls_playlist([(track_id, sample_rate, len(offsets) - 1, 0, 0)], quality, True)
+    return hls_playlist_response(playlist, True)
+
+@app.get("/api/hls/album/{album_id}.m3u8")
+async def get_album_hls_playlist(album_id: str, quality: Optional[str] = None):
+    """
+    Gapless HLS playlist for a whole album.
+
+    Every track's rendition is queued at once; the playlist covers the
+    tracks that are ready, in order, and is completed as the rest finish.
+    """
+    quality = hls_quality(quality)
+    album = albums_by_id.get(album_id)
+    if not album:
+        raise HTTPException(status_code=404, detail="Album not found")
+
+    profile = TRANSCODE_PROFILES[quality]
+    sources = []
+    for track in album.get('tracks', []):
+        entry = stream_table.get(track.get('id'))
+        if not entry or not entry["path"]:
+            continue
+        rendition = rendition_path(entry["path"], entry["file_hash"], quality)
+        if not os.path.exists(rendition) and FFMPEG_BINARY:
+            start_transcode(entry["path"], entry["file_hash"], rendition, profile)
+        sources.append((track['id'], entry["path"], entry["file_hash"], rendition))
+    if not sources:
+        raise HTTPException(status_code=404, detail="No playable tracks in album")
+
+    # The first track is needed before anything can play
+    await ensure_rendition(sources[0][1], sources[0][2], quality)
+
+    parts = []
+    base = 0
+    complete = True
+    for position, (track_id, _, _, rendition) in enumerate(sources):
+        if not os.path.exists(rendition):
+            complete = False
+            break
+        sample_rate, offsets = await rendition_frames(rendition)
+        trim = 1 if position else 0  # later tracks drop their encoder priming frame
+        frame_count = len(offsets) - 1
+        parts.append((track_id, sample_rate, frame_count, base, trim))
+        base += frame_count - trim
+
+    return hls_playlist_response(build_hls_playlist(parts, quality, complete), complete)
+
+@app.get("/api/hls/segment/{track_id}/{quality}/{index}.aac")
+async def get_hls_segment(
+    track_id: str,
+    quality: str,
+    index: int = PathParam(ge=0),
+    base: int = Query(0, ge=0),
+    trim: int = Query(0, ge=0, le=1)
+):
+    """One HLS segment; the following segment is cut ahead of the player"""
+    quality = hls_quality(quality)
+    source, file_hash = hls_track_source(track_id)
+    rendition = rendition_path(source, file_hash, quality)
+    if not os.path.exists(rendition):
+        raise HTTPException(status_code=404, detail="Rendition not ready")
+
+    segment = await hls_segment(rendition, index, base, trim)
+
+    async def cut_next_segment():
+        try:
+            await hls_segment(rendition, index + 1, base, trim)
+        except HTTPException:
+            pass  # last segment
+    spawn_background_task(cut_next_segment())
+
+    return Response(
+        content=segment,
+        media_type="audio/aac",
+        headers={
+            "Cache-Control": "public, max-age=86400",
+            "Access-Control-Allow-Origin": "*"
+        }
+    )
+
+@app.get("/api/stream/{track_id}")
+async def stream_track(track_id: str, request: Request, use_tailscale: bool = None, quality: Optional[str] = None):
+    """
+    Stream a track by ID from the precomputed stream table
+
+    Parameters:
+    - track_id: Track ID from the catalog
+    - use_tailscale: Override global Tailscale setting (optional)
+    - quality: original (default), opus96 or aac160 (optional)
+    """
+    entry = stream_table.get(track_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Track not found")
+
+    # Renditions are made here, so they skip the Tailscale redirect when the file is reachable
+    profile = transcode_profile(quality)
+    use_tailscale_for_request = USE_TAILSCALE if use_tailscale is None else use_tailscale
+    if use_tailscale_for_request and entry["tailscale_url"] and not (profile and entry["path"]):
+        return RedirectResponse(url=entry["tailscale_url"])
+
+    if not entry["path"]:
+        # Not reachable locally; Tailscale is the only way to the file
+        if entry["tailscale_url"]:
+            return RedirectResponse(url=entry["tailscale_url"])
+        raise HTTPException(status_code=404, detail="Audio file not found")
+
+    prefetch_album_tracks(track_id)
+    if profile:
+        return transcoded_response(request, entry["path"], entry["file_hash"], quality)
+    return range_file_response(
+        request,
+        cached_media_file(entry["path"], entry["file_hash"]),
+        entry["content_type"],
+        headers={
+            "Cache-Control": "public, max-age=3600",
+            "Access-Control-Allow-Origin": "*"  # Allow cross-origin for Tailscale access
+        }
+    )
 
 @app.get("/api/audio/{file_path:path}")
-async def stream_audio(file_path: str, use_tailscale: bool = None):
+async def stream_audio(file_path: str, request: Request, use_tailscale: bool = None, quality: Optional[str] = None):
     """
     Stream audio files for the integrated player
     
     Parameters:
     - file_path: Path to the audio file
     - use_tailscale: Override global Tailscale setting (optional)
+    - quality: original (default), opus96 or aac160 (optional)
     """
     try:
         # Use global setting if not specified
         use_tailscale_for_request = USE_TAILSCALE if use_tailscale is None else use_tailscale
         
-        # Decode the file path - handle all URL encoding
-        import urllib.parse
-        decoded_path = urllib.parse.unquote(file_path)
-        print(f"Original path: {file_path}")
-        print(f"Decoded path: {decoded_path}")
-        
-        # Handle malformed paths that are missing backslashes
-        if decoded_path.startswith('envy2-0EchoVerse_MusicAlbums'):
-            # This is a malformed path missing backslashes
-            # Split at Albums and reconstruct properly
-            parts = decoded_path.split('Albums', 1)
-            if len(parts) == 2:
-                # Reconstruct with proper backslashes
-                fixed_path = '\\\\envy2-0\\EchoVerse_Music\\Albums\\' + parts[1].replace(' ', '\\')
-                print(f"Fixed malformed path: {fixed_path}")
-                decoded_path = fixed_path
-        
-        # Fix paths with missing backslashes
-        if decoded_path.startswith('\\envy2-0') and '\\Albums' not in decoded_path and 'Albums' in decoded_path:
-            # This is likely a path with missing backslashes
-            # Try to reconstruct the path by adding backslashes at key points
-            parts = decoded_path.split('Albums')
-            if len(parts) == 2:
-                fixed_path = parts[0].replace('\\envy2-0', '\\\\envy2-0\\') + 'Albums\\' + parts[1].replace(' ', '\\')
-                print(f"Fixed path with missing backslashes: {fixed_path}")
-                decoded_path = fixed_path
+        # Renditions are made here, so they skip the Tailscale redirect when the file is reachable
+        profile = transcode_profile(quality)
+        if profile and use_tailscale_for_request and resolve_media_path(file_path, "audio")[0]:
+            use_tailscale_for_request = False
         
         # If using Tailscale, redirect to the Tailscale URL
         if use_tailscale_for_request:
-            # Use our path converter to get the Tailscale URL
+            decoded_path = repair_media_path(file_path)
             tailscale_url = convert_to_tailscale_url(decoded_path)
             
             # If we got a valid Tailscale URL, redirect to it
@@ -1255,86 +4530,233 @@ async def stream_audio(file_path: str, use_tailscale: bool = None):
                 print(f"Could not convert to Tailscale URL, falling back to direct streaming: {decoded_path}")
         
         # If not using Tailscale or couldn't extract path, stream directly
-        
-        # Try to find the file using a more flexible approach
-        file_to_stream = None
-        
-        # First try the direct path
-        if os.path.exists(decoded_path):
-            file_to_stream = decoded_path
-        else:
-            # Check if the path is within allowed directories
-            is_allowed = any(decoded_path.startswith(allowed_dir) for allowed_dir in ALLOWED_DIRS)
-            
-            if not is_allowed:
-                # Try to find the file in allowed directories
-                file_name = os.path.basename(decoded_path)
-                for allowed_dir in ALLOWED_DIRS:
-                    if allowed_dir.endswith('/') or allowed_dir.endswith('\\'):
-                        test_path = os.path.join(allowed_dir, file_name)
-                    else:
-                        test_path = os.path.join(allowed_dir + '\\', file_name)
-                    
-                    if os.path.exists(test_path):
-                        print(f"Found file in allowed directory: {test_path}")
-                        file_to_stream = test_path
-                        break
-                
-                if not file_to_stream:
-                    # Try to find the file by searching for the last part of the path
-                    path_parts = decoded_path.replace('\\', '/').split('/')
-                    if len(path_parts) >= 2:
-                        # Try the last two parts of the path
-                        search_path = os.path.join(path_parts[-2], path_parts[-1])
-                        for allowed_dir in ALLOWED_DIRS:
-                            if allowed_dir.endswith('/') or allowed_dir.endswith('\\'):
-                                test_path = os.path.join(allowed_dir, search_path)
-                            else:
-                                test_path = os.path.join(allowed_dir + '\\', search_path)
-                            
-                            if os.path.exists(test_path):
-                                print(f"Found file using path parts: {test_path}")
-                                file_to_stream = test_path
-                                break
-            else:
-                # Path is allowed, but file might not exist
-                if not os.path.exists(decoded_path):
-                    print(f"File not found: {decoded_path}")
-                    raise HTTPException(status_code=404, detail="Audio file not found")
-                file_to_stream = decoded_path
-        
+        file_to_stream, content_type = resolve_media_path(file_path, "audio")
         if not file_to_stream:
-            print(f"Could not find file: {decoded_path}")
+            print(f"Could not find file: {file_path}")
             print(f"Allowed directories: {ALLOWED_DIRS}")
             raise HTTPException(status_code=404, detail="Audio file not found")
         
-        # Determine content type based on file extension
-        content_type = "audio/mpeg"  # default for .mp3
-        if file_to_stream.lower().endswith('.wav'):
-            content_type = "audio/wav"
-        elif file_to_stream.lower().endswith('.flac'):
-            content_type = "audio/flac"
-        elif file_to_stream.lower().endswith('.ogg'):
-            content_type = "audio/ogg"
-        elif file_to_stream.lower().endswith('.m4a'):
-            content_type = "audio/mp4"
-        
-        print(f"Streaming audio file via direct path: {file_to_stream}")
+        track_id = stream_paths.get(file_to_stream)
+        file_hash = stream_table[track_id]["file_hash"] if track_id else None
+        if track_id:
+            prefetch_album_tracks(track_id)
+        if profile:
+            return transcoded_response(request, file_to_stream, file_hash, quality)
+        file_to_stream = cached_media_file(file_to_stream, file_hash)
         
-        # Return the audio file with proper headers for streaming
-        return FileResponse(
-            file_to_stream, 
-            media_type=content_type,
+        # Return the audio file, or the requested byte range of it
+        return range_file_response(
+            request,
+            file_to_stream,
+            content_type,
             headers={
-                "Accept-Ranges": "bytes",
                 "Cache-Control": "public, max-age=3600",
                 "Access-Control-Allow-Origin": "*"  # Allow cross-origin for Tailscale access
             }
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error streaming audio file {file_path}: {e}")
         raise HTTPException(status_code=500, detail="Error streaming audio file")
 
+# Inventory scanner: `python main.py scan <music root>` walks a library with
+# a thread pool and writes an inventory CSV in the column layout of the
+# external Windows scan, which the catalog loader picks up like any other.
+# Files whose size and mtime match the previous inventory keep their hash
+# and tags, so only new and changed files are read.
+SCAN_CSV_COLUMNS = [
+    'file_name', 'full_path', 'URL', 'extension', 'parent_folder', 'root_folder', 'size_bytes',
+    'size_mb', 'mime_type', 'created', 'last_modified', 'last_accessed', 'host', 'username', 'os',
+    'os_version', 'scan_timestamp', 'file_hash', 'is_duplicate', 'duplicate_of', 'artist', 'album',
+    'title', 'track_number', 'year', 'genre', 'length_seconds', 'bitrate', 'sample_rate', 'channels',
+    'responsible_party', 'subrole', 'notes', 'error'
+]
+SCAN_TAG_COLUMNS = ['artist', 'album', 'title', 'track_number', 'year', 'genre',
+                    'length_seconds', 'bitrate', 'sample_rate', 'channels']
+SCAN_HASH_CHUNK_SIZE = 4 * 1024 * 1024
+SCAN_DEFAULT_WORKERS = 16  # hashing releases the GIL and network shares reward parallel reads
+SCAN_PROGRESS_EVERY = 1000
+FFPROBE_BINARY = shutil.which("ffprobe")
+
+def scan_mime_type(file_name):
+    """Content type of a scanned file, preferring the types the server streams with"""
+    extension = os.path.splitext(file_name)[1].lower()
+    return (AUDIO_CONTENT_TYPES.get(extension) or IMAGE_CONTENT_TYPES.get(extension)
+            or mimetypes.guess_type(file_name)[0] or '')
+
+def read_audio_tags(path):
+    """Tags and stream properties of an audio file, as inventory column values"""
+    tags = {}
+    if mutagen is not None:
+        audio = mutagen.File(path, easy=True)
+        if audio is not None:
+            for column, key in (('artist', 'artist'), ('album', 'album'), ('title', 'title'),
+                                ('track_number', 'tracknumber'), ('year', 'date'), ('genre', 'genre')):
+                values = audio.get(key)
+                if values:
+                    tags[column] = str(values[0])
+            info = audio.info
+            tags['length_seconds'] = int(round(getattr(info, 'length', 0) or 0))
+            tags['bitrate'] = getattr(info, 'bitrate', '') or ''
+            tags['sample_rate'] = getattr(info, 'sample_rate', '') or ''
+            tags['channels'] = getattr(info, 'channels', '') or ''
+            return tags
+
+    if FFPROBE_BINARY:
+        result = subprocess.run(
+            [FFPROBE_BINARY, "-v", "error", "-select_streams", "a:0", "-show_entries",
+             "format=duration,bit_rate:format_tags:stream=sample_rate,channels", "-of", "json", path],
+            capture_output=True, check=True
+        )
+        probe = json.loads(result.stdout)
+        probe_format = probe.get('format', {})
+        format_tags = {key.lower(): value for key, value in probe_format.get('tags', {}).items()}
+        for column, key in (('artist', 'artist'), ('album', 'album'), ('title', 'title'),
+                            ('track_number', 'track'), ('year', 'date'), ('genre', 'genre')):
+            if format_tags.get(key):
+                tags[column] = format_tags[key]
+        stream = (probe.get('streams') or [{}])[0]
+        tags['length_seconds'] = int(round(float(probe_format.get('duration') or 0)))
+        tags['bitrate'] = probe_format.get('bit_rate', '')
+        tags['sample_rate'] = stream.get('sample_rate', '')
+        tags['channels'] = stream.get('channels', '')
+        return tags
+
+    if path.lower().endswith('.wav'):
+        with wave.open(path, 'rb') as w:
+            tags['length_seconds'] = int(round(w.getnframes() / w.getframerate()))
+            tags['bitrate'] = w.getframerate() * w.getsampwidth() * 8 * w.getnchannels()
+            tags['sample_rate'] = w.getframerate()
+            tags['channels'] = w.getnchannels()
+    return tags
+
+def load_previous_inventory(csv_path):
+    """Rows of an earlier inventory keyed by full_path, read row by row"""
+    rows = {}
+    if csv_path and os.path.exists(csv_path):
+        with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                if row.get('full_path'):
+                    rows[row['full_path']] = row
+    return rows
+
+def scan_inventory_file(path, root, previous_rows, context):
+    """
+    Inventory row for one file: reused from the previous inventory when
+    size and mtime are unchanged, otherwise hashed and tag-read
+    """
+    row = dict.fromkeys(SCAN_CSV_COLUMNS, '')
+    row.update(context)
+    file_name = os.path.basename(path)
+    row.update({
+        'file_name': file_name,
+        'full_path': path,
+        'extension': os.path.splitext(file_name)[1].lower(),
+        'parent_folder': os.path.basename(os.path.dirname(path)),
+        'root_folder': os.path.basename(os.path.normpath(root)),
+        'mime_type': scan_mime_type(file_name)
+    })
+    try:
+        stat = os.stat(path)
+        row.update({
+            'size_bytes': stat.st_size,
+            'size_mb': round(stat.st_size / (1024 * 1024), 2),
+            'created': datetime.fromtimestamp(stat.st_ctime).isoformat(),
+            'last_modified': datetime.fromtimestamp(stat.st_mtime).isoformat(timespec='seconds'),
+            'last_accessed': datetime.fromtimestamp(stat.st_atime).isoformat(timespec='seconds')
+        })
+
+        previous = previous_rows.get(path)
+        if (previous and previous.get('file_hash') and not previous.get('error')
+                and str(previous.get('size_bytes')) == str(stat.st_size)
+                and previous.get('last_modified') == row['last_modified']):
+            for column in ['file_hash', 'URL', 'responsible_party', 'subrole', 'notes'] + SCAN_TAG_COLUMNS:
+                row[column] = previous.get(column, '')
+            return row, True
+
+        row['file_hash'] = file_sha256(path, SCAN_HASH_CHUNK_SIZE)
+        if row['mime_type'].startswith('audio/'):
+            row.update(read_audio_tags(path))
+    except Exception as e:
+        row['error'] = str(e)
+    return row, False
+
+def scan_music_library(root, output_dir="music_catalog", previous_csv=None, workers=SCAN_DEFAULT_WORKERS):
+    """Walk a music root and write a new inventory CSV; returns its path"""
+    started = time.time()
+    root = os.path.abspath(root)
+    if previous_csv is None:
+        previous_csv, _ = find_latest_catalog_csv()
+    previous_rows = load_previous_inventory(previous_csv)
+    print(f"Scanning {root} with {workers} workers"
+          f" ({len(previous_rows)} files in previous inventory {previous_csv or '-'})")
+
+    paths = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        paths.extend(os.path.join(directory, file_name) for file_name in sorted(files))
+
+    context = {
+        'host': socket.gethostname(),
+        'username': getpass.getuser(),
+        'os': platform.system(),
+        'os_version': platform.version(),
+        'scan_timestamp': datetime.now().isoformat()
+    }
+    rows = []
+    reused = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(lambda path: scan_inventory_file(path, root, previous_rows, context), paths)
+        for row, unchanged in results:
+            rows.append(row)
+            reused += unchanged
+            if len(rows) % SCAN_PROGRESS_EVERY == 0:
+                print(f"Scanned {len(rows)}/{len(paths)} files ({reused} unchanged)")
+
+    # The first file seen with some content is the original, later ones are duplicates
+    originals = {}
+    for row in rows:
+        file_hash = row['file_hash']
+        original = originals.setdefault(file_hash, row['full_path']) if file_hash else row['full_path']
+        row['is_duplicate'] = "TRUE" if original != row['full_path'] else "FALSE"
+        row['duplicate_of'] = original if original != row['full_path'] else ''
+
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, f"music_catalog__{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    # Written under a name the catalog watcher ignores, then renamed into place
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SCAN_CSV_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, output_path)
+
+    errors = sum(1 for row in rows if row['error'])
+    print(f"Wrote {len(rows)} files to {output_path} in {time.time() - started:.1f}s "
+          f"({reused} unchanged, {len(rows) - reused} read, {errors} errors)")
+    return output_path
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    parser = argparse.ArgumentParser(description="EchoVerse Music Catalog")
+    subcommands = parser.add_subparsers(dest="command")
+    subcommands.add_parser("serve", help="run the catalog server (default)")
+    waveforms_parser = subcommands.add_parser("waveforms", help="precompute waveform peaks and loudness")
+    waveforms_parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    waveforms_parser.add_argument("--force", action="store_true", help="re-analyze tracks already stored")
+    scan_parser = subcommands.add_parser("scan", help="inventory a music folder into a catalog CSV")
+    scan_parser.add_argument("root", help="music folder to scan")
+    scan_parser.add_argument("--output", default="music_catalog", help="folder for the new CSV (default: music_catalog)")
+    scan_parser.add_argument("--previous", default=None,
+                             help="inventory whose unchanged files are reused (default: newest catalog CSV)")
+    scan_parser.add_argument("--full", action="store_true", help="hash and read every file again")
+    scan_parser.add_argument("--workers", type=int, default=SCAN_DEFAULT_WORKERS, help="worker threads")
+    args = parser.parse_args()
+
+    if args.command == "waveforms":
+        generate_waveforms(args.workers, args.force)
+    elif args.command == "scan":
+        scan_music_library(args.root, args.output, "" if args.full else args.previous, args.workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -7,7 +7,133 @@ class MetadataManager {
     constructor() {
         this.metadata = {};
         this.storageKey = 'echoverse_metadata';
+        this.serverUrl = '/api/metadata';
+        this.pendingUpdates = [];
+        this.flushTimer = null;
+        this.pendingPlays = [];
+        this.playFlushTimer = null;
         this.loadMetadata();
+        if (typeof fetch !== 'undefined') {
+            this.syncFromServer();
+        }
+        if (typeof window !== 'undefined') {
+            // Plays still queued when the page goes away are sent as a beacon
+            window.addEventListener('pagehide', () => this.flushServerPlays(true));
+        }
+    }
+
+    /**
+     * Pull songs changed on the server since the last sync
+     */
+    async syncFromServer() {
+        try {
+            let since = this.metadata.server_revision || 0;
+            let hasMore = true;
+            while (hasMore) {
+                const response = await fetch(`${this.serverUrl}?since=${since}`);
+                if (!response.ok) {
+                    return false;
+                }
+                const data = await response.json();
+                data.songs.forEach(song => {
+                    this.metadata.songs[song.unique_id] = song;
+                });
+                since = data.revision;
+                hasMore = data.has_more;
+            }
+            this.metadata.server_revision = since;
+            this.updateTagCounts();
+            this.updateStatistics();
+            this.saveMetadata();
+            return true;
+        } catch (error) {
+            console.error('Error syncing metadata:', error);
+            return false;
+        }
+    }
+
+    /**
+     * Queue a partial update for the server; updates are sent in batches
+     */
+    queueServerUpdate(songId, changes) {
+        if (typeof fetch === 'undefined') {
+            return;
+        }
+        this.pendingUpdates.push({ file_hash: songId, ...changes });
+        if (!this.flushTimer) {
+            this.flushTimer = setTimeout(() => this.flushServerUpdates(), 1000);
+        }
+    }
+
+    /**
+     * Queue a play for the server, which adds it to the shared play
+     * statistics and the song's play_count; plays are sent in batches
+     */
+    recordServerPlay(songId) {
+        if (typeof fetch === 'undefined') {
+            return;
+        }
+        this.pendingPlays.push({ file_hash: songId, played_at: new Date().toISOString() });
+        if (!this.playFlushTimer) {
+            this.playFlushTimer = setTimeout(() => this.flushServerPlays(), 15000);
+        }
+    }
+
+    /**
+     * Send queued plays to /api/plays in one request
+     */
+    flushServerPlays(useBeacon = false) {
+        clearTimeout(this.playFlushTimer);
+        this.playFlushTimer = null;
+        if (this.pendingPlays.length === 0) {
+            return;
+        }
+        const events = this.pendingPlays.splice(0);
+        const body = JSON.stringify({ events });
+        if (useBeacon && navigator.sendBeacon) {
+            navigator.sendBeacon('/api/plays', new Blob([body], { type: 'application/json' }));
+            return;
+        }
+        fetch('/api/plays', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: body
+        }).catch(error => {
+            // Keep the plays for the next flush
+            console.error('Error sending plays:', error);
+            this.pendingPlays.unshift(...events);
+        });
+    }
+
+    /**
+     * Send queued updates to the server store in one request
+     */
+    async flushServerUpdates() {
+        this.flushTimer = null;
+        const updates = this.pendingUpdates.splice(0);
+        if (updates.length === 0) {
+            return;
+        }
+        try {
+            const response = await fetch(`${this.serverUrl}/batch`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ updates })
+            });
+            if (!response.ok) {
+                console.warn('Metadata update rejected by server:', response.status);
+                return;
+            }
+            const data = await response.json();
+            data.songs.forEach(song => {
+                this.metadata.songs[song.unique_id] = song;
+            });
+            this.saveMetadata();
+        } catch (error) {
+            // Keep the updates for the next flush
+            console.error('Error sending metadata updates:', error);
+            this.pendingUpdates.unshift(...updates);
+        }
     }
 
     /**
@@ -129,6 +255,7 @@ class MetadataManager {
         if (this.metadata.songs[songId]) {
             this.metadata.songs[songId].rating = Math.max(0, Math.min(5, rating));
             this.metadata.songs[songId].modified_date = new Date().toISOString();
+            this.queueServerUpdate(songId, { rating: this.metadata.songs[songId].rating });
             this.updateStatistics();
             this.saveMetadata();
         }
@@ -141,6 +268,7 @@ class MetadataManager {
         if (this.metadata.songs[songId]) {
             this.metadata.songs[songId].notes = notes;
             this.metadata.songs[songId].modified_date = new Date().toISOString();
+            this.queueServerUpdate(songId, { notes });
             this.saveMetadata();
         }
     }
@@ -152,6 +280,7 @@ class MetadataManager {
         if (this.metadata.songs[songId]) {
             this.metadata.songs[songId].tags = Array.isArray(tags) ? tags : [];
             this.metadata.songs[songId].modified_date = new Date().toISOString();
+            this.queueServerUpdate(songId, { tags: this.metadata.songs[songId].tags });
             this.updateTagCounts();
             this.saveMetadata();
         }
@@ -164,6 +293,7 @@ class MetadataManager {
         if (this.metadata.songs[songId]) {
             this.metadata.songs[songId].favorite = !this.metadata.songs[songId].favorite;
             this.metadata.songs[songId].modified_date = new Date().toISOString();
+            this.queueServerUpdate(songId, { favorite: this.metadata.songs[songId].favorite });
             this.updateStatistics();
             this.saveMetadata();
         }
@@ -176,6 +306,7 @@ class MetadataManager {
         if (this.metadata.songs[songId]) {
             this.metadata.songs[songId].play_count = (this.metadata.songs[songId].play_count || 0) + 1;
             this.metadata.songs[songId].last_played = new Date().toISOString();
+            this.recordServerPlay(songId);
             this.updateStatistics();
             this.saveMetadata();
         }
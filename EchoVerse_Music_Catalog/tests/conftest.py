@@ -0,0 +1,117 @@
+"""
+Shared fixtures for the EchoVerse Music Catalog tests
+
+Every store, cache and inventory location main.py writes to is pointed at
+a temporary directory, and a small inventory with real audio files on
+disk is loaded the way the lifespan handler would load it.
+
+Run from EchoVerse_Music_Catalog/:
+    python -m pytest -q tests
+"""
+
+import csv
+import hashlib
+import os
+import sys
+import wave
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main  # noqa: E402
+
+INVENTORY_COLUMNS = [
+    'file_name', 'full_path', 'size_bytes', 'mime_type', 'file_hash', 'is_duplicate', 'duplicate_of',
+    'artist', 'album', 'title', 'track_number', 'year', 'genre', 'length_seconds', 'bitrate', 'sample_rate'
+]
+
+def write_wav(path, frames=4000, value=0):
+    """Small mono 16-bit WAV file; returns its SHA-256"""
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(int(value).to_bytes(2, 'little', signed=True) * frames)
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def write_inventory(path, rows):
+    """Write inventory rows (dicts) under the scanner's column names"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=INVENTORY_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({column: row.get(column, '') for column in INVENTORY_COLUMNS})
+
+def inventory_row(audio_path, file_hash, title, album="Test Album", **fields):
+    """Inventory row for one audio file"""
+    row = {
+        'file_name': os.path.basename(audio_path),
+        'full_path': str(audio_path),
+        'size_bytes': os.path.getsize(audio_path),
+        'mime_type': 'audio/wav',
+        'file_hash': file_hash,
+        'is_duplicate': 'FALSE',
+        'artist': 'Test Artist',
+        'album': album,
+        'title': title,
+        'length_seconds': '0.5'
+    }
+    row.update(fields)
+    return row
+
+@pytest.fixture
+def catalog_dir(tmp_path, monkeypatch):
+    """Temporary home for every file main.py reads or writes"""
+    cache_dir = tmp_path / "cache"
+    inventory_dir = tmp_path / "inventory"
+    inventory_dir.mkdir()
+    paths = {
+        "CACHE_DIR": cache_dir,
+        "COVER_ART_INDEX_FILE": cache_dir / "cover_art_index.json",
+        "CATALOG_SNAPSHOT_FILE": cache_dir / "catalog_snapshot.pkl",
+        "IMAGE_INDEX_FILE": cache_dir / "image_index.json",
+        "THUMBNAIL_DIR": cache_dir / "thumbnails",
+        "WAVEFORM_FILE": cache_dir / "waveforms.pkl",
+        "TRANSCODE_DIR": cache_dir / "renditions",
+        "MEDIA_CACHE_DIR": cache_dir / "media",
+        "SONG_METADATA_FILE": tmp_path / "song_metadata.json",
+        "SONG_METADATA_LOG_FILE": tmp_path / "song_metadata.jsonl",
+        "WORK_ORDERS_FILE": tmp_path / "work_orders.jsonl",
+        "WORK_ORDERS_LEGACY_FILE": tmp_path / "work_orders.json",
+        "PLAY_EVENTS_FILE": tmp_path / "play_events.jsonl",
+    }
+    for name, path in paths.items():
+        monkeypatch.setattr(main, name, str(path))
+    monkeypatch.setattr(main, "CATALOG_CSV_PATHS", [str(inventory_dir)])
+    monkeypatch.setattr(main, "ALLOWED_DIRS", [str(tmp_path)])
+    main.response_cache.clear()
+    return tmp_path
+
+@pytest.fixture
+def inventory(catalog_dir):
+    """Three tracks on disk listed in an inventory CSV; returns the rows"""
+    audio_dir = catalog_dir / "audio"
+    audio_dir.mkdir()
+    rows = []
+    for number, title in enumerate(["First Light", "Second Wind", "Third Rail"], 1):
+        audio_path = audio_dir / f"{number:02d} {title}.wav"
+        file_hash = write_wav(audio_path, frames=4000 * number, value=number)
+        rows.append(inventory_row(audio_path, file_hash, title, track_number=number))
+    write_inventory(catalog_dir / "inventory" / "music_catalog__20250101_000000.csv", rows)
+    return rows
+
+@pytest.fixture
+def loaded(inventory):
+    """Stores and catalog loaded as the lifespan handler does, without its watchers"""
+    main.load_song_metadata_store()
+    main.load_music_catalog()
+    main.load_work_orders()
+    main.load_play_events()
+    return inventory
+
+@pytest.fixture
+def client(loaded):
+    """Test client for the loaded app; the lifespan handler is not run"""
+    return TestClient(main.app)
@@ -0,0 +1,138 @@
+"""Inventory parsing, catalog reloads and the catalog snapshot"""
+
+import asyncio
+import os
+import pickle
+
+import pytest
+
+import main
+from conftest import inventory_row, write_inventory, write_wav
+
+def test_reads_first_of_duplicate_columns_and_types_numbers(tmp_path):
+    csv_path = tmp_path / "music_catalog__dup.csv"
+    csv_path.write_text(
+        "﻿file_name,api_audio_pathparam,mime_type,size_bytes,year,api_audio_pathparam\n"
+        "a.mp3,first,audio/mpeg,2789649,2024,second\n"
+        "cover.jpg,x,image/jpeg,10,,y\n"
+        "b.mp3,,audio/mpeg,,n/a,\n",
+        encoding='utf-8'
+    )
+
+    records = list(main.read_catalog_records(str(csv_path)))
+
+    assert records == [
+        {'file_name': 'a.mp3', 'api_audio_pathparam': 'first', 'mime_type': 'audio/mpeg',
+         'size_bytes': 2789649, 'year': 2024.0},
+        {'file_name': 'b.mp3', 'api_audio_pathparam': '', 'mime_type': 'audio/mpeg',
+         'size_bytes': '', 'year': 'n/a'}
+    ]
+
+def write_newer_inventory(catalog_dir, rows, name="music_catalog__20250102_000000.csv"):
+    """Write rows as a second inventory with a later mtime than the first"""
+    path = catalog_dir / "inventory" / name
+    write_inventory(path, rows)
+    newest = max(os.path.getmtime(p) for p in (catalog_dir / "inventory").iterdir())
+    os.utime(path, (newest + 10, newest + 10))
+    return path
+
+@pytest.fixture
+def quiet_reload(monkeypatch):
+    """Skip the image index rescan a reload schedules"""
+    monkeypatch.setattr(main, "refresh_image_index", lambda: asyncio.sleep(0))
+
+def test_reload_diffs_rows_and_reuses_unchanged_tracks(client, loaded, catalog_dir, quiet_reload):
+    kept = main.tracks_by_hash[loaded[0]['file_hash']]
+    assert client.post("/api/catalog/reload").json()["reloaded"] is False
+
+    audio_path = catalog_dir / "audio" / "04 Fourth Wall.wav"
+    added = inventory_row(audio_path, write_wav(audio_path, value=4), "Fourth Wall")
+    changed = dict(loaded[1], title="Second Wind (Remaster)")
+    write_newer_inventory(catalog_dir, [loaded[0], changed, added])
+
+    response = client.post("/api/catalog/reload").json()
+
+    assert response["reloaded"] is True
+    assert response["changes"] == {"added": 1, "changed": 1, "unchanged": 1, "removed": 1, "duplicates": 0}
+    assert response["total_tracks"] == 3
+    assert main.tracks_by_hash[loaded[0]['file_hash']] is kept
+    assert main.tracks_by_hash[loaded[1]['file_hash']]['track'] == "Second Wind (Remaster)"
+    assert loaded[2]['file_hash'] not in main.tracks_by_hash
+    assert client.get(f"/api/track/{main.content_track_id(added['file_hash'])}").status_code == 200
+
+    forced = client.post("/api/catalog/reload", params={"force": True}).json()
+    assert forced["changes"]["added"] == 3 and forced["changes"]["unchanged"] == 0
+
+def test_reload_collapses_duplicate_rows(client, loaded, catalog_dir, quiet_reload):
+    copy = dict(loaded[0], full_path=loaded[0]['full_path'] + ".copy", is_duplicate='TRUE',
+                duplicate_of=loaded[0]['full_path'])
+    # The flagged copy is listed first; the unflagged row still wins
+    write_newer_inventory(catalog_dir, [copy] + loaded)
+
+    response = client.post("/api/catalog/reload").json()
+
+    assert response["changes"]["duplicates"] == 1
+    assert main.tracks_by_hash[loaded[0]['file_hash']]['file_path'] == loaded[0]['full_path']
+    duplicates = client.get("/api/duplicates")
+    assert duplicates.headers["x-duplicate-files"] == "1"
+    assert duplicates.json()[0]["copies"][0]["file_path"] == copy['full_path']
+
+def reset_catalog():
+    main.apply_catalog_state(main.build_catalog_state([]))
+
+def test_snapshot_round_trip(loaded, catalog_dir, monkeypatch):
+    with open(main.CATALOG_SNAPSHOT_FILE, 'rb') as f:
+        snapshot = pickle.load(f)
+    assert snapshot["version"] == main.CATALOG_SNAPSHOT_VERSION
+    assert sorted(snapshot) == sorted(["version"] + main.CATALOG_SNAPSHOT_KEYS)
+    tracks, fingerprints, totals = main.catalog_data, main.catalog_row_fingerprints, main.catalog_totals
+
+    reset_catalog()
+    read_catalog_records = main.read_catalog_records
+    def fail(*args, **kwargs):
+        raise AssertionError("inventory was parsed instead of loading the snapshot")
+    monkeypatch.setattr(main, "read_catalog_records", fail)
+    main.load_music_catalog()
+
+    assert main.catalog_data == tracks
+    assert main.catalog_row_fingerprints == fingerprints
+    assert main.catalog_totals == totals
+    assert set(main.tracks_by_hash) == {row['file_hash'] for row in loaded}
+    assert main.search_index_query(main.search_index, "wind")
+
+    # A touched but unchanged inventory still hits, by content hash
+    csv_path = main.catalog_source["path"]
+    os.utime(csv_path, (os.path.getmtime(csv_path) + 5, os.path.getmtime(csv_path) + 5))
+    reset_catalog()
+    main.load_music_catalog()
+    assert main.catalog_data == tracks
+
+    # Changed content is rebuilt from the CSV
+    monkeypatch.setattr(main, "read_catalog_records", read_catalog_records)
+    write_inventory(csv_path, [dict(loaded[0], title="Renamed")] + loaded[1:])
+    main.load_music_catalog()
+    assert main.tracks_by_hash[loaded[0]['file_hash']]['track'] == "Renamed"
+
+def test_snapshot_from_another_version_is_rebuilt(loaded):
+    with open(main.CATALOG_SNAPSHOT_FILE, 'rb') as f:
+        snapshot = pickle.load(f)
+    snapshot["version"] = main.CATALOG_SNAPSHOT_VERSION - 1
+    snapshot["tracks"] = []
+    with open(main.CATALOG_SNAPSHOT_FILE, 'wb') as f:
+        pickle.dump(snapshot, f)
+
+    reset_catalog()
+    main.load_music_catalog()
+
+    assert len(main.catalog_data) == len(loaded)
+    with open(main.CATALOG_SNAPSHOT_FILE, 'rb') as f:
+        assert pickle.load(f)["version"] == main.CATALOG_SNAPSHOT_VERSION
+
+def test_unreadable_snapshot_is_rebuilt(loaded):
+    with open(main.CATALOG_SNAPSHOT_FILE, 'wb') as f:
+        f.write(b"not a pickle")
+
+    reset_catalog()
+    main.load_music_catalog()
+
+    assert len(main.catalog_data) == len(loaded)
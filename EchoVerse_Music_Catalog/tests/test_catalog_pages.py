@@ -0,0 +1,68 @@
+"""Paged /api/catalog views and the dashboard's page loader"""
+
+import json
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+import main
+
+DASHBOARD = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "dashboard.html")
+
+def test_cursor_pages_through_tracks_and_expires_on_reload(client, loaded):
+    first = client.get("/api/catalog", params={"view": "tracks", "limit": 2}).json()
+    assert len(first["items"]) == 2 and first["next_cursor"]
+    second = client.get("/api/catalog", params={"view": "tracks", "limit": 2, "cursor": first["next_cursor"]}).json()
+    assert len(second["items"]) == 1 and second["next_cursor"] is None
+    assert [track["id"] for track in first["items"] + second["items"]] == [track["id"] for track in main.catalog_data]
+
+    main.apply_catalog_state(main.build_catalog_state(main.catalog_data))
+    stale = client.get("/api/catalog", params={"view": "tracks", "limit": 2, "cursor": first["next_cursor"]})
+    assert stale.status_code == 409
+
+def dashboard_function(name):
+    """Source of a top-level function (and the constants above it) from dashboard.html"""
+    with open(DASHBOARD, encoding='utf-8') as f:
+        html = f.read()
+    match = re.search(r"(        const CATALOG_PAGE_SIZE.*?\n        async function %s\(\) \{.*?\n        \})\n" % name, html, re.S)
+    assert match, f"{name} not found in dashboard.html"
+    return match.group(1)
+
+def run_page_loader(responses):
+    """Run fetchCatalogTracks against canned responses; returns (tracks or error, requests made)"""
+    script = dashboard_function("fetchCatalogTracks") + """
+        let catalogData = [], currentSearchResults = [];
+        const responses = %s;
+        const requests = [];
+        function displayCatalog() {}
+        function groupByAlbum(tracks) { return tracks; }
+        async function fetch(url) {
+            requests.push(url);
+            const [status, body] = responses.shift();
+            return { status, ok: status === 200, json: async () => body };
+        }
+        fetchCatalogTracks()
+            .then(tracks => console.log(JSON.stringify({ tracks, requests })))
+            .catch(error => console.log(JSON.stringify({ error: error.message, requests })));
+    """ % json.dumps(responses)
+    output = subprocess.run(["node", "-e", script], capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+@pytest.mark.skipif(not shutil.which("node"), reason="node is not installed")
+def test_dashboard_restarts_after_a_mid_load_reload():
+    page = lambda ids, cursor: [200, {"items": [{"id": i} for i in ids], "next_cursor": cursor}]
+    result = run_page_loader([page([1, 2], "c1"), [409, {}], page([1, 2], "c2"), page([3], None)])
+
+    assert result["tracks"] == [{"id": 1}, {"id": 2}, {"id": 3}]
+    assert len(result["requests"]) == 4
+    assert "cursor" not in result["requests"][2]
+
+@pytest.mark.skipif(not shutil.which("node"), reason="node is not installed")
+def test_dashboard_gives_up_when_the_catalog_keeps_changing():
+    result = run_page_loader([[409, {}]] * 5)
+
+    assert result["error"] == "Catalog kept changing while loading"
+    assert len(result["requests"]) == 4
@@ -0,0 +1,65 @@
+"""HLS playlists and segments cut from an ADTS rendition"""
+
+import os
+
+import pytest
+
+import main
+
+FRAME_LENGTH = 20
+FRAME_COUNT = 300
+
+def adts_frame(number):
+    """One 44.1 kHz ADTS frame whose payload identifies it"""
+    header = bytes([
+        0xFF, 0xF1, (1 << 6) | (4 << 2), (FRAME_LENGTH >> 11) & 0x03,
+        (FRAME_LENGTH >> 3) & 0xFF, ((FRAME_LENGTH & 0x07) << 5) | 0x1F, 0xFC
+    ])
+    return header + number.to_bytes(FRAME_LENGTH - 7, 'big')
+
+@pytest.fixture
+def rendition(loaded, monkeypatch):
+    """Track ID and frames of a ready aac160 rendition of the first inventory track"""
+    entry = main.stream_table[main.content_track_id(loaded[0]['file_hash'])]
+    path = main.rendition_path(entry["path"], entry["file_hash"], "aac160")
+    frames = [adts_frame(number) for number in range(FRAME_COUNT)]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b"".join(frames))
+    monkeypatch.setattr(main, "hls_segment_cache", main.OrderedDict())
+    monkeypatch.setattr(main, "hls_segment_cache_bytes", 0)
+    monkeypatch.setattr(main, "hls_frame_indexes", main.OrderedDict())
+    return main.content_track_id(loaded[0]['file_hash']), frames
+
+def test_playlist_and_segments(client, rendition):
+    track_id, frames = rendition
+    per_segment = main.hls_frames_per_segment(44100)
+
+    playlist = client.get(f"/api/hls/track/{track_id}.m3u8").text
+    assert playlist.count("#EXTINF") == 2
+    assert f"/api/hls/segment/{track_id}/aac160/1.aac?base=0&trim=0" in playlist
+
+    first = client.get(f"/api/hls/segment/{track_id}/aac160/0.aac")
+    assert first.status_code == 200
+    assert first.content == main.hls_timestamp_tag(0) + b"".join(frames[:per_segment])
+
+    # A later album track drops its priming frame and continues the album timeline
+    second = client.get(f"/api/hls/segment/{track_id}/aac160/1.aac", params={"base": 1000, "trim": 1})
+    pts = (1000 + per_segment) * main.AAC_FRAME_SAMPLES * 90000 // 44100
+    assert second.content == main.hls_timestamp_tag(pts) + b"".join(frames[per_segment + 1:])
+
+    assert client.get(f"/api/hls/segment/{track_id}/aac160/2.aac").status_code == 404
+
+@pytest.mark.parametrize("path, params", [
+    ("-1.aac", {}),
+    ("0.aac", {"trim": -1}),
+    ("0.aac", {"trim": -100000}),
+    ("0.aac", {"trim": 2}),
+    ("0.aac", {"base": -1}),
+])
+def test_out_of_range_segment_parameters_are_rejected(client, rendition, path, params):
+    track_id, _ = rendition
+    response = client.get(f"/api/hls/segment/{track_id}/aac160/{path}", params=params)
+
+    assert response.status_code == 422
+    assert not main.hls_segment_cache
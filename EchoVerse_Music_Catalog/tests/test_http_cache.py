@@ -0,0 +1,74 @@
+"""ETag, 304 and precompressed variants of the cached catalog responses"""
+
+import gzip
+import json
+
+import pytest
+
+import main
+
+@pytest.fixture
+def compressing(client, monkeypatch):
+    """Compress every cached body, however small the test catalog is"""
+    monkeypatch.setattr(main, "RESPONSE_CACHE_MIN_COMPRESS_BYTES", 0)
+    return client
+
+def get_albums(client, **headers):
+    return client.get("/api/albums", headers={"Accept-Encoding": "identity", **headers})
+
+def test_each_encoding_has_its_own_etag(compressing):
+    identity = get_albums(compressing)
+    compressed = compressing.get("/api/albums", headers={"Accept-Encoding": "gzip"})
+
+    assert identity.status_code == compressed.status_code == 200
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["vary"] == compressed.headers["vary"] == "Accept-Encoding"
+    assert identity.headers["etag"].startswith('"g') and not identity.headers["etag"].startswith('W/')
+    assert compressed.headers["etag"] == identity.headers["etag"][:-1] + '-gz"'
+    assert compressed.json() == identity.json() == list(main.albums_data.values())
+
+def test_brotli_variant_has_its_own_etag(compressing):
+    pytest.importorskip("brotli")
+    identity = get_albums(compressing)
+    compressed = compressing.get("/api/albums", headers={"Accept-Encoding": "br, gzip"})
+
+    assert compressed.headers["content-encoding"] == "br"
+    assert compressed.headers["etag"] == identity.headers["etag"][:-1] + '-br"'
+
+def test_any_variant_etag_revalidates(compressing):
+    identity_etag = get_albums(compressing).headers["etag"]
+    gzip_etag = compressing.get("/api/albums", headers={"Accept-Encoding": "gzip"}).headers["etag"]
+
+    for sent in (identity_etag, gzip_etag, f"W/{gzip_etag}", f'"other", {identity_etag}', "*"):
+        response = get_albums(compressing, **{"If-None-Match": sent})
+        assert response.status_code == 304
+        assert response.content == b""
+        # The 304 names the variant this request would have received
+        assert response.headers["etag"] == identity_etag
+
+    assert get_albums(compressing, **{"If-None-Match": '"g0-stale"'}).status_code == 200
+
+def test_new_catalog_generation_invalidates_etags(compressing):
+    etag = get_albums(compressing).headers["etag"]
+
+    main.apply_catalog_state(main.build_catalog_state(main.catalog_data))
+
+    response = get_albums(compressing, **{"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+def test_small_bodies_are_not_compressed(client, monkeypatch):
+    monkeypatch.setattr(main, "RESPONSE_CACHE_MIN_COMPRESS_BYTES", 1024 * 1024)
+    response = client.get("/api/albums", headers={"Accept-Encoding": "gzip"})
+    entry = main.response_cache["albums"]
+
+    assert len(entry["identity"]) < main.RESPONSE_CACHE_MIN_COMPRESS_BYTES
+    assert entry["gzip"] is None
+    assert "content-encoding" not in response.headers
+    assert not response.headers["etag"].endswith('-gz"')
+
+def test_cached_gzip_body_matches_identity(compressing):
+    get_albums(compressing)
+    entry = main.response_cache["albums"]
+    assert json.loads(gzip.decompress(entry["gzip"])) == json.loads(entry["identity"])
@@ -0,0 +1,71 @@
+"""Play event ingestion, validation and the flush into song metadata"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+import main
+
+@pytest.mark.parametrize("played_at", [float('nan'), float('-inf'), float('inf'), -1e12, -1, "0001-01-01T00:00:00"])
+def test_rejects_unusable_played_at_before_counting(client, loaded, played_at):
+    good = {"file_hash": loaded[0]['file_hash']}
+    bad = {"file_hash": loaded[1]['file_hash'], "played_at": played_at}
+
+    response = client.post("/api/plays", json={"events": [good, bad]})
+
+    assert response.status_code == 400
+    assert "played_at" in response.json()["detail"]
+    assert main.play_totals["all"] == 0
+    assert main.play_buffer == []
+
+def test_counts_and_flushes_plays(client, loaded):
+    file_hash = loaded[0]['file_hash']
+    played_at = time.time() - 3600
+    response = client.post("/api/plays", json={"events": [
+        {"file_hash": file_hash, "played_at": played_at},
+        {"track_id": main.content_track_id(file_hash)},
+        {"track_id": "track_unknown"}
+    ]})
+    assert response.status_code == 200
+    assert response.json() == {"accepted": 2, "rejected": 1, "buffered": 2}
+
+    stats = client.get("/api/plays/stats", params={"window": "day"}).json()
+    assert stats["total_plays"] == 2
+    assert stats["tracks"][0]["id"] == main.content_track_id(file_hash)
+
+    asyncio.run(main.flush_play_events())
+    assert main.play_buffer == []
+    assert main.song_metadata[file_hash]["play_count"] == 2
+    with open(main.PLAY_EVENTS_FILE, encoding='utf-8') as f:
+        assert len(f.read().splitlines()) == 2
+
+    # Replaying the log rebuilds the same counters
+    main.load_play_events()
+    assert main.play_totals["all"] == 2
+    assert main.play_totals["day"] == 2
+
+def test_flush_keeps_other_updates_when_one_event_is_bad(loaded):
+    good_hash, bad_hash = loaded[0]['file_hash'], loaded[1]['file_hash']
+    main.play_buffer.extend([
+        {"track_id": main.content_track_id(good_hash), "file_hash": good_hash, "played_at": time.time()},
+        {"track_id": main.content_track_id(bad_hash), "file_hash": bad_hash, "played_at": -1e12}
+    ])
+
+    asyncio.run(main.flush_play_events())
+
+    assert main.play_buffer == []
+    assert main.song_metadata[good_hash]["play_count"] == 1
+    assert bad_hash not in main.song_metadata
+
+def test_replay_skips_unusable_logged_events(loaded):
+    file_hash = loaded[0]['file_hash']
+    with open(main.PLAY_EVENTS_FILE, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({"file_hash": file_hash, "played_at": time.time()}) + "\n")
+        f.write('{"file_hash": "%s", "played_at": NaN}\n' % file_hash)
+        f.write('{"file_hash": "%s", "played_at"\n' % file_hash)
+
+    main.load_play_events()
+
+    assert main.play_totals["all"] == 1
@@ -0,0 +1,39 @@
+"""The `python main.py scan` inventory scanner"""
+
+import csv
+
+import main
+from conftest import write_wav
+
+def read_rows(csv_path):
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        return list(csv.DictReader(f))
+
+def test_rescan_reuses_rows_from_a_bom_prefixed_inventory(catalog_dir, monkeypatch):
+    library = catalog_dir / "library"
+    library.mkdir()
+    write_wav(library / "one.wav", value=1)
+    write_wav(library / "two.wav", value=1)
+    first = main.scan_music_library(str(library), str(catalog_dir / "first"), previous_csv="", workers=2)
+
+    rows = read_rows(first)
+    assert [row['file_name'] for row in rows] == ["one.wav", "two.wav"]
+    assert [row['is_duplicate'] for row in rows] == ["FALSE", "TRUE"]
+    assert rows[1]['duplicate_of'] == rows[0]['full_path']
+
+    # Re-save the inventory the way Excel does, with a byte order mark, and
+    # full_path moved to the first column where the BOM would corrupt it
+    exported = catalog_dir / "exported.csv"
+    columns = ['full_path'] + [column for column in main.SCAN_CSV_COLUMNS if column != 'full_path']
+    with open(exported, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    assert list(main.load_previous_inventory(str(exported))) == [row['full_path'] for row in rows]
+
+    def fail_hash(*args):
+        raise AssertionError("unchanged file was hashed again")
+    monkeypatch.setattr(main, "file_sha256", fail_hash)
+    second = main.scan_music_library(str(library), str(catalog_dir / "second"), previous_csv=str(exported), workers=2)
+
+    assert [row['file_hash'] for row in read_rows(second)] == [row['file_hash'] for row in rows]
@@ -0,0 +1,81 @@
+"""The song metadata store: JSONL replay, sync and search index upkeep"""
+
+import asyncio
+import json
+
+import main
+
+def search(query):
+    return {main.catalog_data[position]['file_hash'] for position in main.search_index_query(main.search_index, query)}
+
+def test_patch_replays_from_log(client, loaded):
+    file_hash = loaded[0]['file_hash']
+    response = client.patch(f"/api/metadata/{file_hash}", json={"rating": 4, "tags": ["Neon", " "], "notes": "late night"})
+    assert response.status_code == 200
+    assert response.json()["song"]["tags"] == ["Neon"]
+    client.patch(f"/api/metadata/{file_hash}", json={"play_count_increment": 2})
+    assert client.patch(f"/api/metadata/{file_hash}", json={"rating": 9}).status_code == 400
+    assert client.patch("/api/metadata/unknown", json={"rating": 1}).status_code == 404
+
+    # A torn final line from a crash mid-append is skipped
+    with open(main.SONG_METADATA_LOG_FILE, 'a', encoding='utf-8') as f:
+        f.write('{"unique_id": "%s", "rating": 1' % file_hash)
+    before = dict(main.song_metadata[file_hash])
+    main.load_song_metadata_store()
+
+    assert main.song_metadata[file_hash] == before
+    assert before["rating"] == 4 and before["play_count"] == 2 and before["revision"] == 2
+    assert main.song_metadata_revision == 2
+    stats = client.get("/api/metadata/stats").json()
+    assert stats["tag_counts"] == {"Neon": 1}
+    assert stats["most_played"] == file_hash
+
+def test_imports_legacy_json_once(catalog_dir, inventory):
+    file_hash = inventory[0]['file_hash']
+    with open(main.SONG_METADATA_FILE, 'w', encoding='utf-8') as f:
+        json.dump({"songs": {file_hash: {"rating": 5, "tags": ["legacy"]}}}, f)
+
+    main.load_song_metadata_store()
+    assert main.song_metadata[file_hash]["revision"] == 1
+    with open(main.SONG_METADATA_LOG_FILE, encoding='utf-8') as f:
+        assert len(f.read().splitlines()) == 1
+
+    # Once the log exists the legacy file is ignored
+    with open(main.SONG_METADATA_FILE, 'w', encoding='utf-8') as f:
+        json.dump({"songs": {}}, f)
+    main.load_song_metadata_store()
+    assert main.song_metadata[file_hash]["tags"] == ["legacy"]
+
+def test_since_pages_changes_in_revision_order(client, loaded):
+    hashes = [row['file_hash'] for row in loaded]
+    client.post("/api/metadata/batch", json={"updates": [{"file_hash": file_hash, "rating": 3} for file_hash in hashes]})
+    client.patch(f"/api/metadata/{hashes[0]}", json={"rating": 5})
+
+    page = client.get("/api/metadata", params={"since": 1, "limit": 2}).json()
+    assert [song["unique_id"] for song in page["songs"]] == hashes[1:]
+    assert page["has_more"] is True
+    rest = client.get("/api/metadata", params={"since": page["revision"]}).json()
+    assert [song["unique_id"] for song in rest["songs"]] == hashes[:1]
+    assert rest == {"revision": 4, "has_more": False, "songs": rest["songs"]}
+
+def test_metadata_written_during_reload_reaches_the_new_index(loaded, monkeypatch):
+    file_hash = loaded[0]['file_hash']
+    prepare = main.prepare_catalog_reload
+
+    async def reload_with_concurrent_patch():
+        loop = asyncio.get_running_loop()
+
+        def prepare_while_patching(force, metadata):
+            state = prepare(force, metadata)
+            # A PATCH lands after the new index was built but before the swap
+            asyncio.run_coroutine_threadsafe(main.save_song_metadata({file_hash: {"tags": ["neon"]}}), loop).result()
+            return state
+
+        monkeypatch.setattr(main, "prepare_catalog_reload", prepare_while_patching)
+        monkeypatch.setattr(main, "refresh_image_index", lambda: asyncio.sleep(0))
+        return await main.reload_music_catalog(force=True)
+
+    generation = main.catalog_generation
+    assert asyncio.run(reload_with_concurrent_patch())
+    assert main.catalog_generation == generation + 1
+    assert search("neon") == {file_hash}
@@ -0,0 +1,102 @@
+"""Range, If-Range and 416 handling on /api/stream, and rendition lookup"""
+
+import os
+
+import pytest
+
+import main
+
+@pytest.fixture
+def track(loaded):
+    """Stream URL and file contents of the first inventory track"""
+    with open(loaded[0]['full_path'], 'rb') as f:
+        data = f.read()
+    return f"/api/stream/{main.content_track_id(loaded[0]['file_hash'])}?use_tailscale=false", data
+
+def test_full_response_advertises_ranges(client, track):
+    url, data = track
+    response = client.get(url)
+
+    assert response.status_code == 200
+    assert response.content == data
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-length"] == str(len(data))
+    assert response.headers["content-type"] == "audio/wav"
+
+@pytest.mark.parametrize("range_header, start, end", [
+    ("bytes=10-19", 10, 19),
+    ("bytes=100-", 100, None),
+    ("bytes=-5", -5, None),
+    ("bytes=0-999999999", 0, None),
+])
+def test_single_range_gets_206(client, track, range_header, start, end):
+    url, data = track
+    expected = data[start:end + 1] if end is not None else data[start:]
+    first = start if start >= 0 else len(data) + start
+    skipped = main.stream_stats["bytes_skipped"]
+
+    response = client.get(url, headers={"Range": range_header})
+
+    assert response.status_code == 206
+    assert response.content == expected
+    assert response.headers["content-range"] == f"bytes {first}-{first + len(expected) - 1}/{len(data)}"
+    assert response.headers["content-length"] == str(len(expected))
+    assert main.stream_stats["bytes_skipped"] - skipped == len(data) - len(expected)
+
+@pytest.mark.parametrize("range_header", ["bytes=999999-", "bytes=-0"])
+def test_unsatisfiable_range_gets_416(client, track, range_header):
+    url, data = track
+    response = client.get(url, headers={"Range": range_header})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(data)}"
+
+@pytest.mark.parametrize("range_header", ["bytes=0-1,5-9", "bytes=9-2", "items=0-5", "bytes=a-b"])
+def test_unsupported_or_malformed_range_gets_full_file(client, track, range_header):
+    url, data = track
+    response = client.get(url, headers={"Range": range_header})
+
+    assert response.status_code == 200
+    assert response.content == data
+
+def test_if_range_keeps_range_only_while_file_is_unchanged(client, track):
+    url, data = track
+    validators = client.get(url).headers
+
+    for if_range in (validators["etag"], validators["last-modified"]):
+        response = client.get(url, headers={"Range": "bytes=0-3", "If-Range": if_range})
+        assert response.status_code == 206
+        assert response.content == data[:4]
+
+    for if_range in ('"stale"', f"W/{validators['etag']}", "Thu, 01 Jan 1970 00:00:00 GMT"):
+        response = client.get(url, headers={"Range": "bytes=0-3", "If-Range": if_range})
+        assert response.status_code == 200
+        assert response.content == data
+
+def test_unknown_track_is_404(client, loaded):
+    assert client.get("/api/stream/track_missing?use_tailscale=false").status_code == 404
+
+def test_rendition_key_ignores_the_media_cache_copy(client, loaded, monkeypatch):
+    track_id = main.content_track_id(loaded[0]['file_hash'])
+    entry = main.stream_table[track_id]
+    monkeypatch.setitem(entry, "file_hash", None)
+    monkeypatch.setitem(main.media_cache_config, "enabled", True)
+    monkeypatch.setitem(main.media_cache_config, "network_only", False)
+    monkeypatch.setattr(main, "media_cache_entries", main.OrderedDict())
+    rendition = main.rendition_path(entry["path"], None, "aac160")
+    os.makedirs(os.path.dirname(rendition), exist_ok=True)
+    with open(rendition, 'wb') as f:
+        f.write(b"rendition")
+
+    key = main.media_cache_key(entry["path"])
+    main.media_cache_entries[key] = main.copy_into_media_cache(key, entry["path"])
+    assert main.cached_media_file(entry["path"]) != entry["path"]
+
+    response = client.get(f"/api/stream/{track_id}", params={"use_tailscale": False, "quality": "aac160"})
+    assert response.status_code == 200
+    assert response.content == b"rendition"
+
+def test_files_over_the_cache_limit_are_not_copied(loaded, monkeypatch):
+    monkeypatch.setattr(main, "MEDIA_CACHE_MAX_BYTES", 10)
+    assert main.copy_into_media_cache("too-big", loaded[0]['full_path']) is None
+    assert not os.path.exists(main.MEDIA_CACHE_DIR) or not os.listdir(main.MEDIA_CACHE_DIR)
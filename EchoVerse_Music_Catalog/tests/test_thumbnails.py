@@ -0,0 +1,73 @@
+"""size= thumbnails and their v= versioned caching"""
+
+import os
+import urllib.parse
+
+import pytest
+
+import main
+
+pytest.importorskip("PIL")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+@pytest.fixture
+def image(catalog_dir):
+    """A small PNG inside the allowed directories"""
+    from PIL import Image
+    path = catalog_dir / "art" / "cover.png"
+    path.parent.mkdir()
+    Image.new('RGB', (300, 200), (200, 40, 40)).save(path)
+    return path
+
+def thumbnail(client, path, **params):
+    url = f"/api/image/{urllib.parse.quote(str(path))}"
+    return client.get(url, params={"size": 128, **params}, headers={"Accept": "image/webp"})
+
+def test_only_the_current_mtime_is_immutable(client, image):
+    current = repr(os.stat(image).st_mtime)
+
+    versioned = thumbnail(client, image, v=current)
+    assert versioned.status_code == 200
+    assert versioned.headers["content-type"] == "image/webp"
+    assert versioned.headers["cache-control"] == IMMUTABLE
+
+    for params in ({}, {"v": "0"}, {"v": "not-a-time"}):
+        response = thumbnail(client, image, **params)
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == "public, max-age=86400"
+
+    # Once the file is edited, the old version token is no longer immutable
+    stat = os.stat(image)
+    os.utime(image, (stat.st_atime, stat.st_mtime + 60))
+    assert thumbnail(client, image, v=current).headers["cache-control"] == "public, max-age=86400"
+
+def test_revalidates_by_etag(client, image):
+    first = thumbnail(client, image)
+    again = client.get(first.url, headers={"Accept": "image/webp", "If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+
+def test_source_hash_cache_is_capped(client, image, monkeypatch):
+    monkeypatch.setattr(main, "THUMBNAIL_SOURCE_HASHES_MAX_ENTRIES", 2)
+    main.thumbnail_source_hashes.clear()
+    for mtime in range(1, 5):
+        os.utime(image, (mtime, mtime))
+        assert thumbnail(client, image).status_code == 200
+
+    assert len(main.thumbnail_source_hashes) == 2
+    assert [identity[2] for identity in main.thumbnail_source_hashes] == [3 * 10 ** 9, 4 * 10 ** 9]
+
+def test_source_hash_cache_survives_concurrent_renders(image, monkeypatch):
+    monkeypatch.setattr(main, "THUMBNAIL_SOURCE_HASHES_MAX_ENTRIES", 2)
+    main.thumbnail_source_hashes.clear()
+    sources = []
+    for number in range(8):
+        path = image.parent / f"cover-{number}.png"
+        path.write_bytes(image.read_bytes() + bytes([number]))
+        sources.append(str(path))
+
+    futures = [main.thumbnail_executor.submit(main.build_thumbnail, source, 128, "webp") for source in sources * 8]
+    for future in futures:
+        future.result()
+
+    assert len(main.thumbnail_source_hashes) == 2
@@ -0,0 +1,62 @@
+"""Waveform peaks and BS.1770 loudness"""
+
+import shutil
+import wave
+
+import numpy as np
+import pytest
+
+import main
+
+def write_sine(path, channels, amplitude=0.5, seconds=3, sample_rate=48000):
+    """997 Hz sine at the given amplitude, identical in every channel"""
+    t = np.arange(sample_rate * seconds) / sample_rate
+    samples = (amplitude * np.sin(2 * np.pi * 997 * t) * 32767).astype(np.int16)
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(np.repeat(samples[:, None], channels, axis=1).tobytes())
+
+@pytest.mark.parametrize("decoder", ["wave", "ffmpeg"])
+def test_loudness_sums_both_channels_and_keeps_mono_mono(tmp_path, monkeypatch, decoder):
+    if decoder == "ffmpeg":
+        if not shutil.which("ffmpeg"):
+            pytest.skip("ffmpeg is not installed")
+        monkeypatch.setattr(main, "FFMPEG_BINARY", shutil.which("ffmpeg"))
+    else:
+        monkeypatch.setattr(main, "FFMPEG_BINARY", None)
+    write_sine(tmp_path / "mono.wav", 1)
+    write_sine(tmp_path / "stereo.wav", 2)
+
+    mono = main.analyze_waveform(str(tmp_path / "mono.wav"))
+    stereo = main.analyze_waveform(str(tmp_path / "stereo.wav"))
+
+    # A -6.02 dBFS sine in both channels of a stereo file is -6.02 LUFS;
+    # the same signal as a mono file is one channel, 3.01 LU quieter
+    assert stereo["loudness_lufs"] == pytest.approx(-6.02, abs=0.1)
+    assert stereo["loudness_lufs"] - mono["loudness_lufs"] == pytest.approx(3.01, abs=0.05)
+    assert stereo["peak_dbfs"] == pytest.approx(-6.02, abs=0.05)
+    assert stereo["duration"] == pytest.approx(3.0, abs=0.01)
+    assert len(stereo["peaks"]) == main.WAVEFORM_POINTS
+
+def stored_waveform(duration):
+    return {"peaks": bytes(main.WAVEFORM_POINTS), "duration": duration, "loudness_lufs": -14.0, "peak_dbfs": -1.0}
+
+def test_endpoint_rereads_a_rewritten_store_after_the_check_interval(client, loaded, monkeypatch):
+    monkeypatch.setattr(main, "waveform_store", {})
+    monkeypatch.setattr(main, "waveform_store_mtime", None)
+    monkeypatch.setattr(main, "waveform_store_checked", None)
+    file_hash = loaded[0]['file_hash']
+    url = f"/api/waveform/{main.content_track_id(file_hash)}"
+    assert client.get(url).status_code == 404
+
+    main.save_waveform_store({file_hash: stored_waveform(0.5)})
+    # Within the check interval the store file is not looked at again
+    assert client.get(url).status_code == 404
+
+    monkeypatch.setattr(main, "waveform_store_checked", main.waveform_store_checked - main.WAVEFORM_STORE_CHECK_SECONDS)
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.json()["duration"] == 0.5
+    assert client.get(url, headers={"If-None-Match": response.headers["etag"]}).status_code == 304
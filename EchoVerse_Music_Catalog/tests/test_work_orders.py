@@ -0,0 +1,106 @@
+"""The work order store: JSONL log replay, updates and indexed filters"""
+
+import json
+
+import main
+
+def create(client, **fields):
+    response = client.post("/api/work-orders", json={"type": "mastering", **fields})
+    assert response.status_code == 200
+    return response.json()["work_order"]
+
+def test_created_work_orders_replay_from_log(client, loaded):
+    first = create(client, title="Remaster", priority="high")
+    second = create(client, title="Tag fix")
+    assert client.post("/api/work-orders", json={"status": "lost"}).status_code == 400
+
+    # A torn final line from a crash mid-append is skipped
+    with open(main.WORK_ORDERS_FILE, 'a', encoding='utf-8') as f:
+        f.write('{"id": "wo_torn", "title": "Rem')
+    main.load_work_orders()
+
+    assert list(main.work_orders) == [first["id"], second["id"]]
+    assert main.work_orders[first["id"]] == first
+    assert first["status"] == "pending"
+
+    response = client.get("/api/work-orders", params={"offset": 1, "limit": 5})
+    assert response.headers["x-total-count"] == "2"
+    assert [work_order["id"] for work_order in response.json()] == [second["id"]]
+    assert client.get(f"/api/export-work-order/{first['id']}").json() == first
+    assert client.get("/api/export-work-order/wo_missing").status_code == 404
+
+def test_imports_legacy_json_once(catalog_dir, loaded):
+    legacy = [{"id": "wo_legacy_1", "status": "pending", "tracks": [{"id": "dashboard-7"}]}]
+    with open(main.WORK_ORDERS_LEGACY_FILE, 'w', encoding='utf-8') as f:
+        json.dump(legacy, f)
+
+    main.load_work_orders()
+    assert list(main.work_orders.values()) == legacy
+
+    # Once the log exists the legacy file is ignored
+    with open(main.WORK_ORDERS_LEGACY_FILE, 'w', encoding='utf-8') as f:
+        json.dump([], f)
+    main.load_work_orders()
+    assert list(main.work_orders) == ["wo_legacy_1"]
+    assert main.work_order_track_index == {"dashboard-7": {"wo_legacy_1"}}
+
+def filtered_ids(client, **filters):
+    response = client.get("/api/work-orders", params=filters)
+    ids = [work_order["id"] for work_order in response.json()]
+    assert response.headers["x-total-count"] == str(len(ids))
+    return ids
+
+def test_patch_and_filters_survive_replay(client, loaded):
+    track_id = main.content_track_id(loaded[0]['file_hash'])
+    first = create(client, priority="high")
+    second = create(client, priority="high")
+
+    response = client.patch(f"/api/work-orders/{first['id']}", json={
+        "status": "in-progress", "assignee": "sam", "add_tracks": [track_id, track_id]
+    })
+    assert response.status_code == 200
+    assert response.json()["work_order"]["tracks"] == [
+        {"id": track_id, "track": "First Light", "album": "Test Album", "artist": "Test Artist"}
+    ]
+    assert client.patch(f"/api/work-orders/{first['id']}", json={"status": "lost"}).status_code == 400
+    assert client.patch(f"/api/work-orders/{first['id']}", json={"title": "x"}).status_code == 400
+    assert client.patch(f"/api/work-orders/{first['id']}", json={"add_tracks": ["track_missing"]}).status_code == 400
+    assert client.patch("/api/work-orders/wo_missing", json={"status": "completed"}).status_code == 404
+
+    for replayed in (False, True):
+        if replayed:
+            main.load_work_orders()
+        assert filtered_ids(client, status="in-progress", assignee="sam") == [first["id"]]
+        assert filtered_ids(client, priority="high") == [first["id"], second["id"]]
+        assert filtered_ids(client, track_id=track_id) == [first["id"]]
+        assert filtered_ids(client, status="pending") == [second["id"]]
+
+    client.patch(f"/api/work-orders/{first['id']}", json={"assignee": "", "remove_tracks": [track_id]})
+    assert filtered_ids(client, assignee="sam") == []
+    assert filtered_ids(client, track_id=track_id) == []
+
+def test_bulk_update_is_all_or_nothing(client, loaded):
+    ids = [create(client)["id"] for _ in range(3)]
+
+    missing = client.post("/api/work-orders/bulk", json={"ids": ids + ["wo_missing"], "update": {"status": "completed"}})
+    invalid = client.post("/api/work-orders/bulk", json={"ids": ids, "update": {"priority": "someday"}})
+    assert (missing.status_code, invalid.status_code) == (404, 400)
+    assert filtered_ids(client, status="pending") == ids
+
+    response = client.post("/api/work-orders/bulk", json={"ids": ids[:2], "update": {"status": "completed"}})
+    assert response.json()["updated"] == 2
+    main.load_work_orders()
+    assert filtered_ids(client, status="completed") == ids[:2]
+    assert filtered_ids(client, status="pending") == ids[2:]
+
+def test_superseded_versions_are_compacted_on_load(client, loaded):
+    work_order = create(client)
+    for priority in main.WORK_ORDER_PRIORITIES * 20:
+        client.patch(f"/api/work-orders/{work_order['id']}", json={"priority": priority})
+
+    main.load_work_orders()
+
+    with open(main.WORK_ORDERS_FILE, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert [json.loads(line) for line in lines] == [main.work_orders[work_order["id"]]]
+    assert main.work_orders[work_order["id"]]["priority"] == main.WORK_ORDER_PRIORITIES[-1]